@@ -0,0 +1,4 @@
+"""
+Benchmarks of the GPS pipeline. Each module can be run on its own, e.g.:
+    python -m benchmarks.unificar_cruces
+"""
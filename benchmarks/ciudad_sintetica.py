@@ -0,0 +1,222 @@
+"""
+ciudad_sintetica.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Generator of synthetic cities with the layout of the DGT data, so that the
+benchmarks do not need the real CSV files. The city is a square grid of streets
+whose intersections are shifted at random, crossed by radial avenues that start
+at a central roundabout and by two ring roads. Each avenue meets each ring road
+at a small roundabout. Every intersection appears once per street that goes
+through it, a few metres apart, as in cruces.csv, and the rows of each street
+follow its order along the street. The addresses are spread along the streets.
+
+The DataFrames have the columns of the processed CSV files (see dgt_main.py),
+so a registry can be built on them without reading any file:
+
+    cruces, direcciones = ciudad_sintetica(20000)
+    registro = gps.RegistroGrafos(types.SimpleNamespace(paquete=None, cruces=cruces, direcciones=direcciones))
+"""
+import math
+import types
+
+import numpy as np
+import pandas as pd
+
+# Distance between grid streets and maximum shift of their intersections, in cm
+ESPACIADO = 10000
+DESPLAZAMIENTO = 1500
+# Maximum distance between the rows of the same intersection, in cm (below the 30 m of unificar_cruces)
+RUIDO_FILAS = 300
+NUM_AVENIDAS = 8
+# Radius of the central roundabout and of those where avenues meet ring roads, in cm
+RADIO_GLORIETA_CENTRAL = 6000
+RADIO_GLORIETA = 4000
+# Radii of the ring roads as fractions of half the side of the city
+ANILLOS = (0.35, 0.7)
+DIRECCIONES_POR_TRAMO = 2
+
+SILABAS = ("AL", "BA", "CA", "DE", "FE", "GA", "LO", "MA", "NO", "PE", "RA", "SO", "TA", "VI", "ZA",
+           "RI", "LU", "ME", "CO", "TE", "NA", "SA", "GO", "BE", "JU", "QUI", "RRO", "LLA", "CHO", "ÑE")
+PARTICULAS = ("DE", "DEL", "DE LA", "DE LOS", "")
+
+
+class _Callejero():
+    """ Streets being generated: their names and the points where other streets cross them """
+
+    def __init__(self,rng):
+        self.rng = rng
+        self.calles = dict()   # codigo -> (clase, particula, nombre)
+        self.puntos = dict()   # codigo -> [(posicion a lo largo de la calle, x, y, codigo que cruza)]
+        self._nombres = set()
+
+    def nueva(self,clase):
+        """ New street of a class with a random unused name, returns its code """
+        while True:
+            nombre = "".join(self.rng.choice(SILABAS, size=self.rng.integers(2, 5)))
+            if nombre not in self._nombres:
+                break
+        self._nombres.add(nombre)
+        codigo = len(self.calles) + 1
+        self.calles[codigo] = (clase, str(self.rng.choice(PARTICULAS)), nombre)
+        self.puntos[codigo] = []
+        return codigo
+
+    def cruce(self,a,b,x,y,posicion_a,posicion_b):
+        """ Streets a and b cross at (x, y), at the given positions along each of them """
+        self.puntos[a].append((posicion_a, x, y, b))
+        self.puntos[b].append((posicion_b, x, y, a))
+
+    def literal(self,codigo):
+        clase, particula, nombre = self.calles[codigo]
+        return " ".join(parte for parte in (clase, particula, nombre) if parte)
+
+
+def _anadir_cuadricula(callejero,lado,rng):
+    """ Square grid of lado x lado streets with shifted intersections, returns its coordinates """
+    base = np.arange(lado) * ESPACIADO
+    x = base[None, :] + rng.integers(-DESPLAZAMIENTO, DESPLAZAMIENTO + 1, size=(lado, lado))
+    y = base[:, None] + rng.integers(-DESPLAZAMIENTO, DESPLAZAMIENTO + 1, size=(lado, lado))
+    horizontales = [callejero.nueva("CALLE") for _ in range(lado)]
+    verticales = [callejero.nueva("CALLE") for _ in range(lado)]
+    for i in range(lado):
+        for j in range(lado):
+            callejero.cruce(horizontales[i], verticales[j], int(x[i, j]), int(y[i, j]), float(x[i, j]), float(y[i, j]))
+    return horizontales, verticales, base
+
+def _cortes_recta(base,centro,direccion,inicio,fin):
+    """ Parameters t in (inicio, fin) where the line centro + t * direccion crosses the grid lines of base """
+    cortes = []
+    for eje in (0, 1):
+        if abs(direccion[eje]) > 1e-9:
+            for k, valor in enumerate(base):
+                t = (valor - centro[eje]) / direccion[eje]
+                if inicio < t < fin:
+                    cortes.append((t, eje, k))
+    return cortes
+
+def _cortes_circulo(base,centro,radio):
+    """ Angles where the circle crosses the grid lines of base, with the axis and line of each one """
+    cortes = []
+    for eje in (0, 1):
+        for k, valor in enumerate(base):
+            d = (valor - centro[eje]) / radio
+            if abs(d) < 1:
+                # eje 0: vertical line x = valor; eje 1: horizontal line y = valor
+                for signo in (1, -1):
+                    angulo = math.atan2(signo * math.sqrt(1 - d * d), d) if eje == 0 else math.atan2(d, signo * math.sqrt(1 - d * d))
+                    cortes.append((angulo % (2 * math.pi), eje, k))
+    return cortes
+
+def _anadir_radiales(callejero,horizontales,verticales,base):
+    """ Radial avenues, central roundabout, ring roads and the roundabouts where they meet """
+    centro = np.array([base[-1] / 2, base[-1] / 2])
+    semilado = base[-1] / 2
+    calle_linea = lambda eje, k: verticales[k] if eje == 0 else horizontales[k]
+    punto = lambda angulo, radio, origen=centro: (int(origen[0] + radio * math.cos(angulo)), int(origen[1] + radio * math.sin(angulo)))
+
+    angulos = [2 * math.pi * a / NUM_AVENIDAS for a in range(NUM_AVENIDAS)]
+    avenidas = [callejero.nueva("AVENIDA") for _ in angulos]
+    central = callejero.nueva("GLORIETA")
+    anillos = [(callejero.nueva("CARRETERA"), fraccion * semilado) for fraccion in ANILLOS]
+
+    for avenida, angulo in zip(avenidas, angulos):
+        direccion = np.array([math.cos(angulo), math.sin(angulo)])
+        # The avenue ends at the border of the grid
+        fin = min(semilado / max(abs(direccion[0]), abs(direccion[1])), semilado * 1.5)
+        callejero.cruce(avenida, central, *punto(angulo, RADIO_GLORIETA_CENTRAL), RADIO_GLORIETA_CENTRAL, angulo)
+        # Grid streets crossed, except near the roundabouts
+        for t, eje, k in _cortes_recta(base, centro, direccion, RADIO_GLORIETA_CENTRAL, fin):
+            if all(abs(t - radio) > 2 * RADIO_GLORIETA for _, radio in anillos):
+                x, y = punto(angulo, t)
+                posicion_linea = y if eje == 0 else x
+                callejero.cruce(avenida, calle_linea(eje, k), x, y, t, posicion_linea)
+
+        for anillo, radio in anillos:
+            # Roundabout of 4 points: two on the avenue (inner and outer) and two on the ring road
+            glorieta = callejero.nueva("GLORIETA")
+            q = punto(angulo, radio)
+            for paso, (calle, posicion) in enumerate(((avenida, radio - RADIO_GLORIETA), (anillo, None),
+                                                       (avenida, radio + RADIO_GLORIETA), (anillo, None))):
+                angulo_glorieta = angulo + math.pi + paso * math.pi / 2
+                x, y = punto(angulo_glorieta, RADIO_GLORIETA, q)
+                if posicion is None:
+                    posicion = (angulo + (-1 if paso == 1 else 1) * RADIO_GLORIETA / radio) % (2 * math.pi)
+                callejero.cruce(calle, glorieta, x, y, posicion, paso)
+
+    for anillo, radio in anillos:
+        for angulo, eje, k in _cortes_circulo(base, centro, radio):
+            # Crossings near the roundabouts are left out
+            if min(abs((angulo - a + math.pi) % (2 * math.pi) - math.pi) for a in angulos) * radio > 2 * RADIO_GLORIETA:
+                x, y = punto(angulo, radio)
+                callejero.cruce(anillo, calle_linea(eje, k), x, y, angulo, y if eje == 0 else x)
+
+def _filas_cruces(callejero,rng):
+    """ DataFrame of cruces.csv: the crossings of each street in order along it """
+    filas = []
+    for codigo, puntos in callejero.puntos.items():
+        for _, x, y, otra in sorted(puntos):
+            filas.append((codigo, otra, x, y))
+    filas = np.array(filas, dtype=np.int64).reshape(-1, 4)
+    ruido = rng.integers(-RUIDO_FILAS // 2, RUIDO_FILAS // 2 + 1, size=(len(filas), 2))
+    x, y = filas[:, 2] + ruido[:, 0], filas[:, 3] + ruido[:, 1]
+    literales = pd.Categorical([callejero.literal(codigo) for codigo in filas[:, 0].tolist()])
+    return pd.DataFrame({
+        "Codigo de via tratado": filas[:, 0].astype(np.int32),
+        "Literal completo del vial tratado": literales,
+        "Codigo de via que cruza o enlaza": filas[:, 1].astype(np.int32),
+        "Literal completo del vial que cruza": pd.Categorical([callejero.literal(codigo) for codigo in filas[:, 1].tolist()]),
+        "Coordenada X (Guia Urbana) cm (cruce)": x.astype(np.int32),
+        "Coordenada Y (Guia Urbana) cm (cruce)": y.astype(np.int32),
+        # Rough conversion around Madrid, only used to draw
+        "Longitud en S R  WGS84 (cruce)": -3.75 + x / 8.5e6,
+        "Latitud en S R  WGS84 (cruce)": 40.38 + y / 1.11e7,
+    })
+
+def _filas_direcciones(callejero,rng,por_tramo):
+    """ DataFrame of direcciones.csv: por_tramo addresses between each pair of consecutive
+    intersections of a street, alternating sides, numbered along the street """
+    filas = []
+    for codigo, puntos in callejero.puntos.items():
+        puntos = sorted(puntos)
+        numero = 1
+        for (_, x1, y1, _), (_, x2, y2, _) in zip(puntos, puntos[1:]):
+            longitud = math.hypot(x2 - x1, y2 - y1) or 1
+            normal = (-(y2 - y1) / longitud, (x2 - x1) / longitud)
+            for paso in range(por_tramo):
+                fraccion = (paso + 1) / (por_tramo + 1)
+                lado = 1000 if numero % 2 else -1000
+                filas.append((codigo, numero, int(x1 + fraccion * (x2 - x1) + lado * normal[0]),
+                              int(y1 + fraccion * (y2 - y1) + lado * normal[1])))
+                numero += 1
+    filas = np.array(filas, dtype=np.int64).reshape(-1, 4)
+    clases, particulas, nombres = zip(*[callejero.calles[codigo] for codigo in filas[:, 0].tolist()]) if len(filas) else ((), (), ())
+    return pd.DataFrame({
+        "Codigo de via": filas[:, 0].astype(np.int32),
+        "Clase de la via": pd.Categorical(clases),
+        "Particula de la via": pd.Categorical(particulas),
+        "Nombre de la via": pd.Categorical(nombres),
+        "Literal de numeracion": pd.Categorical([f"NUM{numero}" for numero in filas[:, 1].tolist()]),
+        "Codigo de numero": filas[:, 1].astype(np.int32),
+        "Coordenada X (Guia Urbana) cm": filas[:, 2].astype(np.int32),
+        "Coordenada Y (Guia Urbana) cm": filas[:, 3].astype(np.int32),
+    })
+
+
+def ciudad_sintetica(cruces=20000,semilla=0,direcciones_por_tramo=DIRECCIONES_POR_TRAMO):
+    """ Synthetic city of about the given number of intersections. The same arguments always
+    give the same city. Returns the DataFrames (cruces, direcciones) of the processed CSV files. """
+    rng = np.random.default_rng(semilla)
+    callejero = _Callejero(rng)
+    lado = max(3, int(round(math.sqrt(cruces))))
+    horizontales, verticales, base = _anadir_cuadricula(callejero, lado, rng)
+    _anadir_radiales(callejero, horizontales, verticales, base)
+    return _filas_cruces(callejero, rng), _filas_direcciones(callejero, rng, direcciones_por_tramo)
+
+def datos_sinteticos(cruces=20000,semilla=0,direcciones_por_tramo=DIRECCIONES_POR_TRAMO):
+    """ Object with the attributes of callejero.datos (no bundle) for a synthetic city,
+    to build a gps.RegistroGrafos on it """
+    cruces, direcciones = ciudad_sintetica(cruces, semilla, direcciones_por_tramo)
+    return types.SimpleNamespace(paquete=None, cruces=cruces, direcciones=direcciones)
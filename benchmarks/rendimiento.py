@@ -0,0 +1,206 @@
+"""
+rendimiento.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Reproducible performance suite on a synthetic city (see ciudad_sintetica.py),
+without the real CSV files. For each stage it measures the time and the peak of
+memory allocated (tracemalloc, in a second pass so that tracing does not slow
+down the timed one):
+    tablas              unification of intersections and street tables
+    grafo_distancia     graph of the "shortest" mode
+    grafo_tiempo        graph of the "fastest" mode
+    dijkstra            full minimum path trees from a few intersections
+    camino_minimo       minimum paths between random pairs of intersections
+    prim, kruskal       minimum spanning tree of the "shortest" graph
+    ajuste              snapping table of every address (batch nearest intersection)
+    resolver            nearest intersection of random addresses
+    dirigir_ruta_api    whole route requests between random addresses (route cache disabled)
+The results are written to a JSON file and can be compared with a previous one
+(the baseline): a stage whose time or memory grows more than the tolerance is a
+regression, and the program exits with status 1.
+
+    python -m benchmarks.rendimiento [--cruces N] [--salida resultados.json] [--base base.json]
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import src.cache_rutas as cache_rutas
+import src.gps as gps
+from benchmarks.ciudad_sintetica import datos_sinteticos
+
+CRUCES = 20000
+SEMILLA = 0
+# Sources of the full Dijkstra trees, and pairs of the path and route stages
+FUENTES = 5
+PARES = 50
+TOLERANCIA = 0.25
+# Stages faster than this are not checked for regressions, their noise is too large
+SEGUNDOS_MINIMOS = 0.005
+
+
+def etapas(datos, semilla=SEMILLA):
+    """ Stages of the suite in order, as (name, function) on a new registry of the data; each
+    function runs the stage and returns its number of operations. The later ones use what
+    the earlier ones built, as a real process does. """
+    registro = gps.RegistroGrafos(datos)
+    # Every route is searched: the cache would only measure itself
+    registro.cache = cache_rutas.CacheRutas(tamano_maximo=0)
+    aleatorio = random.Random(semilla)
+    estado = dict()
+
+    def tablas():
+        gps.registro = registro
+        estado["cruces"] = registro.tablas().cruces()
+        return 1
+
+    def grafo(modo):
+        def construir():
+            estado[modo] = registro.grafo(modo)
+            return 1
+        return construir
+
+    def pares_cruces():
+        return [tuple(aleatorio.sample(estado["cruces"], 2)) for _ in range(PARES)]
+
+    def dijkstra():
+        for origen in aleatorio.sample(estado["cruces"], FUENTES):
+            estado["shortest"].dijkstra(origen)
+        return FUENTES
+
+    def camino_minimo():
+        for origen, destino in pares_cruces():
+            estado["shortest"].camino_minimo(origen, destino)
+        return PARES
+
+    def prim():
+        estado["shortest"].prim()
+        return 1
+
+    def kruskal():
+        estado["shortest"].kruskal()
+        return 1
+
+    def ajuste():
+        estado["direcciones"] = list(registro.direcciones())
+        registro.tabla_direcciones()
+        return len(estado["direcciones"])
+
+    def resolver():
+        nombres = aleatorio.sample(estado["direcciones"], 2 * PARES)
+        for nombre in nombres:
+            gps.encontrar_cruce_mas_cercano(nombre)
+        return len(nombres)
+
+    def dirigir_ruta_api():
+        for _ in range(PARES):
+            gps.dirigir_ruta_api(*aleatorio.sample(estado["direcciones"], 2), aleatorio.choice(gps.MODOS))
+        return PARES
+
+    return [("tablas", tablas), ("grafo_distancia", grafo("shortest")), ("grafo_tiempo", grafo("fastest")),
+            ("dijkstra", dijkstra), ("camino_minimo", camino_minimo), ("prim", prim), ("kruskal", kruskal),
+            ("ajuste", ajuste), ("resolver", resolver), ("dirigir_ruta_api", dirigir_ruta_api)]
+
+def ejecutar(cruces=CRUCES, semilla=SEMILLA, repeticiones=1):
+    """ Runs the suite and returns the dictionary written to the JSON file. The time of each stage
+    is the lowest of the repetitions; the memory is measured in one more pass with tracemalloc. """
+    anterior = gps.registro
+    try:
+        inicio = time.perf_counter()
+        datos = datos_sinteticos(cruces, semilla)
+        generacion = time.perf_counter() - inicio
+
+        resultados = dict()
+        for _ in range(repeticiones):
+            for nombre, etapa in etapas(datos, semilla):
+                inicio = time.perf_counter()
+                operaciones = etapa()
+                segundos = time.perf_counter() - inicio
+                if nombre not in resultados or segundos < resultados[nombre]["segundos"]:
+                    resultados[nombre] = {"segundos": round(segundos, 6), "operaciones": operaciones,
+                                          "segundos_por_operacion": round(segundos / operaciones, 6)}
+
+        tracemalloc.start()
+        try:
+            for nombre, etapa in etapas(datos, semilla):
+                tracemalloc.reset_peak()
+                actual = tracemalloc.get_traced_memory()[0]
+                etapa()
+                resultados[nombre]["pico_mib"] = round((tracemalloc.get_traced_memory()[1] - actual) / 2**20, 2)
+        finally:
+            tracemalloc.stop()
+    finally:
+        gps.registro = anterior
+
+    return {
+        "ciudad": {"cruces_pedidos": cruces, "semilla": semilla, "filas_cruces": len(datos.cruces),
+                   "direcciones": len(datos.direcciones), "segundos_generacion": round(generacion, 3)},
+        "entorno": {"python": platform.python_version(), "numpy": np.__version__, "plataforma": platform.platform(),
+                    "fecha": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "repeticiones": repeticiones,
+        # Peak resident memory of the whole process, in MiB (ru_maxrss is in KiB on Linux)
+        "rss_maximo_mib": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "etapas": resultados,
+    }
+
+def comparar(actual, base, tolerancia=TOLERANCIA):
+    """ Compares the stages of two results. Returns a row per stage in both:
+    (stage, base seconds, seconds, time ratio, memory ratio, is a regression) """
+    filas = []
+    for nombre, etapa in actual["etapas"].items():
+        anterior = base["etapas"].get(nombre)
+        if anterior is None:
+            continue
+        tiempo = etapa["segundos_por_operacion"] / max(anterior["segundos_por_operacion"], 1e-12)
+        memoria = (etapa["pico_mib"] + 1) / (anterior.get("pico_mib", etapa["pico_mib"]) + 1)
+        lenta = tiempo > 1 + tolerancia and etapa["segundos"] >= SEGUNDOS_MINIMOS
+        filas.append((nombre, anterior["segundos"], etapa["segundos"], tiempo, memoria, lenta or memoria > 1 + tolerancia))
+    return filas
+
+def imprimir(resultado, comparacion=None):
+    ciudad = resultado["ciudad"]
+    print(f"Synthetic city: {ciudad['filas_cruces']} intersection rows, {ciudad['direcciones']} addresses "
+          f"(generated in {ciudad['segundos_generacion']} s), peak RSS {resultado['rss_maximo_mib']} MiB")
+    print(f"{'stage':>18} {'seconds':>10} {'ops':>7} {'ms/op':>9} {'peak MiB':>9}")
+    for nombre, etapa in resultado["etapas"].items():
+        print(f"{nombre:>18} {etapa['segundos']:>10.3f} {etapa['operaciones']:>7} "
+              f"{1000 * etapa['segundos_por_operacion']:>9.3f} {etapa['pico_mib']:>9.1f}")
+    if comparacion is not None:
+        print(f"\n{'stage':>18} {'base (s)':>10} {'now (s)':>10} {'time':>7} {'memory':>7}")
+        for nombre, anterior, segundos, tiempo, memoria, regresion in comparacion:
+            print(f"{nombre:>18} {anterior:>10.3f} {segundos:>10.3f} {tiempo:>6.2f}x {memoria:>6.2f}x" + ("  REGRESSION" if regresion else ""))
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="Performance suite on a synthetic city")
+    argumentos.add_argument("--cruces", type=int, default=CRUCES, help="approximate number of intersections")
+    argumentos.add_argument("--semilla", type=int, default=SEMILLA)
+    argumentos.add_argument("--repeticiones", type=int, default=1, help="the lowest time of the repetitions is kept")
+    argumentos.add_argument("--salida", help="JSON file where the results are written")
+    argumentos.add_argument("--base", help="JSON file of previous results to compare with")
+    argumentos.add_argument("--tolerancia", type=float, default=TOLERANCIA, help="relative growth allowed before a regression")
+    argumentos = argumentos.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    resultado = ejecutar(argumentos.cruces, argumentos.semilla, argumentos.repeticiones)
+    comparacion = None
+    if argumentos.base:
+        with open(argumentos.base) as fichero:
+            comparacion = comparar(resultado, json.load(fichero), argumentos.tolerancia)
+    imprimir(resultado, comparacion)
+    if argumentos.salida:
+        with open(argumentos.salida, "w") as fichero:
+            json.dump(resultado, fichero, indent=2)
+    if comparacion is not None and any(fila[-1] for fila in comparacion):
+        sys.exit(1)
@@ -0,0 +1,108 @@
+"""
+servidor.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Benchmark of the multi-worker serving modes of the API on the data of data/:
+    uvicorn   python -m uvicorn src.api:app --workers N, every worker loads the
+              street map on its own (from the bundle if there is one)
+    prefork   python -m src.servidor --workers N, the master loads it once and
+              forks the workers (see src/servidor.py)
+For each mode it measures the cold start (seconds until every worker has answered)
+and, after some route requests, the memory of the processes read from
+/proc/<pid>/smaps_rollup (Linux only): RSS, PSS (shared pages split among the
+processes that map them, so the sum is the real total) and USS (private pages).
+
+    python -m benchmarks.servidor [workers] [requests per worker]
+"""
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRABAJADORES = 4
+PETICIONES = 20
+PUERTO = 8791
+ESPERA_MAXIMA = 600
+
+COMANDOS = {
+    "uvicorn": [sys.executable, "-m", "uvicorn", "src.api:app", "--log-level", "warning", "--port", "{puerto}", "--workers", "{trabajadores}"],
+    "prefork": [sys.executable, "-m", "src.servidor", "--port", "{puerto}", "--workers", "{trabajadores}"],
+}
+
+
+def pedir(puerto, ruta, cuerpo=None):
+    """ JSON response of a request to the local server """
+    datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+    peticion = urllib.request.Request(f"http://127.0.0.1:{puerto}{ruta}", data=datos, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(peticion, timeout=60) as respuesta:
+        return json.loads(respuesta.read())
+
+def memoria(pid):
+    """ RSS, PSS and USS of a process in MiB """
+    campos = dict()
+    with open(f"/proc/{pid}/smaps_rollup") as fichero:
+        for linea in fichero:
+            partes = linea.split()
+            if len(partes) == 3 and partes[2] == "kB":
+                campos[partes[0].rstrip(":")] = int(partes[1]) / 1024
+    return {"rss": campos["Rss"], "pss": campos["Pss"], "uss": campos["Private_Clean"] + campos["Private_Dirty"]}
+
+def medir_modo(modo, trabajadores, peticiones, direcciones):
+    """ Starts the server of a mode, measures it and stops it """
+    comando = [parte.format(puerto=PUERTO, trabajadores=trabajadores) for parte in COMANDOS[modo]]
+    entorno = dict(os.environ, PYTHONPATH=RAIZ)
+    inicio = time.perf_counter()
+    servidor = subprocess.Popen(comando, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Cold start: until every worker has answered once
+        vistos = set()
+        while len(vistos) < trabajadores:
+            if time.perf_counter() - inicio > ESPERA_MAXIMA or servidor.poll() is not None:
+                raise RuntimeError(f"The {modo} server did not start")
+            try:
+                vistos.add(pedir(PUERTO, "/")["worker"])
+            except OSError:
+                time.sleep(0.05)
+        arranque = time.perf_counter() - inicio
+
+        aleatorio = random.Random(0)
+        for _ in range(peticiones * trabajadores):
+            origen, destino = aleatorio.sample(direcciones, 2)
+            pedir(PUERTO, "/ruta", {"origen": origen, "destino": destino, "modo": aleatorio.choice("SF")})
+
+        maestro = memoria(servidor.pid)
+        procesos = [memoria(pid) for pid in vistos]
+        return {"modo": modo, "trabajadores": trabajadores, "arranque_s": round(arranque, 2),
+                "maestro": {clave: round(valor, 1) for clave, valor in maestro.items()},
+                "por_trabajador": {clave: round(sum(p[clave] for p in procesos) / len(procesos), 1) for clave in maestro},
+                "pss_total": round(maestro["pss"] + sum(p["pss"] for p in procesos), 1)}
+    finally:
+        servidor.terminate()
+        try:
+            servidor.wait(30)
+        except subprocess.TimeoutExpired:
+            servidor.kill()
+
+def ejecutar(trabajadores=TRABAJADORES, peticiones=PETICIONES):
+    """ Measures both modes and returns a row per mode """
+    import src.gps as gps
+    direcciones = list(gps.obtener_direcciones())
+    return [medir_modo(modo, trabajadores, peticiones, direcciones) for modo in COMANDOS]
+
+
+if __name__ == "__main__":
+    argumentos = [int(n) for n in sys.argv[1:3]]
+    filas = ejecutar(*argumentos)
+    print(f"{'mode':>8} {'workers':>8} {'start (s)':>10} {'master PSS':>11} {'worker RSS':>11} {'worker PSS':>11} "
+          f"{'worker USS':>11} {'total PSS':>10}   (MiB)")
+    for fila in filas:
+        trabajador = fila["por_trabajador"]
+        print(f"{fila['modo']:>8} {fila['trabajadores']:>8} {fila['arranque_s']:>10.2f} {fila['maestro']['pss']:>11.1f} "
+              f"{trabajador['rss']:>11.1f} {trabajador['pss']:>11.1f} {trabajador['uss']:>11.1f} {fila['pss_total']:>10.1f}")
@@ -0,0 +1,89 @@
+"""
+unificar_cruces.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Benchmark of callejero.unificar_cruces (uniform grid + greedy clustering) against
+the previous implementation, which computed the distance from every intersection
+to all the others. The intersections are synthetic: points of a city of the given
+size where each real intersection appears in several rows a few metres apart, as
+in the DGT data.
+
+    python -m benchmarks.unificar_cruces [n1 n2 ...]
+"""
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import src.callejero as callejero
+
+TAMANOS = (1000, 5000, 20000)
+# The previous implementation is O(n^2): above this size it is not run
+MAXIMO_ORIGINAL = 20000
+
+
+def unificar_cruces_original(cruces, R=30*100):
+    """ Previous implementation of callejero.unificar_cruces, kept for comparison """
+    # pandas warns about writing the float means into the int columns
+    warnings.simplefilter("ignore", FutureWarning)
+    coordenadas = cruces[['Coordenada X (Guia Urbana) cm (cruce)', 'Coordenada Y (Guia Urbana) cm (cruce)']].to_numpy()
+
+    for index, cruce in enumerate(coordenadas):
+        distancias = np.sqrt(np.sum((coordenadas - cruce)**2, axis=1))
+        cruces_cercanos = np.where(distancias < R)[0]
+
+    if len(cruces_cercanos) > 1:
+        x_media = coordenadas[cruces_cercanos, 0].mean()
+        y_media = coordenadas[cruces_cercanos, 1].mean()
+
+        indice_cruce_a_conservar = cruces_cercanos[0]
+        indices_cruces_a_eliminar = cruces_cercanos[1:]
+
+        cruces = cruces.drop(index=indices_cruces_a_eliminar)
+
+        cruces.at[indice_cruce_a_conservar, 'Coordenada X (Guia Urbana) cm (cruce)'] = x_media
+        cruces.at[indice_cruce_a_conservar, 'Coordenada Y (Guia Urbana) cm (cruce)'] = y_media
+
+    return cruces
+
+
+def cruces_sinteticos(n, semilla=0):
+    """ DataFrame of n rows: n/3 intersections spread over a square with a density like that
+    of Madrid (about 15000 intersections in 25 km x 25 km), each one in 3 rows up to 5 m apart """
+    rng = np.random.default_rng(semilla)
+    lado = int(2500000 * np.sqrt(n / 3 / 15000))
+    centros = rng.integers(0, lado, size=(-(-n // 3), 2))
+    coordenadas = np.repeat(centros, 3, axis=0)[:n] + rng.integers(-500, 500, size=(n, 2))
+    return pd.DataFrame(coordenadas, columns=callejero.COLUMNAS_COORDENADAS_CRUCE)
+
+
+def medir(funcion, cruces):
+    inicio = time.perf_counter()
+    resultado = funcion(cruces)
+    return time.perf_counter() - inicio, resultado
+
+
+def ejecutar(tamanos=TAMANOS):
+    """ Runs both implementations for each size and returns a list of rows
+    (n, seconds of the previous one or None, seconds of the current one, unified intersections) """
+    filas = []
+    for n in tamanos:
+        cruces = cruces_sinteticos(n)
+        segundos_original = medir(unificar_cruces_original, cruces)[0] if n <= MAXIMO_ORIGINAL else None
+        segundos, unificados = medir(callejero.unificar_cruces, cruces)
+        filas.append((n, segundos_original, segundos, unificados[callejero.COLUMNA_CRUCE_UNIFICADO].nunique()))
+    return filas
+
+
+if __name__ == "__main__":
+    tamanos = [int(n) for n in sys.argv[1:]] or TAMANOS
+    print(f"{'rows':>10} {'previous (s)':>14} {'grid (s)':>10} {'speed-up':>9} {'intersections':>14}")
+    for n, original, actual, grupos in ejecutar(tamanos):
+        previa = f"{original:14.3f}" if original is not None else f"{'-':>14}"
+        mejora = f"{original/actual:8.1f}x" if original is not None else f"{'-':>9}"
+        print(f"{n:>10} {previa} {actual:10.3f} {mejora} {grupos:>14}")
@@ -1,39 +1,109 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
+import json
+import math
+import os
+import time
 from src.gps import dirigir_ruta_api
-from difflib import get_close_matches
-from src.callejero import direcciones
 import src.gps as gps
+import src.metricas as metricas
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Lazy load of addresses
-_nombre_direcciones = None
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Paths of the endpoints, all registered by now, for the labels of the metrics (see medir_peticion)
+    app.state.rutas = frozenset(ruta.path for ruta in app.routes)
+    # Addresses, their search index and the graphs are loaded once per process before serving,
+    # so that each request only snaps the addresses, searches the route and writes the instructions
+    try:
+        gps.registro.precargar()
+        logger.info("Addresses and graphs loaded.")
+    except Exception:
+        logger.exception("Could not preload the street map, it will be loaded by the first request")
+    yield
+    # Worker processes of the batch routes and distance matrices
+    gps.registro.cerrar()
+
+app = FastAPI(lifespan=lifespan)
+# Worker processes serving the API, set by src/servidor.py (uvicorn --workers only tells through WEB_CONCURRENCY).
+# Each one has its own street map, so the incidents, which change the graphs of one process, need a single worker.
+app.state.trabajadores = int(os.environ.get("WEB_CONCURRENCY", 1))
 
-def get_nombre_direcciones():
-    global _nombre_direcciones
-    if _nombre_direcciones is None:
-        logger.info("Loading addresses for the first time...")
-        _nombre_direcciones = gps.cargar_direcciones(direcciones).keys()
-        logger.info(f"Loaded {_nombre_direcciones.__len__()} addresses.")
-    return _nombre_direcciones
+PETICIONES = metricas.registro.contador("api_peticiones_total", "HTTP requests answered", ("endpoint", "metodo", "estado"))
+ERRORES = metricas.registro.contador("api_errores_total", "Requests answered with an error", ("endpoint",))
+DURACION = metricas.registro.histograma("api_peticion_segundos", "Time until the response of each request", etiquetas=("endpoint",))
 
-app = FastAPI()
+def error(endpoint: str, mensaje: str) -> dict:
+    ERRORES.incrementar(endpoint=endpoint)
+    return {"error": mensaje}
+
+@app.middleware("http")
+async def medir_peticion(request: Request, call_next):
+    # Every stage measured while answering (metricas.tramo) is collected for the X-Route-Timing header,
+    # sent when the request has that header. Unknown paths share one label to bound the series.
+    rutas = getattr(app.state, "rutas", None)
+    if rutas is None:
+        # Served without running lifespan (e.g. a test client outside a with block)
+        rutas = app.state.rutas = frozenset(ruta.path for ruta in app.routes)
+    endpoint = request.url.path if request.url.path in rutas else "otro"
+    inicio = time.perf_counter()
+    with metricas.desglose() as tiempos:
+        response = await call_next(request)
+    total = time.perf_counter() - inicio
+    PETICIONES.incrementar(endpoint=endpoint, metodo=request.method, estado=str(response.status_code))
+    DURACION.observar(total, endpoint=endpoint)
+    if "x-route-timing" in request.headers:
+        response.headers["X-Route-Timing"] = metricas.cabecera_tiempos(tiempos, total)
+    return response
 
 class RutaRequest(BaseModel):
     origen: str
     destino: str
     modo: str  # "distancia" o "tiempo"
 
+class MatrizRequest(BaseModel):
+    origenes: List[str]
+    destinos: List[str]
+    modo: str  # "S" (distancia) o "F" (tiempo)
+
+class ParRuta(BaseModel):
+    origen: str
+    destino: str
+
+class RutasRequest(BaseModel):
+    pares: List[ParRuta]
+    modo: str  # "S" (distancia) o "F" (tiempo)
+    instrucciones: bool = False  # also return the directions of each route
+    procesos: Optional[int] = None  # worker processes, one per core by default
+
+class CambioArista(BaseModel):
+    origen: List[int]  # coordinates (x, y) in cm of the intersection
+    destino: List[int]
+    peso: Optional[float] = None  # new weight in the unit of the mode, null closes the edge
+
+class CambioCalle(BaseModel):
+    codigo_via: int
+    factor: Optional[float] = None  # factor applied to the original weight of the street, null closes it
+
+class IncidenciasRequest(BaseModel):
+    modo: Optional[str] = None  # "S", "F" or null for both
+    aristas: List[CambioArista] = []
+    calles: List[CambioCalle] = []
+
 class InputProcesser:
     @staticmethod
     def seleccionar_calle(direccion: str) -> str:
         direccion_upper = direccion.upper()
-        nombre_direcciones = get_nombre_direcciones()
-        coincidencias = get_close_matches(direccion_upper, nombre_direcciones, n=1, cutoff=0.6)
+        # Strict: every word must match, a partial match would route to an unrelated address
+        with metricas.tramo("seleccion"):
+            coincidencias = gps.buscar_direcciones(direccion, n=1, estricta=True)
         
         if coincidencias:
             calle_seleccionada = coincidencias[0]
@@ -57,7 +127,27 @@ class InputProcesser:
 @app.get("/")
 def root():
     logger.info("Route API running")
-    return {"message": "Route API running"}
+    # The process id tells which worker answered when there are several
+    return {"message": "Route API running", "worker": os.getpid()}
+
+@app.get("/direcciones")
+def autocompletar_direcciones(q: str = Query(..., min_length=1), n: int = Query(5, ge=1, le=50)):
+    # Type-ahead: the addresses that best match what the user has typed so far
+    return {"direcciones": gps.buscar_direcciones(q, n)}
+
+@app.get("/metrics")
+def exponer_metricas():
+    # Prometheus text format: requests, errors, stage durations, search work and the route cache
+    cache = gps.registro.cache.estadisticas()
+    lineas = metricas.exponer_valores("gps_cache_rutas_total", "Events of the route cache", "counter",
+                                      {evento: cache[evento] for evento in gps.registro.cache.contadores}, "evento")
+    lineas += metricas.exponer_valores("gps_cache_rutas_entradas", "Routes in the cache", "gauge", {"actual": cache["entradas"]}, "tipo")
+    return PlainTextResponse(metricas.registro.exponer() + "\n".join(lineas) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/cache")
+def estadisticas_cache():
+    # Hits, misses, coalesced requests, evictions and invalidations of the route cache
+    return {**gps.registro.cache.estadisticas(), "version": gps.registro.version}
 
 @app.post("/ruta")
 def obtener_ruta(req: RutaRequest):
@@ -70,9 +160,107 @@ def obtener_ruta(req: RutaRequest):
         logger.info("Route obtained")
 
         if not ruta:
-            return {"error": "No route found for those parameters"}
+            return error("/ruta", "No route found for those parameters")
 
         return {"ruta": ruta}
     except Exception as e:
         logger.exception("Error getting the route")
-        return {"error": str(e)}
+        return error("/ruta", str(e))
+
+@app.post("/ruta/stream")
+def obtener_ruta_stream(req: RutaRequest, formato: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    # The directions are sent one by one as they are written, as JSON lines (NDJSON) or Server-Sent Events.
+    # The generator runs in the threadpool of the server and the route is only searched once the stream starts.
+    def mensaje(contenido: dict) -> str:
+        linea = json.dumps(contenido, ensure_ascii=False)
+        return f"data: {linea}\n\n" if formato == "sse" else linea + "\n"
+
+    def instrucciones():
+        try:
+            origen = InputProcesser.seleccionar_calle(req.origen)
+            destino = InputProcesser.seleccionar_calle(req.destino)
+            modo = InputProcesser.elegir_modo(req.modo)
+            logger.info(f"Starting streamed route: {origen} -> {destino}, mode {modo}")
+            _, _, generador = gps.planificar_ruta(origen, destino, modo)
+            for instruccion in generador:
+                yield mensaje({"instruccion": instruccion})
+            yield mensaje({"fin": True})
+        except Exception as e:
+            logger.exception("Error streaming the route")
+            yield mensaje(error("/ruta/stream", str(e)))
+
+    tipo = "text/event-stream" if formato == "sse" else "application/x-ndjson"
+    return StreamingResponse(instrucciones(), media_type=tipo)
+
+@app.post("/matriz")
+def obtener_matriz(req: MatrizRequest):
+    try:
+        origenes = [InputProcesser.seleccionar_calle(direccion) for direccion in req.origenes]
+        destinos = [InputProcesser.seleccionar_calle(direccion) for direccion in req.destinos]
+        modo = InputProcesser.elegir_modo(req.modo)
+        logger.info(f"Starting distance matrix: {len(origenes)} origins x {len(destinos)} destinations, mode {modo}")
+        matriz = gps.matriz_distancias(origenes, destinos, modo)
+        logger.info("Distance matrix obtained")
+
+        # Unreachable pairs are returned as null, JSON has no infinity
+        return {
+            "origenes": origenes,
+            "destinos": destinos,
+            "matriz": [[coste if math.isfinite(coste) else None for coste in fila] for fila in matriz.tolist()]
+        }
+    except Exception as e:
+        logger.exception("Error getting the distance matrix")
+        return error("/matriz", str(e))
+
+@app.post("/rutas")
+def obtener_rutas(req: RutasRequest):
+    # Batch routing: the pairs are searched in parallel by the persistent pool of processes that share the graph
+    try:
+        pares = [(InputProcesser.seleccionar_calle(par.origen), InputProcesser.seleccionar_calle(par.destino))
+                 for par in req.pares]
+        modo = InputProcesser.elegir_modo(req.modo)
+        logger.info(f"Starting batch routing: {len(pares)} pairs, mode {modo}")
+        resultados = gps.rutas_en_lote(pares, modo, req.instrucciones, req.procesos)
+        logger.info("Batch routing finished")
+
+        rutas = []
+        for (origen, destino), resultado in zip(pares, resultados):
+            if resultado.get("camino") is not None:
+                resultado["camino"] = [[cruce.coord_x, cruce.coord_y] for cruce in resultado["camino"]]
+            rutas.append({"origen": origen, "destino": destino, **resultado})
+        return {"rutas": rutas}
+    except Exception as e:
+        logger.exception("Error getting the routes")
+        return error("/rutas", str(e))
+
+@app.post("/incidencias")
+def registrar_incidencias(req: IncidenciasRequest):
+    # Closures and traffic change the weights of the graphs in place, without rebuilding them
+    if app.state.trabajadores > 1:
+        return error("/incidencias", "Incidents only change the worker that receives them: run the API with a single worker to use them")
+    try:
+        modos = [InputProcesser.elegir_modo(req.modo)] if req.modo else list(gps.MODOS)
+        if len(modos) > 1 and any(cambio.peso is not None for cambio in req.aristas):
+            return error("/incidencias", "The new weight of an edge needs a mode")
+        if any(cambio.factor is not None and cambio.factor < 1 for cambio in req.calles):
+            return error("/incidencias", "Factors must be at least 1")
+        cruces = gps.registro.cruces()
+        cambios = [(cruces[tuple(cambio.origen)], cruces[tuple(cambio.destino)], math.inf if cambio.peso is None else cambio.peso)
+                   for cambio in req.aristas]
+        factores = {cambio.codigo_via: math.inf if cambio.factor is None else cambio.factor for cambio in req.calles}
+        # Every intersection, street and weight of every mode is checked before changing anything,
+        # so a rejected request leaves the graphs as they were
+        validados = {modo: gps.registro.validar_pesos(modo, cambios + gps.registro.cambios_factores(modo, factores))
+                     for modo in modos}
+        cambiadas = {modo: gps.registro.actualizar_pesos(modo, validados[modo]) for modo in modos}
+        logger.info(f"Incidents applied, edges changed: {cambiadas}")
+        return {"aristas": cambiadas, "version": gps.registro.version}
+    except KeyError as e:
+        logger.warning(f"Unknown intersection or street in the incidents: {e}")
+        return error("/incidencias", f"Unknown intersection or street: {e}")
+    except ValueError as e:
+        logger.warning(f"Rejected incidents: {e}")
+        return error("/incidencias", str(e))
+    except Exception as e:
+        logger.exception("Error applying the incidents")
+        return error("/incidencias", str(e))
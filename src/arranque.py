@@ -0,0 +1,77 @@
+"""
+arranque.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Startup-time report. Measures, in the current process, how long each stage of a
+cold start takes: importing the modules, loading the compiled bundle (or reading
+the CSV files), building the address dictionary and the graph of a mode.
+
+Run it in a fresh process, otherwise the modules are already imported:
+    python -m src.arranque [shortest|fastest]
+For a per-module breakdown of the imports use:
+    python -X importtime -m src.arranque
+"""
+
+from typing import List,Tuple
+import importlib
+import sys
+import time
+
+MODULOS = ("src.grafo", "src.callejero", "src.gps", "src.api")
+
+
+def informe_arranque(modo:str="fastest",modulos:Tuple[str]=MODULOS)->List[Tuple[str,float]]:
+    """ Runs the stages of a cold start and measures each one.
+
+    Args:
+        modo (str, optional): mode of the graph that is built ("shortest" or "fastest").
+        modulos (Tuple[str], optional): modules imported, in order. Each one only counts
+            the time of the modules it imports that were not imported before.
+    Returns:
+        List[Tuple[str,float]]: (stage, seconds) for each stage, in the order they ran.
+    """
+    etapas = []
+
+    def medir(etapa, funcion, *args):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        etapas.append((etapa, time.perf_counter() - inicio))
+        return resultado
+
+    for modulo in modulos:
+        ya_importado = modulo in sys.modules
+        medir(f"import {modulo}" + (" (already imported)" if ya_importado else ""), importlib.import_module, modulo)
+
+    import src.callejero as callejero
+    import src.gps as gps
+    if medir("compiled bundle", lambda: callejero.datos.paquete) is None:
+        etapas[-1] = ("compiled bundle (missing or out of date)", etapas[-1][1])
+    medir("address dictionary", gps.obtener_direcciones)
+    medir(f"graph '{modo}'", gps.crear_grafo, modo)
+
+    # Breakdown of the CSV stages, if they had to be read
+    for etapa, segundos in callejero.datos.tiempos.items():
+        if etapa != "paquete":
+            etapas.append((f"  {etapa}", segundos))
+    return etapas
+
+
+def imprimir_informe(etapas:List[Tuple[str,float]])->None:
+    """ Prints the stages of informe_arranque as a table in milliseconds """
+    ancho = max(len(etapa) for etapa, _ in etapas)
+    for etapa, segundos in etapas:
+        print(f"{etapa:<{ancho}}  {segundos*1000:10.1f} ms")
+    total = sum(segundos for etapa, segundos in etapas if not etapa.startswith(" "))
+    print(f"{'total':<{ancho}}  {total*1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    imprimir_informe(informe_arranque(*sys.argv[1:2]))
@@ -0,0 +1,225 @@
+"""
+buscador.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Search index of the addresses of the street map, for autocompletion. The names
+are normalized (upper case, no accents, words and numbers as separate tokens)
+and indexed three ways:
+    - an inverted index token -> addresses, stored as CSR arrays;
+    - the sorted array of distinct tokens, a flat prefix trie: the tokens that
+      start with a prefix are a contiguous range found with a binary search;
+    - an index trigram -> tokens, to find the tokens close to a misspelled one.
+A query only computes edit distances between its tokens and the few tokens that
+share trigrams with them, and ranks the addresses with NumPy arrays.
+"""
+
+from typing import Dict,List,Tuple
+import re
+import unicodedata
+
+import numpy as np
+
+# Maximum edit distance between a query token and an indexed token, by length of the query token
+DISTANCIA_MAXIMA = ((3, 0), (6, 1), (np.inf, 2))
+# Indexed tokens whose edit distance is computed for each misspelled query token
+CANDIDATOS_TRIGRAMAS = 30
+# Cost of a query token for an address none of whose tokens it matches
+SIN_COINCIDENCIA = np.iinfo(np.int64).max
+
+_TOKEN = re.compile(r"[A-Z]+|\d+")
+
+
+def normalizar(texto:str)->str:
+    """ Upper case text without accents, with its tokens (words and numbers) separated by one space """
+    return " ".join(tokenizar(texto))
+
+def tokenizar(texto:str)->List[str]:
+    """ Tokens of a text: its words and numbers in upper case and without accents ("NUM12B" -> NUM, 12, B) """
+    texto = unicodedata.normalize("NFKD", texto.upper()).encode("ascii", "ignore").decode("ascii")
+    return _TOKEN.findall(texto)
+
+def trigramas(token:str)->List[str]:
+    """ Trigrams of a token, with its start and end marked so that short tokens also have some """
+    marcado = f"${token}$"
+    return [marcado[i:i + 3] for i in range(len(marcado) - 2)]
+
+def distancia_edicion(a:str,b:str,maximo:int)->int:
+    """ Levenshtein distance between a and b, or maximo + 1 if it is larger than maximo """
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i]
+        for j, cb in enumerate(b, 1):
+            actual.append(min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + (ca != cb)))
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior = actual
+    return min(anterior[-1], maximo + 1)
+
+
+class IndiceDirecciones():
+    """
+    Search index over a list of addresses.
+    """
+
+    def __init__(self,nombres:List[str]):
+        """ Builds the index.
+
+        Args:
+            nombres (List[str]): names of the addresses, as the keys of gps.cargar_direcciones.
+        """
+        nombres = list(nombres)
+        # Ids in alphabetical order of the normalized names, so that ties are broken alphabetically
+        normalizados = [normalizar(nombre) for nombre in nombres]
+        orden = sorted(range(len(nombres)), key=lambda i: (normalizados[i], nombres[i]))
+        self.nombres = [nombres[i] for i in orden]
+        self.longitudes = np.array([len(normalizados[i]) for i in orden], dtype=np.int64)
+
+        tokens_nombres = [normalizados[i].split() for i in orden]
+        self.numero_tokens = np.array([len(tokens) for tokens in tokens_nombres], dtype=np.int64)
+        todos = [token for tokens in tokens_nombres for token in tokens]
+        ids = np.repeat(np.arange(len(self.nombres)), self.numero_tokens)
+        # Distinct tokens, sorted: the prefix trie
+        self.tokens, id_token = np.unique(np.array(todos, dtype=str), return_inverse=True)
+        id_token = id_token.reshape(-1)
+        self._posicion = {token: i for i, token in enumerate(self.tokens.tolist())}
+
+        # Inverted index token -> addresses (CSR, each list sorted and without repetitions)
+        pares = np.unique(id_token.astype(np.int64) * max(len(self.nombres), 1) + ids)
+        self.indptr = np.zeros(len(self.tokens) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pares // max(len(self.nombres), 1), minlength=len(self.tokens)), out=self.indptr[1:])
+        self.indices = pares % max(len(self.nombres), 1)
+
+        # Trigram -> tokens that contain it
+        por_trigrama:Dict[str,List[int]] = dict()
+        for i, token in enumerate(self.tokens.tolist()):
+            for trigrama in set(trigramas(token)):
+                por_trigrama.setdefault(trigrama, []).append(i)
+        self._trigramas = {trigrama: np.array(tokens, dtype=np.int64) for trigrama, tokens in por_trigrama.items()}
+
+    def __len__(self)->int:
+        return len(self.nombres)
+
+    def _con_prefijo(self,prefijo:str)->np.ndarray:
+        """ Ids of the tokens that start with prefijo """
+        inicio = np.searchsorted(self.tokens, prefijo, side="left")
+        fin = np.searchsorted(self.tokens, prefijo + "￿", side="left")
+        return np.arange(inicio, fin)
+
+    def _parecidos(self,token:str)->List[Tuple[int,int]]:
+        """ (id, edit distance) of the indexed tokens close to token, found through their shared trigrams """
+        maximo = next(distancia for longitud, distancia in DISTANCIA_MAXIMA if len(token) <= longitud)
+        if maximo == 0:
+            return []
+        listas = [self._trigramas[trigrama] for trigrama in set(trigramas(token)) if trigrama in self._trigramas]
+        if not listas:
+            return []
+        compartidos = np.bincount(np.concatenate(listas), minlength=len(self.tokens))
+        candidatos = np.argsort(-compartidos, kind="stable")[:CANDIDATOS_TRIGRAMAS]
+        parecidos = []
+        for i in candidatos[compartidos[candidatos] > 0].tolist():
+            distancia = distancia_edicion(token, self.tokens[i], maximo)
+            if distancia <= maximo:
+                parecidos.append((i, distancia))
+        return parecidos
+
+    def _coincidencias(self,token:str,prefijo:bool)->List[Tuple[int,int]]:
+        """ (id, cost) of the indexed tokens that match a query token: the token itself (cost 0),
+        the tokens it is a prefix of if prefijo (cost 0) and otherwise the close ones (their edit distance) """
+        if prefijo:
+            coincidencias = [(i, 0) for i in self._con_prefijo(token).tolist()]
+        else:
+            coincidencias = [(self._posicion[token], 0)] if token in self._posicion else []
+        return coincidencias or self._parecidos(token)
+
+    def _tamano(self,coincidencias:List[Tuple[int,int]])->int:
+        """ Number of entries of the inverted index of the given tokens """
+        return sum(int(self.indptr[i + 1] - self.indptr[i]) for i, _ in coincidencias)
+
+    def _coste(self,coincidencias:List[Tuple[int,int]],ids:np.ndarray=None)->np.ndarray:
+        """ Cost of a query token for each address of ids (all if None, otherwise sorted): the lowest
+        among the indexed tokens it matches, SIN_COINCIDENCIA if it matches none of them """
+        coste = np.full(len(self) if ids is None else len(ids), SIN_COINCIDENCIA, dtype=np.int64)
+        for i, distancia in coincidencias:
+            lista = self.indices[self.indptr[i]:self.indptr[i + 1]]
+            if ids is None:
+                posiciones = lista
+            elif len(lista) < len(ids):
+                # Binary search of the shorter sorted array in the longer one
+                posiciones = np.minimum(np.searchsorted(ids, lista), len(ids) - 1)
+                posiciones = posiciones[ids[posiciones] == lista]
+            else:
+                dentro = lista[np.minimum(np.searchsorted(lista, ids), len(lista) - 1)] == ids
+                posiciones = np.flatnonzero(dentro)
+            coste[posiciones] = np.minimum(coste[posiciones], distancia)
+        return coste
+
+    def buscar(self,consulta:str,n:int=5,estricta:bool=False)->List[str]:
+        """ The addresses that best match a query, best first.
+
+        Every query token must match a token of the address: exactly, as a prefix if it is the last
+        one and the query is still being typed (it does not end with a space), or with a small edit
+        distance. If no address matches every token, those that match the most are returned, unless
+        the search is strict: then the query is taken as complete (no prefixes) and nothing is returned.
+        The addresses are ranked by number of matched tokens, total edit distance, number of tokens
+        and length, and then alphabetically.
+
+        Args:
+            consulta (str): text typed by the user.
+            n (int, optional): maximum number of results.
+            estricta (bool, optional): only addresses that match every token of the whole query, to
+                resolve an address instead of suggesting some.
+        Returns:
+            List[str]: names of the addresses found.
+        """
+        tokens = tokenizar(consulta)
+        if not tokens or not len(self) or n <= 0:
+            return []
+        escribiendo = not estricta and not consulta[-1:].isspace()
+        coincidencias = [self._coincidencias(token, prefijo=escribiendo and posicion == len(tokens) - 1)
+                         for posicion, token in enumerate(tokens)]
+
+        # Addresses that match every token: the candidates are those of the rarest token,
+        # and only they are looked up in the inverted index of the others
+        candidatos, coste = None, 0
+        for coincidencias_token in sorted(coincidencias, key=self._tamano):
+            coste_token = self._coste(coincidencias_token, candidatos)
+            encontrado = np.flatnonzero(coste_token < SIN_COINCIDENCIA)
+            candidatos = encontrado if candidatos is None else candidatos[encontrado]
+            coste = coste_token[encontrado] + (coste if np.isscalar(coste) else coste[encontrado])
+            if not len(candidatos):
+                break
+
+        if not len(candidatos) and estricta:
+            return []
+        if not len(candidatos):
+            # None matches every token: those that match the most of them
+            faltan = np.zeros(len(self), dtype=np.int64)
+            coste = np.zeros(len(self), dtype=np.int64)
+            for coincidencias_token in coincidencias:
+                coste_token = self._coste(coincidencias_token)
+                encontrado = coste_token < SIN_COINCIDENCIA
+                faltan += ~encontrado
+                coste[encontrado] += coste_token[encontrado]
+            if faltan.min() == len(tokens):
+                return []
+            candidatos = np.flatnonzero(faltan == faltan.min())
+            coste = coste[candidatos]
+
+        clave = ((coste * 64 + np.minimum(self.numero_tokens[candidatos], 63)) * 256
+                 + np.minimum(self.longitudes[candidatos], 255))
+        if len(candidatos) > n:
+            # Only the best n are sorted; the others with the key of the n-th are kept for the ties
+            umbral = np.partition(clave, n - 1)[n - 1]
+            candidatos, clave = candidatos[clave <= umbral], clave[clave <= umbral]
+        mejores = candidatos[np.lexsort((candidatos, clave))][:n]
+        return [self.nombres[i] for i in mejores.tolist()]
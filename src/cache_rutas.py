@@ -0,0 +1,129 @@
+"""
+cache_rutas.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Bounded cache of computed routes. The entries are kept in least recently used
+order in an OrderedDict: a hit moves its entry to the end and, when the cache is
+full, the first one is evicted. Each entry also expires some seconds after it was
+computed. Concurrent requests of a key that is being computed for the same
+version of the graphs wait for that computation instead of repeating it. The
+cache belongs to a version of the graphs: when it is asked for a different one,
+every entry is discarded, and a computation of an older version in progress is
+not joined by the requests of the new one.
+"""
+
+from typing import Callable,Dict,Hashable
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+import time
+
+# Default number of entries and seconds each entry lives
+TAMANO_MAXIMO = 1024
+SEGUNDOS_VIDA = 600
+
+
+class CacheRutas():
+    """
+    LRU and TTL cache with request coalescing, safe to use from several threads.
+    """
+
+    def __init__(self,tamano_maximo:int=TAMANO_MAXIMO,segundos_vida:float=SEGUNDOS_VIDA,reloj:Callable[[],float]=time.monotonic):
+        """ Creates an empty cache.
+
+        Args:
+            tamano_maximo (int, optional): maximum number of entries, 0 disables the cache.
+            segundos_vida (float, optional): seconds after which an entry expires, None for never.
+            reloj (Callable[[],float], optional): clock in seconds, time.monotonic by default.
+        """
+        self.tamano_maximo = tamano_maximo
+        self.segundos_vida = segundos_vida
+        self.reloj = reloj
+        self.version = None
+        self._entradas:"OrderedDict[Hashable,tuple]" = OrderedDict()  # clave -> (valor, instante de caducidad)
+        self._en_curso:Dict[tuple,Future] = dict()  # (clave, version) -> resultado del cálculo en curso
+        self._cerrojo = threading.Lock()
+        self.contadores = {"aciertos": 0, "fallos": 0, "agrupadas": 0, "expulsiones": 0, "caducadas": 0, "invalidaciones": 0}
+
+    def __len__(self)->int:
+        return len(self._entradas)
+
+    def _comprobar_version(self,version:Hashable):
+        """ Discards every entry if the version of the graphs changed. Called with the lock held. """
+        if version != self.version:
+            if self._entradas:
+                self.contadores["invalidaciones"] += 1
+            self._entradas.clear()
+            self.version = version
+
+    def obtener(self,clave:Hashable,calcular:Callable[[],object],version:Hashable=None)->object:
+        """ Value of a key: the cached one if it has not expired, otherwise calcular() is called
+        once and stored. If another thread is already computing the key for the same version, its
+        result is awaited.
+        Exceptions of calcular are raised to every waiting thread and nothing is stored.
+
+        Args:
+            clave (Hashable): key of the value.
+            calcular (Callable[[],object]): function computing the value.
+            version (Hashable, optional): version of the data the value is computed from.
+        Returns:
+            object: value of the key.
+        """
+        with self._cerrojo:
+            self._comprobar_version(version)
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[1] is None or entrada[1] > self.reloj():
+                    self._entradas.move_to_end(clave)
+                    self.contadores["aciertos"] += 1
+                    return entrada[0]
+                del self._entradas[clave]
+                self.contadores["caducadas"] += 1
+            # Keyed by version too: a route of the graphs before a change must not be shared after it
+            en_curso = (clave, version)
+            futuro = self._en_curso.get(en_curso)
+            calcula = futuro is None
+            if calcula:
+                futuro = self._en_curso[en_curso] = Future()
+                self.contadores["fallos"] += 1
+            else:
+                self.contadores["agrupadas"] += 1
+        if not calcula:
+            return futuro.result()
+
+        try:
+            valor = calcular()
+        except BaseException as e:
+            with self._cerrojo:
+                del self._en_curso[en_curso]
+            futuro.set_exception(e)
+            raise
+        with self._cerrojo:
+            del self._en_curso[en_curso]
+            # A value computed for a version that is no longer current is not stored
+            if version == self.version and self.tamano_maximo > 0:
+                caducidad = None if self.segundos_vida is None else self.reloj() + self.segundos_vida
+                self._entradas[clave] = (valor, caducidad)
+                while len(self._entradas) > self.tamano_maximo:
+                    self._entradas.popitem(last=False)
+                    self.contadores["expulsiones"] += 1
+        futuro.set_result(valor)
+        return valor
+
+    def vaciar(self):
+        """ Discards every entry (the counters are kept) """
+        with self._cerrojo:
+            self._entradas.clear()
+
+    def estadisticas(self)->Dict[str,int]:
+        """ Counters of the cache and its current number of entries """
+        with self._cerrojo:
+            return dict(self.contadores, entradas=len(self._entradas), tamano_maximo=self.tamano_maximo)
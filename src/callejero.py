@@ -14,18 +14,118 @@ Library with auxiliary tools and classes needed for the representation of a stre
 
 Complete this description according to the functionalities added by the group.
 """
-import src.dgt_main as dgt_main
-import pandas as pd
+import src.paquete as paquete_ciudad
 import math
+import sys
+import time
+import typing
 import numpy as np
-cruces = dgt_main.cruces_read()
-direcciones = dgt_main.direcciones_read()
-cruces, direcciones = dgt_main.process_data(cruces, direcciones)
+
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+
+class DatosCallejero:
+    """
+    Loader of the data of the street map. Creating it reads nothing: the compiled bundle
+    (see paquete.py) and the CSV files are loaded the first time they are requested and
+    kept afterwards. The seconds spent in each loading stage are stored in tiempos.
+    """
+    def __init__(self, ruta_paquete=paquete_ciudad.RUTA_PAQUETE):
+        self.ruta_paquete = ruta_paquete
+        self.tiempos = dict()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """
+        Forgets the loaded data, so that the next access reads it again (e.g. after rebuilding the bundle).
+        """
+        self._paquete = None
+        self._paquete_buscado = False
+        self._csv = None
+
+    def _medir(self, etapa, funcion, *args):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        self.tiempos[etapa] = time.perf_counter() - inicio
+        return resultado
+
+    @property
+    def paquete(self):
+        """
+        Compiled bundle of the city, None if it does not exist or is out of date.
+        """
+        if not self._paquete_buscado:
+            self._paquete = self._medir("paquete", paquete_ciudad.cargar_paquete, self.ruta_paquete)
+            self._paquete_buscado = True
+        return self._paquete
+
+    def csv(self):
+        """
+        Reads and processes cruces.csv and direcciones.csv (only the first time it is called).
+        Returns the processed cruces and direcciones DataFrames.
+        """
+        if self._csv is None:
+            # pandas is only imported when the CSV files are really needed
+            import src.dgt_main as dgt_main
+            cruces = self._medir("lectura cruces.csv", dgt_main.cruces_read)
+            direcciones = self._medir("lectura direcciones.csv", dgt_main.direcciones_read)
+            self._csv = self._medir("limpieza csv", dgt_main.process_data, cruces, direcciones)
+        return self._csv
+
+    @property
+    def cruces(self):
+        return self.csv()[0]
+
+    @property
+    def direcciones(self):
+        return self.csv()[1]
+
+
+# Loader used by the rest of the package. With an up-to-date bundle the CSV files
+# are not needed to answer routes.
+datos = DatosCallejero()
+
+def __getattr__(nombre):
+    # callejero.paquete, callejero.cruces and callejero.direcciones are loaded on first access
+    if nombre in ("paquete", "cruces", "direcciones"):
+        return getattr(datos, nombre)
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
 # Constants with the maximum speeds established by the statement for each type of road.
 VELOCIDADES_CALLES={"AUTOVIA":100,"AVENIDA":90,"CARRETERA":70,"CALLEJON":30,"CAMINO":30,"ESTACION DE METRO":20,"PASADIZO":20,"PLAZUELA":20,"COLONIA":20}
 VELOCIDAD_CALLES_ESTANDAR=50
 
+def clases_de_via(direcciones: "pd.DataFrame")->"pd.DataFrame":
+    """
+    Table codigo de via -> clase de la via, with the class of the first address of each street.
+    """
+    return direcciones[["Codigo de via", "Clase de la via"]].drop_duplicates("Codigo de via")
+
+def clases_calles(codigos_via, direcciones: "pd.DataFrame")->np.ndarray:
+    """
+    Class of the road of each street of codigos_via ("" for streets without addresses),
+    joined in a single merge with the table of clases_de_via.
+    """
+    import pandas as pd
+    calles = pd.DataFrame({"Codigo de via": np.asarray(codigos_via, dtype=np.int64)})
+    clases = clases_de_via(direcciones).astype({"Codigo de via": np.int64, "Clase de la via": object})
+    clases = calles.merge(clases, on="Codigo de via", how="left")["Clase de la via"]
+    return clases.fillna("").astype(str).str.rstrip().to_numpy(dtype=str)
+
+def velocidades_calles(clases, velocidades: dict = None, velocidad_estandar: float = None)->np.ndarray:
+    """
+    Maximum speed (km/h) of each street from the class of its road, with the table
+    velocidades (VELOCIDADES_CALLES by default). Classes not in the table get
+    velocidad_estandar (VELOCIDAD_CALLES_ESTANDAR by default).
+    """
+    velocidades = VELOCIDADES_CALLES if velocidades is None else velocidades
+    velocidad_estandar = VELOCIDAD_CALLES_ESTANDAR if velocidad_estandar is None else velocidad_estandar
+    # The table is looked up once per distinct class and spread to the streets
+    distintas, inversa = np.unique(np.asarray(clases, dtype=str), return_inverse=True)
+    por_clase = np.array([velocidades.get(clase, velocidad_estandar) for clase in distintas.tolist()], dtype=np.float64)
+    return por_clase[inversa.reshape(-1)] if len(distintas) else np.zeros(0, dtype=np.float64)
+
 # ADDRESSES
 def concatenar_vias(direcciones):
     """
@@ -38,25 +138,87 @@ def concatenar_vias(direcciones):
     return direcciones
 
 
-def unificar_cruces(cruces, R=30*100):
-    coordenadas = cruces[['Coordenada X (Guia Urbana) cm (cruce)', 'Coordenada Y (Guia Urbana) cm (cruce)']].to_numpy()
-
-    for index, cruce in enumerate(coordenadas):
-        distancias = np.sqrt(np.sum((coordenadas - cruce)**2, axis=1))
-        cruces_cercanos = np.where(distancias < R)[0]
-
-    if len(cruces_cercanos) > 1:
-        x_media = coordenadas[cruces_cercanos, 0].mean()
-        y_media = coordenadas[cruces_cercanos, 1].mean()
-
-        indice_cruce_a_conservar = cruces_cercanos[0]
-        indices_cruces_a_eliminar = cruces_cercanos[1:]
+# Column added by unificar_cruces with the id of the unified intersection of each row
+COLUMNA_CRUCE_UNIFICADO = "Cruce unificado"
+COLUMNAS_COORDENADAS_CRUCE = ['Coordenada X (Guia Urbana) cm (cruce)', 'Coordenada Y (Guia Urbana) cm (cruce)']
 
-        cruces = cruces.drop(index=indices_cruces_a_eliminar)
-
-        cruces.at[indice_cruce_a_conservar, 'Coordenada X (Guia Urbana) cm (cruce)'] = x_media
-        cruces.at[indice_cruce_a_conservar, 'Coordenada Y (Guia Urbana) cm (cruce)'] = y_media
+def pares_cercanos(coordenadas, R):
+    """
+    Pairs (i, j) with i < j of points closer than R, found with a uniform grid of cells of side R:
+    only points in the same or in adjacent cells can be closer than R. Sorting the points by cell
+    makes it O(n log n) plus the number of candidate pairs, instead of comparing every pair.
+    Returns two arrays, sorted by i.
+    """
+    coordenadas = np.asarray(coordenadas, dtype=np.float64).reshape(-1, 2)
+    n = len(coordenadas)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    celdas = np.floor((coordenadas - coordenadas.min(axis=0)) / R).astype(np.int64)
+    # Cell key with a margin of one cell on each side so that adjacent keys never wrap around
+    alto = int(celdas[:, 1].max()) + 3
+    claves = (celdas[:, 0] + 1) * alto + celdas[:, 1] + 1
+    orden = np.argsort(claves, kind="stable")
+    claves_celdas, inicio, cuenta = np.unique(claves[orden], return_index=True, return_counts=True)
+
+    origenes, destinos = [], []
+    # Each pair of adjacent cells is visited once: the cell itself and 4 of its 8 neighbours
+    for desplazamiento in (0, 1, alto - 1, alto, alto + 1):
+        vecinas = claves_celdas + desplazamiento
+        posicion = np.minimum(np.searchsorted(claves_celdas, vecinas), len(claves_celdas) - 1)
+        a = np.flatnonzero(claves_celdas[posicion] == vecinas)
+        b = posicion[a]
+        # Every point of cell a with every point of cell b
+        pares = cuenta[a] * cuenta[b]
+        par = np.repeat(np.arange(len(a)), pares)
+        t = np.arange(len(par)) - np.repeat(np.cumsum(pares) - pares, pares)
+        i = orden[inicio[a][par] + t // cuenta[b][par]]
+        j = orden[inicio[b][par] + t % cuenta[b][par]]
+        cerca = (i != j) & (np.hypot(*(coordenadas[i] - coordenadas[j]).T) < R)
+        if desplazamiento == 0:
+            cerca &= i < j
+        origenes.append(np.minimum(i, j)[cerca])
+        destinos.append(np.maximum(i, j)[cerca])
+    origenes, destinos = np.concatenate(origenes), np.concatenate(destinos)
+    orden = np.lexsort((destinos, origenes))
+    return origenes[orden], destinos[orden]
+
+def agrupar_cruces(coordenadas, R):
+    """
+    Greedy leader clustering of points: in order, each point that has no group yet starts a new
+    one, and every point without a group closer than R to it joins that group. Every point of a
+    group is then closer than R to its first point.
+    Returns the group id of each point, numbered from 0 in order of appearance.
+    """
+    n = len(coordenadas)
+    origenes, destinos = pares_cercanos(coordenadas, R)
+    indptr = np.searchsorted(origenes, np.arange(n + 1)).tolist()
+    destinos = destinos.tolist()
+    grupos = [-1] * n
+    numero_grupos = 0
+    for i in range(n):
+        if grupos[i] == -1:
+            grupos[i] = numero_grupos
+            for j in destinos[indptr[i]:indptr[i + 1]]:
+                if grupos[j] == -1:
+                    grupos[j] = numero_grupos
+            numero_grupos += 1
+    return np.array(grupos, dtype=np.int64)
 
+def unificar_cruces(cruces, R=30*100):
+    """
+    Unifies the intersections closer than R (in cm): the rows of each group found by
+    agrupar_cruces get the coordinates of the centroid of the group, rounded to whole cm,
+    and its id in the column COLUMNA_CRUCE_UNIFICADO. No row is dropped, so every street
+    of every row is kept in the unified intersection.
+    """
+    cruces = cruces.copy()
+    coordenadas = cruces[COLUMNAS_COORDENADAS_CRUCE].to_numpy(dtype=np.float64)
+    grupos = agrupar_cruces(coordenadas, R)
+    tamanos = np.bincount(grupos)
+    for k, columna in enumerate(COLUMNAS_COORDENADAS_CRUCE):
+        centroides = np.rint(np.bincount(grupos, weights=coordenadas[:, k]) / tamanos).astype(np.int64)
+        cruces[columna] = centroides[grupos]
+    cruces[COLUMNA_CRUCE_UNIFICADO] = grupos
     return cruces
 
 
@@ -64,12 +226,21 @@ class Cruce:
 
     # Complete this class with the data and methods needed to associate with each intersection
 
-    def __init__(self,coord_x,coord_y, loc):
+    # Without a __dict__ each intersection only takes the memory of these fields; a view of
+    # TablasCallejero does not store its location or its streets, they are read from the tables
+    __slots__ = ("coord_x", "coord_y", "_hash", "_loc", "_tablas", "_id", "_calles")
+
+    def __init__(self,coord_x,coord_y, loc, tablas=None, id_cruce=None):
         self.coord_x=coord_x
         self.coord_y=coord_y
-        self.calles = set()
-        self.loc = loc # location
-        # Complete the initialization of added data structures
+        self._hash = hash((coord_x, coord_y))
+        self._loc = loc # location, None for a view
+        # An intersection created by TablasCallejero is a view: its streets are read from the
+        # tables every time they are needed, as a frozenset so that changing them in place fails
+        # instead of being lost; agregar_calle or assigning calles keeps a set of its own
+        self._tablas = tablas
+        self._id = id_cruce
+        self._calles = set() if tablas is None else None
 
     """The Cruce class is made "hashable" by implementing the
     __eq__ and __hash__ methods, making two objects of type Cruce considered equal when
@@ -78,8 +249,45 @@ class Cruce:
     The __hash__ function is adapted accordingly 
     to only depend on the pair (coord_x, coord_y).
     """
+    @property
+    def loc(self):
+        if self._loc is None and self._tablas is not None:
+            return (float(self._tablas.cruces_lon[self._id]), float(self._tablas.cruces_lat[self._id]))
+        return self._loc
+
+    @loc.setter
+    def loc(self, loc):
+        self._loc = loc
+
+    @property
+    def calles(self):
+        if self._calles is None:
+            return frozenset(self._tablas.calles_de_cruce(self._id))
+        return self._calles
+
+    @calles.setter
+    def calles(self, calles):
+        self._calles = set(calles)
+
+    @property
+    def ids_calles(self):
+        # Ids of the names of the streets in the tables (None if the intersection is not a view)
+        if self._tablas is not None and self._calles is None:
+            return self._tablas.ids_calles_de_cruce(self._id)
+
+    def calle_comun(self, otro):
+        # Name of a street of both intersections ("" if there is none); views compare the ids of the names
+        ids, ids_otro = self.ids_calles, otro.ids_calles
+        if ids is not None and ids_otro is not None and self._tablas is otro._tablas:
+            comunes = set(ids).intersection(ids_otro)
+            return self._tablas._nombre(min(comunes)) if comunes else ""
+        comunes = self.calles.intersection(otro.calles)
+        return min(comunes) if comunes else ""
+
     def agregar_calle(self, calle):
-        self.calles.add(calle) 
+        if self._calles is None:
+            self._calles = set(self.calles)
+        self._calles.add(calle) 
     def lista_calles(self):
         return list(self.calles) # returns a list with all the streets at the intersection
 
@@ -90,7 +298,17 @@ class Cruce:
             return False
     
     def __hash__(self) -> int:
-        return hash((self.coord_x,self.coord_y))
+        return self._hash
+
+    def __getstate__(self):
+        # A pickled intersection keeps its location and streets but not the tables it is a view of
+        return {"coord_x": self.coord_x, "coord_y": self.coord_y, "loc": self.loc, "calles": self.calles}
+
+    def __setstate__(self, estado):
+        # Also reads the state of intersections pickled when the class had a __dict__
+        self.__init__(estado["coord_x"], estado["coord_y"], estado.get("loc"))
+        calles = estado.get("calles", estado.get("_calles"))
+        self._calles = set() if calles is None else set(calles)
     
 def distancia(x1:int,y1:int,x2:int,y2:int)->float:
     """
@@ -100,30 +318,6 @@ def distancia(x1:int,y1:int,x2:int,y2:int)->float:
     x,y = x2-x1, y2-y1
     return math.sqrt(x**2 + y**2)
 
-    
-def procesar_cruces(cruces: pd.DataFrame):
-    global cruces_dict
-    cruces = unificar_cruces(cruces)
-    """
-    From the intersections dataframe, intersections are stored in the Cruce class, 
-    containing a list with all the streets that converge at that intersection.
-    """
-    df= cruces[["Coordenada X (Guia Urbana) cm (cruce)", "Coordenada Y (Guia Urbana) cm (cruce)", "Literal completo del vial tratado", "Literal completo del vial que cruza", "Longitud en S R  WGS84 (cruce)", "Latitud en S R  WGS84 (cruce)"]]
-    cruces_dict = {}
-
-    for index, row in df.iterrows():
-        coord_x = row['Coordenada X (Guia Urbana) cm (cruce)']
-        coord_y = row['Coordenada Y (Guia Urbana) cm (cruce)']
-        loc = (row["Longitud en S R  WGS84 (cruce)"], row["Latitud en S R  WGS84 (cruce)"])
-        coordendas_cruce = (coord_x, coord_y)
-        if coordendas_cruce in cruces_dict.keys(): # the intersection already exists
-            cruce = cruces_dict[coordendas_cruce]
-        else:
-            cruce = Cruce(coord_x, coord_y, loc) # create intersection
-            cruces_dict[coordendas_cruce] = cruce
-        cruce.agregar_calle(row['Literal completo del vial tratado'])
-        cruce.agregar_calle(row["Literal completo del vial que cruza"])
-    return cruces_dict
                                                            
 class Calle:
     """
@@ -138,40 +332,288 @@ class Calle:
             agregar_cruce(cruce): Adds an intersection to the street's set of intersections.
             lista_cruces(): Returns a list of all intersections the street has.
         """
-    def __init__(self, nombre_calle, codigo_via):
+    __slots__ = ("nombre", "codigo_via", "_tablas", "_id", "_cruces")
+
+    def __init__(self, nombre_calle, codigo_via, tablas=None, id_calle=None):
         self.nombre = nombre_calle
         self.codigo_via = codigo_via
-        self.cruces = set()
+        # As Cruce, a street created by TablasCallejero reads its intersections when needed (a frozenset)
+        self._tablas = tablas
+        self._id = id_calle
+        self._cruces = set() if tablas is None else None
+
+    @property
+    def cruces(self):
+        if self._cruces is None:
+            return frozenset(self._tablas.cruces_de_calle(self._id))
+        return self._cruces
+
+    @cruces.setter
+    def cruces(self, cruces):
+        self._cruces = set(cruces)
+
     def agregar_cruce(self, cruce):
-        self.cruces.add(cruce)
+        if self._cruces is None:
+            self._cruces = set(self.cruces)
+        self._cruces.add(cruce)
     def lista_cruces(self):
         return list(self.cruces) # returns a list with all intersections on that street
 
-def procesar_calles(cruces: pd.DataFrame)->dict:
-    global cruces_dict
+    def __getstate__(self):
+        return {"nombre": self.nombre, "codigo_via": self.codigo_via, "cruces": self.cruces}
+
+    def __setstate__(self, estado):
+        self.__init__(estado["nombre"], estado["codigo_via"])
+        cruces = estado.get("cruces", estado.get("_cruces"))
+        self._cruces = set() if cruces is None else set(cruces)
+
+
+class TablasCallejero:
+    """
+    Intersections and streets of the street map as NumPy arrays (the names match those
+    of the compiled bundle, see paquete.py):
+        cruces_x, cruces_y, cruces_lon, cruces_lat   coordinates of each intersection
+        nombres_calles                               street names
+        calles_indptr, calles_indices                names (ids in nombres_calles) of the streets of each intersection (CSR)
+        codigos_via, nombres_via                     codigo de via and name id of each street
+        cruces_indptr, cruces_indices                intersections of each street, in order of appearance (CSR)
+    The Cruce and Calle objects are thin views of these arrays, created the first time they are requested.
+    """
+    ARRAYS = ("cruces_x", "cruces_y", "cruces_lon", "cruces_lat", "nombres_calles", "calles_indptr", "calles_indices",
+              "codigos_via", "nombres_via", "cruces_indptr", "cruces_indices")
+
+    def __init__(self, cruces_x, cruces_y, cruces_lon, cruces_lat, nombres_calles, calles_indptr, calles_indices,
+                 codigos_via, nombres_via, cruces_indptr, cruces_indices):
+        self.cruces_x, self.cruces_y = cruces_x, cruces_y
+        self.cruces_lon, self.cruces_lat = cruces_lon, cruces_lat
+        self.nombres_calles = nombres_calles
+        self.calles_indptr, self.calles_indices = calles_indptr, calles_indices
+        self.codigos_via, self.nombres_via = codigos_via, nombres_via
+        self.cruces_indptr, self.cruces_indices = cruces_indptr, cruces_indices
+        self._cruces = [None] * len(cruces_x)
+        self._calles = [None] * len(codigos_via)
+        self._nombres = None
+
+    @classmethod
+    def desde_dataframe(cls, cruces: "pd.DataFrame", R=30*100)->"TablasCallejero":
+        """
+        Builds the tables from the intersections DataFrame in a single vectorized pass:
+        the rows are unified with unificar_cruces and grouped by unified intersection and by street.
+        """
+        import pandas as pd
+        from pandas.api.types import union_categoricals
+
+        cruces = unificar_cruces(cruces, R)
+        grupos = cruces[COLUMNA_CRUCE_UNIFICADO].to_numpy()
+        n = int(grupos.max()) + 1 if len(grupos) else 0
+        # Coordinates: the unified ones; location: that of the first row of each intersection
+        _, primeras = np.unique(grupos, return_index=True)
+        coordenadas = [cruces[columna].to_numpy(dtype=np.int64)[primeras] for columna in COLUMNAS_COORDENADAS_CRUCE]
+        lon = cruces["Longitud en S R  WGS84 (cruce)"].to_numpy(dtype=np.float64)[primeras]
+        lat = cruces["Latitud en S R  WGS84 (cruce)"].to_numpy(dtype=np.float64)[primeras]
+
+        # Both street name columns share the same name ids
+        # (columns read by dgt_main are already categorical and keep their codes)
+        columnas = [cruces[columna] for columna in ("Literal completo del vial tratado", "Literal completo del vial que cruza")]
+        nombres = union_categoricals([columna.array if isinstance(columna.dtype, pd.CategoricalDtype)
+                                      else pd.Categorical(columna.astype(str)) for columna in columnas])
+        nombres_calles = np.asarray(nombres.categories, dtype=str)
+        m = max(len(nombres_calles), 1)
+        codigos_nombre = nombres.codes.astype(np.int64)
+        validos = codigos_nombre >= 0
+        pares = np.unique((np.concatenate((grupos, grupos)) * m + codigos_nombre)[validos])
+        calles_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pares // m, minlength=n), out=calles_indptr[1:])
+        calles_indices = (pares % m).astype(np.int32)
+
+        # Streets by codigo de via, with the name of their first row and their intersections in order of appearance
+        id_calle, codigos_via = pd.factorize(cruces["Codigo de via tratado"])
+        k = len(codigos_via)
+        _, primera_fila = np.unique(id_calle, return_index=True)
+        nombres_via = codigos_nombre[:len(cruces)][primera_fila].astype(np.int32)
+        claves, primera_aparicion = np.unique(id_calle.astype(np.int64) * max(n, 1) + grupos, return_index=True)
+        orden = np.lexsort((primera_aparicion, claves // max(n, 1)))
+        cruces_indptr = np.zeros(k + 1, dtype=np.int64)
+        np.cumsum(np.bincount(claves // max(n, 1), minlength=k), out=cruces_indptr[1:])
+        cruces_indices = (claves % max(n, 1))[orden].astype(np.int32)
+
+        return cls(coordenadas[0], coordenadas[1], lon, lat, nombres_calles, calles_indptr, calles_indices,
+                   np.asarray(codigos_via, dtype=np.int64), nombres_via, cruces_indptr, cruces_indices)
+
+    def arrays(self)->dict:
+        """
+        Dictionary name -> array with every table.
+        """
+        return {nombre: getattr(self, nombre) for nombre in self.ARRAYS}
+
+    def numero_cruces(self)->int:
+        return len(self.cruces_x)
+
+    def numero_calles(self)->int:
+        return len(self.codigos_via)
+
+    def _nombre(self, i):
+        if self._nombres is None:
+            # A single string object per name, shared by every intersection and street
+            self._nombres = [sys.intern(nombre) for nombre in np.asarray(self.nombres_calles).tolist()]
+        return self._nombres[i]
+
+    #### Vistas ####
+    def cruce(self, i)->Cruce:
+        """
+        Intersection i, created the first time it is requested.
+        """
+        if self._cruces[i] is None:
+            self._cruces[i] = Cruce(int(self.cruces_x[i]), int(self.cruces_y[i]), None, self, i)
+        return self._cruces[i]
+
+    def cruces(self)->list:
+        """
+        List of every intersection, in the order of their ids.
+        """
+        if any(cruce is None for cruce in self._cruces):
+            columnas = zip(np.asarray(self.cruces_x).tolist(), np.asarray(self.cruces_y).tolist())
+            for i, (x, y) in enumerate(columnas):
+                if self._cruces[i] is None:
+                    self._cruces[i] = Cruce(x, y, None, self, i)
+        return self._cruces
+
+    def ids_calles_de_cruce(self, i)->list:
+        """
+        Ids (in nombres_calles) of the names of the streets of intersection i.
+        """
+        return np.asarray(self.calles_indices[self.calles_indptr[i]:self.calles_indptr[i + 1]]).tolist()
+
+    def calles_de_cruce(self, i)->list:
+        """
+        Names of the streets of intersection i.
+        """
+        return [self._nombre(j) for j in self.ids_calles_de_cruce(i)]
+
+    def calle(self, k)->Calle:
+        """
+        Street k, created the first time it is requested.
+        """
+        if self._calles[k] is None:
+            self._calles[k] = Calle(self._nombre(int(self.nombres_via[k])), int(self.codigos_via[k]), self, k)
+        return self._calles[k]
+
+    def calles(self)->dict:
+        """
+        Dictionary codigo_via -> Calle with every street.
+        """
+        return {calle.codigo_via: calle for calle in map(self.calle, range(self.numero_calles()))}
+
+    def cruces_de_calle(self, k)->list:
+        """
+        Intersections of street k, in order of appearance.
+        """
+        return [self.cruce(i) for i in np.asarray(self.cruces_indices[self.cruces_indptr[k]:self.cruces_indptr[k + 1]]).tolist()]
+
+    def aristas(self):
+        """
+        Edges between consecutive intersections of each street: arrays with the origin and
+        destination intersection ids and the street id of each edge.
+        """
+        calle = np.repeat(np.arange(self.numero_calles()), np.diff(self.cruces_indptr))
+        indices = np.asarray(self.cruces_indices, dtype=np.int64)
+        consecutivos = calle[:-1] == calle[1:]
+        return indices[:-1][consecutivos], indices[1:][consecutivos], calle[:-1][consecutivos]
+
+    def componentes(self)->np.ndarray:
+        """
+        Connected component of each intersection in the graph of aristas(), identified by its
+        lowest intersection id. Each pass propagates the lowest label across the edges and then
+        lets every intersection take the label of its label, until nothing changes.
+        """
+        origenes, destinos, _ = self.aristas()
+        etiquetas = np.arange(self.numero_cruces())
+        while True:
+            anteriores = etiquetas
+            etiquetas = etiquetas.copy()
+            np.minimum.at(etiquetas, origenes, etiquetas[destinos])
+            np.minimum.at(etiquetas, destinos, etiquetas[origenes])
+            etiquetas = etiquetas[etiquetas]
+            if (etiquetas == anteriores).all():
+                return etiquetas
+
+    def componente_principal(self)->np.ndarray:
+        """
+        Whether each intersection belongs to the largest connected component.
+        """
+        etiquetas = self.componentes()
+        if not len(etiquetas):
+            return np.zeros(0, dtype=bool)
+        return etiquetas == np.bincount(etiquetas).argmax()
+
+
+class TablaDirecciones:
+    """
+    Addresses snapped to the street graph, as arrays:
+        nombres            name of each address
+        x, y               its coordinates
+        cruces             id (in TablasCallejero) of its nearest intersection
+        distancias         distance from the address to that intersection
+        aisladas           whether that intersection is outside the main connected component
+    The snapping is done once, when the table is built, so resolving an address is a single
+    dictionary lookup.
+    """
+    ARRAYS = ("nombres", "x", "y", "cruces", "distancias", "aisladas")
+
+    def __init__(self, nombres, x, y, cruces, distancias, aisladas):
+        self.nombres, self.x, self.y = nombres, x, y
+        self.cruces, self.distancias, self.aisladas = cruces, distancias, aisladas
+        self._posicion = None
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def __contains__(self, nombre):
+        return nombre in self.posiciones()
+
+    def posiciones(self)->dict:
+        """
+        Dictionary name -> row of the address, built the first time it is needed.
+        """
+        if self._posicion is None:
+            self._posicion = {nombre: i for i, nombre in enumerate(np.asarray(self.nombres).tolist())}
+        return self._posicion
+
+    def fila(self, nombre)->int:
+        """
+        Row of an address. Raises KeyError if it does not exist.
+        """
+        return self.posiciones()[nombre]
+
+    def diccionario(self)->dict:
+        """
+        Dictionary name -> (coord_x, coord_y), as gps.cargar_direcciones.
+        """
+        coordenadas = zip(np.asarray(self.x).tolist(), np.asarray(self.y).tolist())
+        return dict(zip(np.asarray(self.nombres).tolist(), coordenadas))
+
+    def arrays(self)->dict:
+        """
+        Arrays of the table by name, prefixed with "direcciones_" as stored in the bundle.
+        """
+        return {"direcciones_" + nombre: getattr(self, nombre) for nombre in self.ARRAYS}
+
+
+def procesar_cruces(cruces: "pd.DataFrame"):
+    """
+    From the intersections dataframe, intersections are stored in the Cruce class, 
+    containing a list with all the streets that converge at that intersection.
+    Returns a dictionary (coord_x, coord_y) -> Cruce.
+    """
+    tablas = TablasCallejero.desde_dataframe(cruces)
+    return {(cruce.coord_x, cruce.coord_y): cruce for cruce in tablas.cruces()}
+
+def procesar_calles(cruces: "pd.DataFrame")->dict:
     """
     From the intersections dataframe, stores all streets with their respective intersections 
-    in a dictionary with keys as the street name and values as the street object
-    """
-    procesar_cruces(cruces)
-    list(cruces)
-    df= cruces[["Coordenada X (Guia Urbana) cm (cruce)", "Coordenada Y (Guia Urbana) cm (cruce)", "Literal completo del vial tratado", "Literal completo del vial que cruza", "Longitud en S R  WGS84 (cruce)", "Latitud en S R  WGS84 (cruce)", "Codigo de via tratado"]]        
-    calles_dict = dict()
-    for index, row in df.iterrows():
-        coord_x = row['Coordenada X (Guia Urbana) cm (cruce)']
-        coord_y = row['Coordenada Y (Guia Urbana) cm (cruce)']
-        nombre_calle = row['Literal completo del vial tratado']
-        codigo_via = row["Codigo de via tratado"]
-        coordendas_cruce = (coord_x, coord_y)
-        cruce = cruces_dict[coordendas_cruce] # get the intersection
-        if not codigo_via in calles_dict.keys():
-            calle = Calle(nombre_calle, codigo_via) # create street
-            calle.agregar_cruce(cruce) # add intersection
-            calles_dict[codigo_via] = calle
-        else:
-            calle = calles_dict[codigo_via]
-        calle.agregar_cruce(cruce)
-    return calles_dict
+    in a dictionary with keys as the street code and values as the street object
+    """
+    return TablasCallejero.desde_dataframe(cruces).calles()
 
 
 
@@ -0,0 +1,288 @@
+"""
+contraccion.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Contraction Hierarchies for fast point-to-point queries on a fixed graph.
+
+Preprocessing contracts the vertices one by one in order of importance. When a
+vertex v is contracted, every path u->v->w between two vertices that are still
+in the graph is replaced by a shortcut edge u->w, unless a witness search finds
+another path from u to w that is not longer. Each vertex gets as rank its
+position in the contraction order.
+
+A query is a bidirectional Dijkstra in which the forward search from the origin
+only follows edges towards vertices of higher rank and the backward search from
+the destination only follows reversed edges towards vertices of higher rank.
+Shortcuts remember the vertex they skip, so the path found is unpacked into the
+vertices of the original graph.
+"""
+
+from typing import List,Tuple,Dict
+import heapq
+import itertools
+
+import numpy as np
+
+import src.grafo as grafo
+from src.grafo import INFTY
+from src.grafo_compacto import GrafoCompacto
+
+# Maximum number of vertices settled by a witness search. If the limit is reached
+# the shortcut is added, which is always correct but may add unneeded edges.
+LIMITE_TESTIGO = 100
+
+
+class JerarquiaContraccion():
+    """
+    Contraction hierarchy of a graph: the upward graphs used by the queries
+    and the shortcuts needed to unpack the paths.
+    """
+
+    def __init__(self,vertices:List[object],rango:np.ndarray,subida:GrafoCompacto,bajada:GrafoCompacto,atajos:np.ndarray,firma:str=None):
+        """ Creates a hierarchy from its already computed parts.
+
+        Args:
+            vertices (List[object]): vertex objects, the position of each one is its integer id.
+            rango (np.ndarray): rank (contraction order) of each vertex.
+            subida (GrafoCompacto): edges (u,v) with rango[u] < rango[v], used by the forward search.
+            bajada (GrafoCompacto): reversed edges (v,u) with rango[u] > rango[v], used by the backward search.
+            atajos (np.ndarray): array of rows (u,w,v) meaning that the edge (u,w) is a shortcut of u->v->w.
+            firma (str, optional): GrafoCompacto.firma of the graph the hierarchy was built from.
+        """
+        self.vertices = list(vertices)
+        self.indice:Dict[object,int] = {v: i for i, v in enumerate(self.vertices)}
+        self.rango = np.asarray(rango, dtype=np.int32)
+        self.subida = subida
+        self.bajada = bajada
+        self.atajos = np.asarray(atajos, dtype=np.int32).reshape(-1, 3)
+        self.medios:Dict[Tuple[int,int],int] = {(u, w): v for u, w, v in self.atajos.tolist()}
+        self.firma = firma
+
+    #### Preprocesado ####
+    @classmethod
+    def construir(cls,G,limite_testigo:int=LIMITE_TESTIGO)->"JerarquiaContraccion":
+        """ Builds the contraction hierarchy of a graph.
+
+        Args:
+            G (grafo.Grafo or GrafoCompacto): graph with non-negative weights.
+            limite_testigo (int, optional): maximum number of vertices settled by each witness search.
+        Returns:
+            JerarquiaContraccion: hierarchy of the graph.
+        """
+        C = G if isinstance(G, GrafoCompacto) else G.congelar()
+        n = C.numero_vertices()
+
+        # Edges of the graph that remain to be contracted, and every edge (original or shortcut)
+        salientes = [dict() for _ in range(n)]
+        entrantes = [dict() for _ in range(n)]
+        for u, v, peso in zip(C.origenes().tolist(), C.indices.tolist(), C.pesos.tolist()):
+            if u != v and peso < salientes[u].get(v, INFTY):
+                salientes[u][v] = peso
+                entrantes[v][u] = peso
+        aristas = {(u, v): peso for u in range(n) for v, peso in salientes[u].items()}
+        medios = {}
+
+        contraidos = np.zeros(n, dtype=bool)
+        vecinos_contraidos = np.zeros(n, dtype=np.int32)
+        niveles = np.zeros(n, dtype=np.int32)
+        rango = np.zeros(n, dtype=np.int32)
+
+        def testigo(u, excluido, limite):
+            """ Distances from u avoiding the vertex excluido, up to the distance limite """
+            distancias = {u: 0}
+            asentados = 0
+            cola = [(0, u)]
+            while cola and asentados < limite_testigo:
+                distancia, x = heapq.heappop(cola)
+                if distancia > distancias[x]:
+                    continue
+                if distancia > limite:
+                    break
+                asentados += 1
+                for y, peso in salientes[x].items():
+                    if y != excluido and distancia + peso < distancias.get(y, INFTY):
+                        distancias[y] = distancia + peso
+                        heapq.heappush(cola, (distancia + peso, y))
+            return distancias
+
+        def atajos_necesarios(v):
+            """ Shortcuts (u,w,peso) that must be added if v is contracted """
+            atajos = []
+            for u, peso_uv in entrantes[v].items():
+                limite = max((peso_uv + peso_vw for w, peso_vw in salientes[v].items() if w != u), default=None)
+                if limite is None:
+                    continue
+                distancias = testigo(u, v, limite)
+                for w, peso_vw in salientes[v].items():
+                    if w != u and distancias.get(w, INFTY) > peso_uv + peso_vw:
+                        atajos.append((u, w, peso_uv + peso_vw))
+            return atajos
+
+        def prioridad(v):
+            """ Edge difference plus number of contracted neighbours plus level in the hierarchy """
+            atajos = atajos_necesarios(v)
+            diferencia = len(atajos) - len(entrantes[v]) - len(salientes[v])
+            return 2*diferencia + vecinos_contraidos[v] + niveles[v], atajos
+
+        cola = [(prioridad(v)[0], v) for v in range(n)]
+        heapq.heapify(cola)
+        siguiente_rango = 0
+
+        while cola:
+            _, v = heapq.heappop(cola)
+            # Lazy update: the priority may have changed since it was pushed
+            nueva_prioridad, atajos = prioridad(v)
+            if cola and nueva_prioridad > cola[0][0]:
+                heapq.heappush(cola, (nueva_prioridad, v))
+                continue
+
+            for u, w, peso in atajos:
+                if peso < salientes[u].get(w, INFTY):
+                    salientes[u][w] = peso
+                    entrantes[w][u] = peso
+                if peso < aristas.get((u, w), INFTY):
+                    aristas[(u, w)] = peso
+                    medios[(u, w)] = v
+
+            for u in entrantes[v]:
+                del salientes[u][v]
+                vecinos_contraidos[u] += 1
+                niveles[u] = max(niveles[u], niveles[v] + 1)
+            for w in salientes[v]:
+                del entrantes[w][v]
+                vecinos_contraidos[w] += 1
+                niveles[w] = max(niveles[w], niveles[v] + 1)
+            salientes[v], entrantes[v] = {}, {}
+
+            contraidos[v] = True
+            rango[v] = siguiente_rango
+            siguiente_rango += 1
+
+        origenes = np.fromiter((u for u, _ in aristas), dtype=np.int64, count=len(aristas))
+        destinos = np.fromiter((w for _, w in aristas), dtype=np.int64, count=len(aristas))
+        pesos = np.fromiter(aristas.values(), dtype=np.float64, count=len(aristas))
+        hacia_arriba = rango[origenes] < rango[destinos]
+        subida = GrafoCompacto.desde_aristas(C.vertices, origenes[hacia_arriba], destinos[hacia_arriba], pesos[hacia_arriba])
+        bajada = GrafoCompacto.desde_aristas(C.vertices, destinos[~hacia_arriba], origenes[~hacia_arriba], pesos[~hacia_arriba])
+        atajos = np.array([(u, w, v) for (u, w), v in medios.items()], dtype=np.int32).reshape(-1, 3)
+
+        return cls(C.vertices, rango, subida, bajada, atajos, C.firma())
+
+    #### Consultas ####
+    def buscar_camino_ids(self,i:int,j:int)->Tuple[List[int],float,int]:
+        """ Same as buscar_camino, but with the integer ids of the vertices """
+        if i == j:
+            return [i], 0, 1
+
+        contador = itertools.count()
+        busquedas = (self.subida.vecinos, self.bajada.vecinos)
+        distancias = ({i: 0}, {j: 0})
+        padres = ({i: None}, {j: None})
+        asentados = (set(), set())
+        colas = ([(0, next(contador), i)], [(0, next(contador), j)])
+        mejor_coste, encuentro = INFTY, None
+
+        # Both upward searches go on until their queues cannot improve the best meeting point
+        while colas[0] or colas[1]:
+            lado = 0 if colas[0] and (not colas[1] or colas[0][0][0] <= colas[1][0][0]) else 1
+            distancia, _, u = heapq.heappop(colas[lado])
+            if distancia >= mejor_coste:
+                colas[lado].clear()
+                continue
+            if u in asentados[lado]:
+                continue
+            asentados[lado].add(u)
+
+            if u in distancias[1 - lado] and distancia + distancias[1 - lado][u] < mejor_coste:
+                mejor_coste = distancia + distancias[1 - lado][u]
+                encuentro = u
+
+            for v, peso in busquedas[lado](u):
+                if distancia + peso < distancias[lado].get(v, INFTY):
+                    distancias[lado][v] = distancia + peso
+                    padres[lado][v] = u
+                    heapq.heappush(colas[lado], (distancia + peso, next(contador), v))
+
+        numero_asentados = len(asentados[0]) + len(asentados[1])
+        if encuentro is None:
+            return None, INFTY, numero_asentados
+
+        camino = grafo.reconstruir_camino(padres[0], encuentro)
+        vertice = padres[1][encuentro]
+        while vertice is not None:
+            camino.append(vertice)
+            vertice = padres[1][vertice]
+        return self.desempaquetar(camino), mejor_coste, numero_asentados
+
+    def buscar_camino(self,origen:object,destino:object)->Tuple[List[object],float,int]:
+        """ Searches a minimum path from origen to destino with a bidirectional upward search.
+        Same result format as Grafo.buscar_camino; the path only contains vertices of the
+        original graph.
+        """
+        i, j = self.indice.get(origen), self.indice.get(destino)
+        if i is None or j is None:
+            return None, INFTY, 0
+        camino, coste, asentados = self.buscar_camino_ids(i, j)
+        if camino is not None:
+            camino = [self.vertices[k] for k in camino]
+        return camino, coste, asentados
+
+    def camino_minimo(self,origen:object,destino:object)->List[object]:
+        """ Same result format as Grafo.camino_minimo """
+        camino, _, _ = self.buscar_camino(origen, destino)
+        return camino
+
+    def desempaquetar(self,camino:List[int])->List[int]:
+        """ Replaces every shortcut of a path by the vertices it skips """
+        resultado = [camino[0]]
+        pila = [(u, w) for u, w in zip(camino[-2::-1], camino[:0:-1])]
+        while pila:
+            u, w = pila.pop()
+            v = self.medios.get((u, w))
+            if v is None:
+                resultado.append(w)
+            else:
+                pila.append((v, w))
+                pila.append((u, v))
+        return resultado
+
+    def numero_atajos(self)->int:
+        """ Returns the number of shortcut edges added by the contraction """
+        return len(self.atajos)
+
+    #### Persistencia ####
+    def guardar(self,ruta:str)->None:
+        """ Saves the hierarchy in a NumPy .npz file. Only the arrays are saved, with vertex ids:
+        the vertices are those of the graph it is loaded for (see cargar). """
+        np.savez(ruta, rango=self.rango,
+                 subida_indptr=self.subida.indptr, subida_indices=self.subida.indices, subida_pesos=self.subida.pesos,
+                 bajada_indptr=self.bajada.indptr, bajada_indices=self.bajada.indices, bajada_pesos=self.bajada.pesos,
+                 atajos=self.atajos, firma=np.array(self.firma or ""))
+
+    @classmethod
+    def cargar(cls,ruta:str,G)->"JerarquiaContraccion":
+        """ Loads a hierarchy saved with guardar for the graph G, whose vertex objects it uses.
+
+        Args:
+            ruta (str): path of the .npz file.
+            G (grafo.Grafo or GrafoCompacto): graph the hierarchy must have been built from.
+        Returns:
+            JerarquiaContraccion: the hierarchy, or None if the file was built from another graph.
+        """
+        C = G if isinstance(G, GrafoCompacto) else G.congelar()
+        with np.load(ruta, allow_pickle=False) as datos:
+            firma = str(datos["firma"])
+            if firma != C.firma():
+                return None
+            vertices = C.vertices
+            subida = GrafoCompacto(vertices, datos["subida_indptr"], datos["subida_indices"], datos["subida_pesos"], dirigido=True)
+            bajada = GrafoCompacto(vertices, datos["bajada_indptr"], datos["bajada_indices"], datos["bajada_pesos"], dirigido=True)
+            return cls(vertices, datos["rango"], subida, bajada, datos["atajos"], firma)
@@ -1,13 +1,94 @@
+import logging
+import time
+import numpy as np
 import pandas as pd
-import re
+
+logger = logging.getLogger(__name__)
+
+# Columns read from each file and their types. Street names are categorical: each name
+# is stored once and every row only keeps a small integer code.
+COLUMNAS_CRUCES = {
+    "Codigo de via tratado": "float64",
+    "Literal completo del vial tratado": "category",
+    "Codigo de via que cruza o enlaza": "float64",
+    "Literal completo del vial que cruza": "category",
+    "Coordenada X (Guia Urbana) cm (cruce)": "float64",
+    "Coordenada Y (Guia Urbana) cm (cruce)": "float64",
+    "Longitud en S R  WGS84 (cruce)": "float64",
+    "Latitud en S R  WGS84 (cruce)": "float64",
+}
+COLUMNAS_DIRECCIONES = {
+    "Codigo de via": "int64",
+    "Clase de la via": "category",
+    "Particula de la via": "category",
+    "Nombre de la via": "category",
+    "Literal de numeracion": "category",
+    "Codigo de numero": "int64",
+    "Coordenada X (Guia Urbana) cm": "int64",
+    "Coordenada Y (Guia Urbana) cm": "int64",
+}
+
+def log_stage(stage: str, start: float, df: pd.DataFrame):
+    """Logs the time spent in a stage of the pipeline and the memory of its resulting DataFrame.
+
+    Args:
+        stage (str): Name of the stage.
+        start (float): time.perf_counter() at the start of the stage.
+        df (pd.DataFrame): DataFrame produced by the stage.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    memory = df.memory_usage(deep=True).sum() / 2**20
+    logger.info(f"{stage}: {time.perf_counter() - start:.3f} s, {len(df)} rows, {memory:.1f} MiB")
+
+def read_csv(path: str, columns: dict, stage: str):
+    """Reads only the given columns of a DGT CSV file, with their types.
+
+    Args:
+        path (str): Path of the file.
+        columns (dict): Column name -> dtype.
+        stage (str): Name of the stage in the log.
+
+    Returns:
+        pd.DataFrame: The DataFrame read.
+    """
+    start = time.perf_counter()
+    try:
+        df = pd.read_csv(path, encoding = "windows-1252", sep = ";", usecols = lambda column: column in columns,
+                         dtype = columns, keep_default_na = False)
+    except ValueError:
+        # Some numeric column has values that are not plain numbers: every numeric column is read
+        # as text and the numbers are extracted afterwards (see parse_numbers)
+        logger.info(f"{path} has non-numeric codes or coordinates, reading them as text")
+        columns = {column: ("str" if pd.api.types.is_numeric_dtype(dtype) else dtype) for column, dtype in columns.items()}
+        df = pd.read_csv(path, encoding = "windows-1252", sep = ";", usecols = lambda column: column in columns,
+                         dtype = columns, keep_default_na = False)
+    log_stage(stage, start, df)
+    return df
+
 def cruces_read():
     """Reads the cruces.csv file into a pandas DataFrame.
 
     Returns:
         pd.DataFrame: The cruces DataFrame.
     """
-    cruces = pd.read_csv("data/cruces.csv", encoding = "windows-1252", sep = ";")
-    return cruces
+    return read_csv("data/cruces.csv", COLUMNAS_CRUCES, "read cruces.csv")
+
+def rstrip_column(column: pd.Series):
+    """Removes the trailing spaces of a column of text. Categorical columns only strip their
+    categories, merging those that become equal, so the work does not depend on the number of rows.
+
+    Args:
+        column (pd.Series): The column.
+
+    Returns:
+        pd.Series: The column without trailing spaces, with the same dtype.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        categories, codes = np.unique(column.cat.categories.str.rstrip(), return_inverse=True)
+        new_codes = np.where(column.cat.codes >= 0, codes[column.cat.codes], -1)
+        return pd.Series(pd.Categorical.from_codes(new_codes, categories), index=column.index, name=column.name)
+    return column.str.rstrip()
 
 def clean_names(cruces: pd.DataFrame):
     """Cleans the names of the columns in the cruces DataFrame.
@@ -18,14 +99,31 @@ def clean_names(cruces: pd.DataFrame):
     Returns:
         pd.DataFrame: The cleaned cruces DataFrame.
     """
-    columnas = list(cruces)[1:10]
-    columnas.remove("Codigo de via que cruza o enlaza")
-    for columna in columnas:
-        cruces[columna] = cruces[columna].apply(lambda via: via.rstrip())
+    for columna in cruces.columns:
+        if isinstance(cruces[columna].dtype, pd.CategoricalDtype) or cruces[columna].dtype == object:
+            cruces[columna] = rstrip_column(cruces[columna])
     return cruces
 
+def parse_numbers(column: pd.Series):
+    """Converts a column read as text to floats, extracting the first number of the values that are not plain numbers.
+
+    Args:
+        column (pd.Series): Column of text.
+
+    Returns:
+        pd.Series: The numbers of the column.
+    """
+    # Most values are plain numbers, parsed in C; the regex is only used for the rest
+    texto = column.astype(str)
+    numeros = pd.to_numeric(texto, errors="coerce")
+    invalidos = numeros.isna()
+    if invalidos.any():
+        numeros[invalidos] = texto[invalidos].str.extract(r"^\s*(-?\d+(?:\.\d+)?)", expand=False).astype(np.float64)
+    return numeros
+
 def cruces_as_int(cruces: pd.DataFrame):
-    """Converts the specified columns in the cruces DataFrame to integers.
+    """Converts the codes and coordinates in the cruces DataFrame to integers, and the WGS84 coordinates to floats
+    if they were read as text.
 
     Args:
         cruces (pd.DataFrame): The cruces DataFrame.
@@ -33,9 +131,14 @@ def cruces_as_int(cruces: pd.DataFrame):
     Returns:
         pd.DataFrame: The cruces DataFrame with the specified columns converted to integers.
     """
+    for columna, tipo in COLUMNAS_CRUCES.items():
+        if tipo == "category" or columna not in cruces.columns:
+            continue
+        if not pd.api.types.is_numeric_dtype(cruces[columna]):
+            cruces[columna] = parse_numbers(cruces[columna])
     columnas = ["Codigo de via tratado", "Codigo de via que cruza o enlaza", "Coordenada X (Guia Urbana) cm (cruce)", "Coordenada Y (Guia Urbana) cm (cruce)"]
     for columna in columnas:
-        cruces[columna] = cruces[columna].apply(lambda num: int(num))
+        cruces[columna] = cruces[columna].astype(np.int32)
     return cruces
 
 def direcciones_read():
@@ -44,7 +147,7 @@ def direcciones_read():
     Returns:
         pd.DataFrame: The direcciones DataFrame.
     """
-    return pd.read_csv("data/direcciones.csv",encoding = "windows-1252", sep = ";")
+    return read_csv("data/direcciones.csv", COLUMNAS_DIRECCIONES, "read direcciones.csv")
 
 def direcciones_as_int(direcciones: pd.DataFrame):
     """Converts the specified columns in the direcciones DataFrame to integers, extracting the first number found.
@@ -57,9 +160,10 @@ def direcciones_as_int(direcciones: pd.DataFrame):
     """
     columnas = ["Codigo de numero", "Codigo de via", "Coordenada X (Guia Urbana) cm", "Coordenada Y (Guia Urbana) cm"]
     for columna in columnas:
-        # Your regex pattern
-        pattern = re.compile(r"(\d+)")
-        direcciones[columna] = direcciones[columna].apply(lambda num: int(pattern.match(str(num)).group(1)))
+        if pd.api.types.is_integer_dtype(direcciones[columna]):
+            direcciones[columna] = direcciones[columna].astype(np.int32)
+            continue
+        direcciones[columna] = parse_numbers(direcciones[columna]).astype(np.int32)
     return direcciones
 
 def literal_split(direcciones: pd.DataFrame):
@@ -71,10 +175,14 @@ def literal_split(direcciones: pd.DataFrame):
     Returns:
         pd.DataFrame: The direcciones DataFrame with the new columns.
     """
-    pattern = re.compile(r"([A-Z]+\.?)(\d+)([A-Z]*)")
-    direcciones["Prefijo de numeracion"] = direcciones["Literal de numeracion"].apply(lambda direccion: pattern.match(direccion)[1])
-    direcciones["Numero"] = direcciones["Literal de numeracion"].apply(lambda direccion: pattern.match(direccion)[2])
-    direcciones["Sufijo de numeracion"] = direcciones["Literal de numeracion"].apply(lambda direccion: pattern.match(direccion)[3])
+    literal = direcciones["Literal de numeracion"].astype("category")
+    # A single regex pass over the distinct literals gives the three parts, which are then
+    # spread to the rows through the categorical codes
+    partes = literal.cat.categories.str.extract(r"^([A-Z]+\.?)(\d+)([A-Z]*)").to_numpy()
+    partes = np.vstack((partes, np.full((1, 3), np.nan, dtype=object)))[literal.cat.codes.to_numpy()]
+    direcciones["Prefijo de numeracion"] = pd.Categorical(partes[:, 0])
+    direcciones["Numero"] = partes[:, 1]
+    direcciones["Sufijo de numeracion"] = pd.Categorical(partes[:, 2])
     return direcciones
 
 def process_data(cruces: pd.DataFrame, direcciones: pd.DataFrame):
@@ -88,7 +196,13 @@ def process_data(cruces: pd.DataFrame, direcciones: pd.DataFrame):
         tuple: A tuple containing the processed cruces and direcciones DataFrames.
     """
     #Process cruces
+    start = time.perf_counter()
     cruces = cruces_as_int(clean_names(cruces))
+    log_stage("process cruces", start, cruces)
     #Process direcciones
+    start = time.perf_counter()
+    for columna in ["Clase de la via", "Particula de la via", "Nombre de la via", "Literal de numeracion"]:
+        direcciones[columna] = rstrip_column(direcciones[columna])
     direcciones = literal_split(direcciones_as_int(direcciones))
+    log_stage("process direcciones", start, direcciones)
     return cruces, direcciones
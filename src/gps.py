@@ -12,14 +12,468 @@ Members:
 """
 #LIBRARIES
 import src.grafo as grafo
+import src.grafo_compacto as grafo_compacto
 import src.callejero as callejero
-import networkx as nx
-import matplotlib.pyplot as plt
+import src.contraccion as contraccion
+import src.landmarks as landmarks
+import src.indice_espacial as indice_espacial
+import src.buscador as buscador
+import src.cache_rutas as cache_rutas
+import src.metricas as metricas
+import logging
+import math
 import numpy as np
-import pandas as pd
+import os
 import re
+import threading
 import time
-from src.callejero import cruces, direcciones, VELOCIDAD_CALLES_ESTANDAR, VELOCIDADES_CALLES
+import typing
+from src.callejero import VELOCIDAD_CALLES_ESTANDAR, VELOCIDADES_CALLES
+
+# pandas, networkx and matplotlib take most of the import time and are only needed to
+# read the CSV files or draw, so they are imported by the functions that use them
+if typing.TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Conversion factor from km/h to cm/s, the unit of the coordinates of the intersections
+KMH_A_CM_S = 100000/3600
+
+# Search algorithms accepted by encontrar_ruta_minima. "ch" (Contraction Hierarchies) and
+# "alt" (A* with landmarks) need a preprocessing step that is saved in data/ and reused by later runs.
+ALGORITMOS = grafo.METODOS_BUSQUEDA + ("ch", "alt")
+RUTA_JERARQUIA = "data/jerarquia_{modo}.npz"
+RUTA_LANDMARKS = "data/landmarks_{modo}.npz"
+MODOS = ("shortest", "fastest")
+
+# Work of each route search, exposed with the other metrics of metricas.py
+NODOS_ASENTADOS = metricas.registro.histograma("gps_nodos_asentados", "Nodes settled by each route search",
+                                               (10, 100, 1000, 10000, 100000, 1000000), etiquetas=("algoritmo",))
+LONGITUD_CAMINO = metricas.registro.histograma("gps_longitud_camino", "Intersections of each route found",
+                                               (2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500))
+SIN_CAMINO = metricas.registro.contador("gps_busquedas_sin_camino_total", "Route searches that found no path")
+
+
+class RegistroGrafos:
+    """
+    Process-wide registry of everything needed to answer routes: the intersections, the
+    streets, the address dictionary, the graph of each mode and its preprocessing (contraction
+    hierarchy and landmarks). Each piece is loaded from the compiled bundle or built from the
+    CSV files once, and then shared by every request, so that snapping an address to its
+    nearest intersection and searching the route use the same Cruce objects.
+    """
+    def __init__(self, datos = callejero.datos, velocidades:dict = None, velocidad_estandar:float = None):
+        self.datos = datos
+        # Speed table of the "fastest" graph, None for that of callejero (the one of the bundle)
+        self.velocidades = velocidades
+        self.velocidad_estandar = velocidad_estandar
+        # Number of changes of the graphs (weights, speed table or data) since the registry was created
+        self.version = 0
+        # Routes already answered, valid while the version does not change
+        self.cache = cache_rutas.CacheRutas()
+        self._cerrojo_pools = threading.Lock()
+        self._olvidar()
+
+    def reiniciar(self):
+        """
+        Forgets everything that was loaded, e.g. after the data or the bundle changed.
+        """
+        self.cerrar()
+        self._olvidar()
+        self.version += 1
+
+    def cerrar(self):
+        """
+        Stops the pools of worker processes of the graphs (see pool).
+        """
+        with self._cerrojo_pools:
+            for pool, _, _ in self._pools.values():
+                pool.cerrar()
+            self._pools = dict()
+
+    def _olvidar(self):
+        self._tablas = None
+        self._cruces = None
+        self._calles = None
+        self._clases = None
+        self._indice = None
+        self._direcciones = None
+        self._tabla_direcciones = None
+        self._buscador = None
+        self._grafos = dict()
+        self._compactos = dict()
+        self._pools = dict()
+        self._aristas = dict()
+        self._posicion_calles = None
+        self._jerarquias = dict()
+        self._landmarks = dict()
+        self._originales = dict()
+
+    def tablas(self)->callejero.TablasCallejero:
+        """
+        Intersection and street tables (see callejero.TablasCallejero): those of the compiled
+        bundle if there is one, otherwise built from the CSV files.
+        """
+        if self._tablas is None:
+            if self.datos.paquete is not None:
+                self._tablas = self.datos.paquete.tablas()
+            else:
+                self._tablas = callejero.TablasCallejero.desde_dataframe(self.datos.cruces)
+        return self._tablas
+
+    def cruces(self)->dict:
+        """
+        Dictionary (coord_x, coord_y) -> Cruce with every intersection.
+        """
+        if self._cruces is None:
+            self._cruces = {(cruce.coord_x, cruce.coord_y): cruce for cruce in self.tablas().cruces()}
+        return self._cruces
+
+    def calles(self)->dict:
+        """
+        Dictionary codigo_via -> Calle, whose intersections are the Cruce objects of cruces().
+        """
+        if self._calles is None:
+            self._calles = self.tablas().calles()
+        return self._calles
+
+    def clases_calles(self)->np.ndarray:
+        """
+        Class of the road of each street of tablas() (see callejero.clases_calles).
+        """
+        if self._clases is None:
+            if self.datos.paquete is not None:
+                self._clases = self.datos.paquete.array("clases_via")
+            else:
+                self._clases = callejero.clases_calles(self.tablas().codigos_via, self.datos.direcciones)
+        return self._clases
+
+    def configurar_velocidades(self, velocidades:dict = None, velocidad_estandar:float = None):
+        """
+        Changes the speed table of the "fastest" graph (None for the default one), which is
+        rebuilt with it the next time it is requested.
+        """
+        self.velocidades = velocidades
+        self.velocidad_estandar = velocidad_estandar
+        for cache in (self._grafos, self._compactos, self._aristas, self._jerarquias, self._landmarks, self._originales):
+            cache.pop("fastest", None)
+        self.version += 1
+
+    def version_grafos(self)->tuple:
+        """
+        Version of the registry and of the weights of each graph already loaded, which also change
+        when a weight is changed on a graph directly (Grafo.actualizar_pesos); the routes of the
+        cache are valid while it does not change.
+        """
+        return (self.version,) + tuple(self._grafos[modo].version if modo in self._grafos else None for modo in MODOS)
+
+    def velocidad_maxima(self)->float:
+        """
+        Maximum speed (km/h) of any road with the current speed table.
+        """
+        velocidades = VELOCIDADES_CALLES if self.velocidades is None else self.velocidades
+        estandar = VELOCIDAD_CALLES_ESTANDAR if self.velocidad_estandar is None else self.velocidad_estandar
+        return max(max(velocidades.values(), default=estandar), estandar)
+
+    def tabla_direcciones(self)->callejero.TablaDirecciones:
+        """
+        Addresses with their nearest intersection (see callejero.TablaDirecciones): the table of
+        the compiled bundle if there is one, otherwise snapped now from the CSV files.
+        """
+        if self._tabla_direcciones is None:
+            if self.datos.paquete is not None:
+                self._tabla_direcciones = self.datos.paquete.tabla_direcciones()
+            else:
+                self._tabla_direcciones = self.ajustar_direcciones(cargar_direcciones(self.datos.direcciones))
+        return self._tabla_direcciones
+
+    def ajustar_direcciones(self, direcciones:dict)->callejero.TablaDirecciones:
+        """
+        Snaps every address of a dictionary address -> (coord_x, coord_y) to its nearest intersection
+        with a single batch query to the spatial index. Addresses whose intersection is outside the
+        main connected component of the street graph are flagged and reported.
+        """
+        nombres = np.array(list(direcciones.keys()), dtype=str)
+        coordenadas = np.array(list(direcciones.values()), dtype=np.int64).reshape(-1, 2)
+        indice, _ = self.indice()
+        ids, distancias = indice.mas_cercanos_lote(coordenadas, 1)
+        ids, distancias = ids[:, 0], distancias[:, 0]
+        aisladas = ~self.tablas().componente_principal()[ids] if len(indice) else np.ones(len(ids), dtype=bool)
+        if aisladas.any():
+            logger.warning(f"{int(aisladas.sum())} of {len(nombres)} addresses snap to an intersection outside "
+                           f"the main connected component, e.g. {nombres[aisladas][:3].tolist()}")
+        return callejero.TablaDirecciones(nombres, coordenadas[:, 0], coordenadas[:, 1], ids.astype(np.int32),
+                                          distancias.astype(np.float32), aisladas)
+
+    def direcciones(self)->dict:
+        """
+        Dictionary address -> (coord_x, coord_y).
+        """
+        if self._direcciones is None:
+            self._direcciones = self.tabla_direcciones().diccionario()
+        return self._direcciones
+
+    def resolver_direccion(self, direccion):
+        """
+        Nearest intersection to an address and its distance, read from the snapping table.
+        Raises KeyError if the address does not exist.
+        """
+        tabla = self.tabla_direcciones()
+        i = tabla.fila(direccion)
+        return self.tablas().cruce(int(tabla.cruces[i])), float(tabla.distancias[i])
+
+    def buscador(self)->buscador.IndiceDirecciones:
+        """
+        Search index of the names of the addresses (see buscador.py).
+        """
+        if self._buscador is None:
+            self._buscador = buscador.IndiceDirecciones(np.asarray(self.tabla_direcciones().nombres).tolist())
+        return self._buscador
+
+    def grafo(self, modo):
+        """
+        Graph of the given mode ("fastest" or "shortest").
+        """
+        if modo not in MODOS:
+            raise ValueError(f"Unknown mode: {modo}")
+        if modo not in self._grafos:
+            velocidades_propias = self.velocidades is not None or self.velocidad_estandar is not None
+            if modo == "fastest" and velocidades_propias:
+                self._grafos[modo] = crear_grafo_tiempo(self.velocidades, self.velocidad_estandar)
+            elif self.datos.paquete is not None:
+                self._grafos[modo] = self.datos.paquete.grafo(modo)
+            else:
+                self._grafos[modo] = crear_grafo_csv(modo)
+        return self._grafos[modo]
+
+    def grafo_compacto(self, modo):
+        """
+        Frozen (CSR) version of the graph of the given mode, the one shared with worker processes:
+        the graph itself if it comes from the compiled bundle. The weight changes of actualizar_pesos
+        are applied to it in place; it is only rebuilt if the graph was changed some other way.
+        """
+        G = self.grafo(modo)
+        C, version = self._compactos.get(modo, (None, None))
+        if C is None or version != G.version:
+            C = G.congelar()
+            self._compactos[modo] = (C, G.version)
+        return C
+
+    def pool(self, modo, procesos = None):
+        """
+        Persistent pool of worker processes that keep the frozen graph of the given mode (see
+        grafo_compacto.PoolGrafo), shared by the batch routes and the distance matrices. The weight
+        changes of actualizar_pesos are sent to its processes; it is replaced when the frozen graph
+        is rebuilt or more processes are asked for than it has.
+        """
+        C = self.grafo_compacto(modo)
+        with self._cerrojo_pools:
+            pool, grafo_pool, version = self._pools.get(modo, (None, None, None))
+            if pool is None or grafo_pool is not C or version != C.version or (procesos or 0) > pool.procesos:
+                if pool is not None:
+                    pool.cerrar()
+                pool = grafo_compacto.PoolGrafo(C, procesos)
+                self._pools[modo] = (pool, C, C.version)
+            return pool
+
+    def indice(self):
+        """
+        Spatial index (see indice_espacial.py) of the intersections and the list of the
+        intersections in the order of its ids.
+        """
+        if self._indice is None:
+            tablas = self.tablas()
+            coordenadas = np.column_stack((tablas.cruces_x, tablas.cruces_y)).astype(np.float64)
+            self._indice = (indice_espacial.IndiceEspacial(coordenadas), tablas.cruces())
+        return self._indice
+
+    def cruce_mas_cercano(self, coord_x, coord_y):
+        """
+        Nearest intersection to a point and its distance.
+        """
+        indice, cruces = self.indice()
+        i, distancia = indice.mas_cercano(coord_x, coord_y)
+        return cruces[i], distancia
+
+    def cruces_mas_cercanos(self, puntos):
+        """
+        Nearest intersection to each point of a list of (coord_x, coord_y) and its distance.
+        """
+        indice, cruces = self.indice()
+        ids, distancias = indice.mas_cercanos_lote(puntos, 1)
+        return [(cruces[i], distancia) for i, distancia in zip(ids[:, 0].tolist(), distancias[:, 0].tolist())]
+
+    def aristas(self, modo):
+        """
+        Edges of the street graph of the given mode with the weights it was built with
+        (see pesos_aristas): origin and destination intersection ids, street id and weight.
+        """
+        if modo not in self._aristas:
+            clases = self.clases_calles() if modo == "fastest" else None
+            self._aristas[modo] = pesos_aristas(self.tablas(), modo, clases, self.velocidades, self.velocidad_estandar)
+        return self._aristas[modo]
+
+    def pesos_modificados(self, modo)->bool:
+        """
+        Whether some edge of the graph of the given mode has a weight other than the one it was
+        built with, i.e. whether an incident is in effect.
+        """
+        return bool(self._originales.get(modo))
+
+    def validar_pesos(self, modo, cambios)->list:
+        """
+        Checks weight changes (Cruce, Cruce, weight) of the graph of the given mode before applying
+        them: no weight can be lower than the one the edge was built with, the straight-line
+        heuristics of A* and the landmarks are lower bounds only while that holds. Weights equal to
+        the original up to rounding are set to it exactly. Returns the list of changes.
+        Raises ValueError for a weight lower than the original one.
+        """
+        G = self.grafo(modo)
+        originales = self._originales.get(modo, dict())
+        validados = []
+        for s, t, peso in cambios:
+            arista = G.obtener_arista(s, t)
+            if arista is not None:
+                original = originales.get((s, t), arista[1])
+                if math.isclose(peso, original):
+                    peso = original
+                elif not peso > original:
+                    raise ValueError(f"The weight of the edge {s} -> {t} cannot be lower than its original weight {original}: {peso}")
+            validados.append((s, t, peso))
+        return validados
+
+    def actualizar_pesos(self, modo, cambios)->int:
+        """
+        Changes in place the weight of edges of the graph of the given mode, e.g. for road
+        closures (math.inf) or traffic; cambios are triples (Cruce, Cruce, weight) with weights
+        not lower than the original ones (see validar_pesos). The preprocessing is kept: the
+        landmarks are still lower bounds with higher weights, and the contraction hierarchy,
+        built on the original weights, is not used while an incident is in effect (see
+        algoritmo_disponible). Returns the number of edges changed.
+        """
+        cambios = self.validar_pesos(modo, cambios)
+        G = self.grafo(modo)
+        # The frozen graph and the pool are only updated if they were up to date
+        C, version = self._compactos.get(modo, (None, None))
+        C = C if version == G.version else None
+        version_compacto = C.version if C is not None else None
+        anteriores = G.actualizar_pesos(cambios)
+        # Original weight of every edge whose weight differs from it
+        originales = self._originales.setdefault(modo, dict())
+        cambiadas = 0
+        for (s, t, peso), anterior in zip(cambios, anteriores):
+            if anterior in (None, peso):
+                continue
+            cambiadas += 1
+            for arista in ([(s, t)] if G.dirigido else [(s, t), (t, s)]):
+                if originales.setdefault(arista, anterior) == peso:
+                    del originales[arista]
+        if cambiadas:
+            self.version += 1
+            if C is not None:
+                self._actualizar_compacto(modo, C, version_compacto, cambios)
+        return cambiadas
+
+    def _actualizar_compacto(self, modo, C, version, cambios):
+        """
+        Applies weight changes already made on the graph of the given mode to its frozen graph C,
+        which had the given version, and to the processes of its pool.
+        """
+        G = self.grafo(modo)
+        if C is not G:
+            C.actualizar_pesos(cambios)
+        self._compactos[modo] = (C, G.version)
+        with self._cerrojo_pools:
+            pool, grafo_pool, version_pool = self._pools.get(modo, (None, None, None))
+            if pool is not None and grafo_pool is C and version_pool == version:
+                ids = [(C._id(s), C._id(t), peso) for s, t, peso in cambios]
+                pool.actualizar_pesos([(i, j, peso) for i, j, peso in ids if i is not None and j is not None])
+                self._pools[modo] = (pool, C, C.version)
+
+    def cambios_factores(self, modo, factores:dict)->list:
+        """
+        Weight changes (Cruce, Cruce, weight) that set every edge of the given streets to its
+        original weight times a factor, e.g. 1.5 for congestion, math.inf to close the street and
+        1 to restore it. factores is a dictionary codigo_via -> factor.
+        Raises KeyError for an unknown codigo_via and ValueError for a factor lower than 1.
+        """
+        if self._posicion_calles is None:
+            self._posicion_calles = {codigo: k for k, codigo in enumerate(np.asarray(self.tablas().codigos_via).tolist())}
+        origenes, destinos, calles, _ = self.aristas(modo)
+        cruces = self.tablas().cruces()
+        G = self.grafo(modo)
+        originales = self._originales.get(modo, dict())
+        cambios = []
+        for codigo_via, factor in factores.items():
+            k = self._posicion_calles[codigo_via]
+            if not factor >= 1:
+                raise ValueError(f"The factor of the street {codigo_via} cannot be lower than 1: {factor}")
+            # The edges of aristas() are grouped by street
+            inicio, fin = np.searchsorted(calles, [k, k + 1])
+            for u, v in zip(origenes[inicio:fin].tolist(), destinos[inicio:fin].tolist()):
+                s, t = cruces[u], cruces[v]
+                arista = G.obtener_arista(s, t)
+                if arista is not None:
+                    cambios.append((s, t, originales.get((s, t), arista[1]) * factor))
+        return cambios
+
+    def aplicar_factores(self, modo, factores:dict)->int:
+        """
+        Applies the changes of cambios_factores to the graph of the given mode.
+        Returns the number of edges changed.
+        """
+        return self.actualizar_pesos(modo, self.cambios_factores(modo, factores))
+
+    def algoritmo_disponible(self, modo, algoritmo):
+        """
+        Algorithm that answers a search of the given algorithm now. While an incident is in effect
+        the contraction hierarchy does not hold and is not rebuilt for temporary weights, so "ch"
+        searches with A*; so does "alt" if its landmarks were not loaded before the incident.
+        """
+        if self.pesos_modificados(modo) and (algoritmo == "ch" or (algoritmo == "alt" and modo not in self._landmarks)):
+            return "astar"
+        return algoritmo
+
+    def jerarquia(self, modo):
+        """
+        Contraction hierarchy of the graph of the given mode.
+        It is loaded from RUTA_JERARQUIA or built (which takes a while) the first time.
+        Raises RuntimeError while an incident is in effect: it only holds for the original weights.
+        """
+        if self.pesos_modificados(modo):
+            raise RuntimeError(f"The contraction hierarchy of {modo} does not hold while the weights are changed")
+        if modo not in self._jerarquias:
+            self._jerarquias[modo] = cargar_o_construir(contraccion.JerarquiaContraccion, RUTA_JERARQUIA.format(modo = modo), self.grafo(modo))
+        return self._jerarquias[modo]
+
+    def landmarks(self, modo):
+        """
+        Landmark tables (ALT heuristic) of the graph of the given mode.
+        They are loaded from RUTA_LANDMARKS or built, one landmark per process, the first time,
+        always on the original weights: raises RuntimeError if that is while an incident is in effect.
+        """
+        if modo not in self._landmarks:
+            if self.pesos_modificados(modo):
+                raise RuntimeError(f"The landmarks of {modo} are not built while the weights are changed")
+            self._landmarks[modo] = cargar_o_construir(landmarks.Landmarks, RUTA_LANDMARKS.format(modo = modo), self.grafo(modo))
+        return self._landmarks[modo]
+
+    def precargar(self, modos = MODOS):
+        """
+        Loads the spatial index, the addresses snapped to the intersections, their search index and the graphs of the given modes, so that the
+        first request does not have to.
+        """
+        self.indice()
+        self.tabla_direcciones()
+        self.buscador()
+        for modo in modos:
+            self.grafo(modo)
+        return self
+
+
+# Registry shared by the console program, the API and every other user of this module
+registro = RegistroGrafos()
 
 def distancia_entre_nodos(cruce1: callejero.Cruce, cruce2: callejero.Cruce):
     """
@@ -28,57 +482,71 @@ def distancia_entre_nodos(cruce1: callejero.Cruce, cruce2: callejero.Cruce):
     """
     return callejero.distancia(cruce1.coord_x, cruce1.coord_y, cruce2.coord_x, cruce2.coord_y)
 
-def crear_grafo_distancia()->grafo.Grafo:
+def longitudes_aristas(tablas, origenes, destinos):
     """
-    Street graph whose weight is determined by the physical distance between two intersections
+    Length in cm of the edges between the intersection ids origenes[i] and destinos[i].
     """
-    G = grafo.Grafo()
-    V = list(callejero.procesar_cruces(cruces).values())
-    [G.agregar_vertice(v) for v in V]
-    calles_dict = callejero.procesar_calles(cruces)
-    for calle in calles_dict.values():
-        codigo_via = calle.codigo_via
-        cruces_calle = calle.lista_cruces()
-        i = 0
-        if len(cruces_calle) > 1:
-            while  i < len(cruces_calle)-1:
-                nodo1, nodo2 = cruces_calle[i], cruces_calle[i+1]
-                G.agregar_arista(nodo1, nodo2, weight = distancia_entre_nodos(nodo1, nodo2))
-                i += 1
-    return G
+    x, y = np.asarray(tablas.cruces_x, dtype=np.float64), np.asarray(tablas.cruces_y, dtype=np.float64)
+    return np.hypot(x[destinos] - x[origenes], y[destinos] - y[origenes])
 
-def crear_grafo_tiempo():
+def grafo_desde_aristas(cruces, origenes, destinos, pesos)->grafo.Grafo:
     """
-    Street graph whose weight is determined by the speeds of the roads
+    Street graph with every intersection as a vertex and the given edges and weights.
     """
     G = grafo.Grafo()
-    V = list(callejero.procesar_cruces(cruces).values())
-    [G.agregar_vertice(v) for v in V]
-    calles_dict = callejero.procesar_calles(cruces)
-    for calle in calles_dict.values():
-        codigo_via = calle.codigo_via
-        cruces_calle = calle.lista_cruces()
-        if len(direcciones[direcciones["Codigo de via"] == codigo_via]["Clase de la via"])>0:
-            tipo_via = direcciones[direcciones["Codigo de via"] == codigo_via]["Clase de la via"].iloc[0].rstrip() 
-            try:
-                velocidad_maxima = VELOCIDADES_CALLES[tipo_via]
-            except KeyError:
-                velocidad_maxima = VELOCIDAD_CALLES_ESTANDAR
-        else:
-            velocidad_maxima = VELOCIDAD_CALLES_ESTANDAR 
-        i = 0
-        if len(cruces_calle) > 1:
-            while  i < len(cruces_calle)-1:
-                nodo1, nodo2 = cruces_calle[i], cruces_calle[i+1]
-                G.agregar_arista(nodo1, nodo2, weight = velocidad_maxima)
-                i += 1
+    [G.agregar_vertice(v) for v in cruces]
+    for u, v, peso in zip(origenes.tolist(), destinos.tolist(), pesos.tolist()):
+        G.agregar_arista(cruces[u], cruces[v], weight = peso)
     return G
 
+def pesos_aristas(tablas, modo, clases = None, velocidades:dict = None, velocidad_estandar:float = None):
+    """
+    Edges of the street graph of the given mode: consecutive intersections of each street
+    (TablasCallejero.aristas) weighted by their length in cm ("shortest") or by the time in
+    seconds to drive them at the maximum speed of the road ("fastest", with the class of road
+    of each street clases and the speed table velocidades, see callejero.velocidades_calles).
+    Returns the origin and destination intersection ids, the street id and the weight of each edge.
+    """
+    origenes, destinos, calles = tablas.aristas()
+    pesos = longitudes_aristas(tablas, origenes, destinos)
+    if modo == "fastest":
+        pesos = pesos / (callejero.velocidades_calles(clases, velocidades, velocidad_estandar)[calles]*KMH_A_CM_S)
+    elif modo != "shortest":
+        raise ValueError(f"Unknown mode: {modo}")
+    return origenes, destinos, calles, pesos
+
+def crear_grafo_distancia()->grafo.Grafo:
+    """
+    Street graph whose weight is determined by the physical distance between two intersections.
+    Consecutive intersections of each street are joined by an edge.
+    """
+    tablas = registro.tablas()
+    origenes, destinos, _, pesos = pesos_aristas(tablas, "shortest")
+    return grafo_desde_aristas(tablas.cruces(), origenes, destinos, pesos)
+
+def tiempo_entre_nodos(cruce1: callejero.Cruce, cruce2: callejero.Cruce, velocidad: float):
+    """
+    Calculates the time in seconds needed to go from one node to the other at the given speed (km/h).
+    """
+    return distancia_entre_nodos(cruce1, cruce2)/(velocidad*KMH_A_CM_S)
+
+def crear_grafo_tiempo(velocidades:dict=None, velocidad_estandar:float=None):
+    """
+    Street graph whose weight is the travel time in seconds between two intersections
+    at the maximum speed of the road. The speed of each class of road is taken from
+    velocidades (callejero.VELOCIDADES_CALLES by default).
+    """
+    tablas = registro.tablas()
+    origenes, destinos, _, tiempos = pesos_aristas(tablas, "fastest", registro.clases_calles(), velocidades, velocidad_estandar)
+    return grafo_desde_aristas(tablas.cruces(), origenes, destinos, tiempos)
+
 
 def dibujar_grafo(G:grafo.Grafo):
     """
     Draws the graph.
     """
+    import networkx as nx
+    import matplotlib.pyplot as plt
     vertices = G.lista_vertices()
     posicion = dict()
     for vertice in vertices:
@@ -91,6 +559,8 @@ def dibujar_ruta(camino, G):
     """
     Draws the route on the graph.
     """
+    import networkx as nx
+    import matplotlib.pyplot as plt
     vertices = G.lista_vertices()
     G = G.convertir_a_NetworkX()
     posicion = dict()
@@ -103,16 +573,33 @@ def dibujar_ruta(camino, G):
     plt.show()
 
 
-def cargar_direcciones(direcciones:pd.DataFrame)->dict:
+def cargar_direcciones(direcciones:"pd.DataFrame")->dict:
     """
     Loads the addresses from a DataFrame into a dictionary.
     """
-    nombre_direcciones = direcciones["Clase de la via"].apply(lambda d: d.rstrip()) + direcciones['Particula de la via'].apply(lambda d: " " + d.rstrip()) + direcciones['Nombre de la via'].apply(lambda d: " "+d.rstrip()) + direcciones["Literal de numeracion"].apply(lambda d: " " + d.rstrip()) #keys
+    partes = [direcciones[columna].astype(str).str.rstrip() for columna in ("Clase de la via", "Particula de la via", "Nombre de la via", "Literal de numeracion")]
+    nombre_direcciones = partes[0] + " " + partes[1] + " " + partes[2] + " " + partes[3] #keys
     coordenadas_direcciones = list(zip(direcciones["Coordenada X (Guia Urbana) cm"], direcciones["Coordenada Y (Guia Urbana) cm"])) #values
     diccionario_direcciones = dict(zip(nombre_direcciones, coordenadas_direcciones))
     return diccionario_direcciones
 
 
+def obtener_direcciones()->dict:
+    """
+    Dictionary address -> coordinates, from the compiled bundle if there is one
+    and from the CSV files otherwise. It is loaded once and kept in the registry.
+    """
+    return registro.direcciones()
+
+
+def buscar_direcciones(consulta:str, n:int = 5, estricta:bool = False)->list:
+    """
+    Names of the n addresses that best match a text typed by the user (see buscador.IndiceDirecciones.buscar).
+    A strict search only returns addresses that match every word of the text.
+    """
+    return registro.buscador().buscar(consulta, n, estricta)
+
+
 def obtener_informacion_direccion(cadena):
     """
     Gets the address information from a string.
@@ -131,31 +618,183 @@ def obtener_informacion_direccion(cadena):
 
 def encontrar_cruce_mas_cercano(direccion):
     """
-    Finds the nearest intersection to a given address
+    Finds the nearest intersection to a given address, precomputed in the snapping table of the registry
     """
-    diccionario_direcciones = cargar_direcciones(direcciones)
-    coordenas_dir = diccionario_direcciones[direccion]
-    cruces_dict = callejero.procesar_cruces(cruces)
-    d_min = np.inf
-    for cord_cruce in cruces_dict.keys():
-        d = callejero.distancia(*coordenas_dir, *cord_cruce)
-        if d <= d_min: 
-            d_min = d
-            cord_cruce_min = cord_cruce
-    cruce_min = cruces_dict[cord_cruce_min]
-    return cruce_min, d_min
+    with metricas.tramo("ajuste"):
+        return registro.resolver_direccion(direccion)
 
-def encontrar_ruta_minima(nodo_origen, nodo_destino, modo):
+def encontrar_cruces_mas_cercanos(direcciones):
     """
-    Finds the shortest path between two nodes in the graph.
+    Finds the nearest intersection to each address of a list
+    """
+    with metricas.tramo("ajuste"):
+        return [registro.resolver_direccion(direccion) for direccion in direcciones]
+
+def heuristica_distancia(cruce: callejero.Cruce, destino: callejero.Cruce):
+    """
+    Lower bound of the length of the route between two nodes: the straight-line distance.
+    """
+    return distancia_entre_nodos(cruce, destino)
+
+def heuristica_tiempo(cruce: callejero.Cruce, destino: callejero.Cruce):
+    """
+    Lower bound of the travel time between two nodes: the straight-line distance
+    at the maximum speed of any road.
+    """
+    return distancia_entre_nodos(cruce, destino)/(registro.velocidad_maxima()*KMH_A_CM_S)
+
+HEURISTICAS = {"shortest": heuristica_distancia, "fastest": heuristica_tiempo}
+
+def crear_grafo(modo):
+    """
+    Street graph of the given mode ("fastest" or "shortest"): the one of the compiled
+    bundle if there is one, otherwise it is built from the CSV files. It is built once
+    and kept in the registry.
+    """
+    with metricas.tramo("grafo"):
+        return registro.grafo(modo)
+
+def crear_grafo_csv(modo):
+    """
+    Builds the street graph of the given mode ("fastest" or "shortest") from the CSV files.
     """
     if modo == "fastest":
-        G = crear_grafo_tiempo()
+        return crear_grafo_tiempo()
     elif modo == "shortest":
-        G = crear_grafo_distancia()
-    camino = G.camino_minimo(nodo_origen, nodo_destino)
+        return crear_grafo_distancia()
+    raise ValueError(f"Unknown mode: {modo}")
+
+def cargar_o_construir(clase, ruta, G):
+    """
+    Loads preprocessed data of the graph G (a JerarquiaContraccion or Landmarks) from ruta
+    if it was built from the same graph; otherwise builds it and saves it there.
+    The loaded data use the vertices of G, the Cruce objects of the registry.
+    """
+    C = G.congelar()
+    preprocesado = clase.cargar(ruta, C) if os.path.exists(ruta) else None
+    if preprocesado is None:
+        preprocesado = clase.construir(C)
+        preprocesado.guardar(ruta)
+    return preprocesado
+
+def obtener_jerarquia(modo):
+    """
+    Returns the contraction hierarchy of the graph of the given mode (see RegistroGrafos.jerarquia).
+    """
+    return registro.jerarquia(modo)
+
+def obtener_landmarks(modo):
+    """
+    Returns the landmark tables of the graph of the given mode (see RegistroGrafos.landmarks).
+    """
+    return registro.landmarks(modo)
+
+def buscar_ruta(G, nodo_origen, nodo_destino, modo, algoritmo = "astar"):
+    """
+    Searches the shortest path between two nodes of the graph of the given mode.
+    Returns the path, its cost and the number of nodes settled by the search.
+    """
+    algoritmo = registro.algoritmo_disponible(modo, algoritmo)
+    with metricas.tramo("busqueda"):
+        if algoritmo == "ch":
+            camino, coste, asentados = obtener_jerarquia(modo).buscar_camino(nodo_origen, nodo_destino)
+        elif algoritmo == "alt":
+            camino, coste, asentados = G.buscar_camino(nodo_origen, nodo_destino, metodo = "astar", heuristica = obtener_landmarks(modo).heuristica)
+        else:
+            heuristica = HEURISTICAS[modo] if algoritmo == "astar" else None
+            camino, coste, asentados = G.buscar_camino(nodo_origen, nodo_destino, metodo = algoritmo, heuristica = heuristica)
+    registrar_busqueda(camino, asentados, algoritmo)
+    return camino, coste, asentados
+
+def registrar_busqueda(camino, asentados, algoritmo):
+    """
+    Adds a route search to the metrics: settled nodes and length of the path found.
+    """
+    NODOS_ASENTADOS.observar(asentados, algoritmo = algoritmo)
+    if camino is None:
+        SIN_CAMINO.incrementar()
+    else:
+        LONGITUD_CAMINO.observar(len(camino))
+
+def encontrar_ruta_minima(nodo_origen, nodo_destino, modo, algoritmo = "astar"):
+    """
+    Finds the shortest path between two nodes in the graph.
+    algoritmo: "astar" (default), "dijkstra", "bidireccional", "ch" or "alt".
+    """
+    G = crear_grafo(modo)
+    camino, _, _ = buscar_ruta(G, nodo_origen, nodo_destino, modo, algoritmo)
     return camino, G
 
+def comparar_algoritmos(nodo_origen, nodo_destino, modo, algoritmos = grafo.METODOS_BUSQUEDA):
+    """
+    Runs every search algorithm on the same graph and returns, for each one,
+    the cost of the route, the number of settled nodes and the search time.
+    """
+    G = crear_grafo(modo)
+    resultados = dict()
+    for algoritmo in algoritmos:
+        inicio = time.perf_counter()
+        camino, coste, asentados = buscar_ruta(G, nodo_origen, nodo_destino, modo, algoritmo)
+        resultados[algoritmo] = {"coste": coste, "asentados": asentados, "segundos": time.perf_counter() - inicio}
+    return resultados
+
+def matriz_distancias(direcciones_origen, direcciones_destino, modo = "fastest", procesos = None):
+    """
+    Cost (centimetres if modo is "shortest", seconds if "fastest") of the shortest route
+    between the nearest intersection of every origin address and that of every destination address.
+    Returns a NumPy matrix with a row per origin and a column per destination (np.inf if unreachable).
+    """
+    nodos_origen = [cruce for cruce, _ in encontrar_cruces_mas_cercanos(direcciones_origen)]
+    nodos_destino = [cruce for cruce, _ in encontrar_cruces_mas_cercanos(direcciones_destino)]
+    # The searches run in the persistent pool of the registry, or here if there are few origins
+    C = registro.grafo_compacto(modo)
+    pool = registro.pool(modo, procesos) if grafo_compacto.procesos_necesarios(len(nodos_origen), procesos) > 1 else None
+    return C.matriz_distancias(nodos_origen, nodos_destino, procesos, pool)
+
+def rutas_en_lote(pares, modo = "fastest", instrucciones = False, procesos = None):
+    """
+    Routes many (origin address, destination address) pairs. The graph is shared read-only with
+    the persistent pool of processes of the registry (see RegistroGrafos.pool), which run a bidirectional
+    search on each pair with integer ids; the addresses are resolved and the paths translated
+    back to intersections here. Returns a dictionary per pair with the cost of the route
+    (None if there is none), the path as a list of intersections and, if asked, its directions,
+    or the error of the pair if one of its addresses is unknown.
+    """
+    C = registro.grafo_compacto(modo)
+    pares = list(pares)
+    extremos = []
+    for origen, destino in pares:
+        try:
+            extremos.append(encontrar_cruces_mas_cercanos([origen, destino]))
+        except KeyError as e:
+            extremos.append(e)
+    # Intersections outside the graph (with no streets) have no route, they are not sent
+    tareas = [(C._id(nodo_origen), C._id(nodo_destino), "bidireccional")
+              for (nodo_origen, _), (nodo_destino, _) in (e for e in extremos if not isinstance(e, KeyError))]
+    enviadas = [tarea for tarea in tareas if None not in tarea]
+    # Few pairs are searched here: sending them to the processes would take longer
+    procesos = grafo_compacto.procesos_necesarios(len(enviadas), procesos)
+    pool = registro.pool(modo, procesos) if procesos > 1 else None
+    with metricas.tramo("busqueda"):
+        caminos = iter(grafo_compacto.ejecutar_en_paralelo(C, "buscar_camino_ids", enviadas, procesos, pool))
+    caminos = iter([next(caminos) if None not in tarea else (None, grafo.INFTY, 0) for tarea in tareas])
+
+    resultados = []
+    for (origen, destino), extremo in zip(pares, extremos):
+        if isinstance(extremo, KeyError):
+            resultados.append({"error": f"Unknown address: {extremo}"})
+            continue
+        (_, d_or), (_, d_dest) = extremo
+        ids, coste, asentados = next(caminos)
+        camino = [C.vertices[i] for i in ids] if ids is not None else None
+        registrar_busqueda(camino, asentados, "bidireccional")
+        resultado = {"coste": float(coste) if camino is not None else None, "camino": camino}
+        if instrucciones and camino is not None:
+            resultado["instrucciones"] = list(generar_instrucciones(camino, obtener_informacion_direccion(origen)["nombre"], d_or,
+                                                                    obtener_informacion_direccion(destino)["nombre"], d_dest))
+        resultados.append(resultado)
+    return resultados
+
 def rotonda(nodo):
     """
     Checks if a node is a roundabout.
@@ -183,10 +822,7 @@ def obtener_calle_arista(nodo1, nodo2):
     """
     Gets the street name of the edge between two nodes.
     """
-    calles_nodo1 = nodo1.calles
-    calles_nodo2 = nodo2.calles
-    calle_nodo = list(calles_nodo1.intersection(calles_nodo2))
-    return calle_nodo[0] if calle_nodo != [] else ""
+    return nodo1.calle_comun(nodo2)
 
 
 def determinar_sentido_giro(nodo1, nodo2, nodo3):
@@ -196,79 +832,85 @@ def determinar_sentido_giro(nodo1, nodo2, nodo3):
     return (nodo3.coord_x -nodo2.coord_x > 0)
 
 
-def dirigir_ruta(direccion_origen, direccion_destino, modo = "fastest"):
+def generar_instrucciones(camino, calle_origen, d_or, calle_destino, d_dest, intermedias = None):
     """
-    Given an origin address and a destination address,
-    gives the directions that the route follows according to the shortest path.
+    Generator of the directions of a path, from the street of the origin address to that of
+    the destination. Each instruction is yielded as soon as it is written, without waiting.
+    intermedias are the directions along the path if they are already known.
+    """
+    yield f"Continua por {calle_origen} {d_or/100} metros"
+    yield from instrucciones_camino(camino) if intermedias is None else intermedias
+    yield f"Continua por {calle_destino} {d_dest/100} metros"
+    yield "Ha llegado a su destino"
+
+def instrucciones_camino(camino):
+    """
+    Generator of the directions along a path, which only depend on its intersections.
+    """
+    for i, nodo in enumerate(camino[:-1]):
+        calle_arista = obtener_calle_arista(camino[i], camino[i+1])
+        distancia = distancia_entre_nodos(camino[i], camino[i+1])/100
+        if rotonda(nodo):
+            yield f"En la rotonda, sal por {calle_arista} y continua {distancia} metros por {calle_arista}"
+        elif obtener_calle_arista(camino[i-1], camino[i]) == calle_arista:
+            yield f"Continua recto por {calle_arista} {distancia} metros "
+        elif determinar_sentido_giro(camino[i-1], camino[i], camino[i+1]): # es un giro
+            yield f"Dirigite a la derecha y continua {distancia} metros por {calle_arista}"
+        else:
+            yield f"Dirigite a la izquierda y continua {distancia} metros por {calle_arista}"
+
+def planificar_ruta(direccion_origen, direccion_destino, modo = "fastest", algoritmo = "astar"):
+    """
+    Searches the route between two addresses.
+    Returns the path, the graph and the generator of its directions.
     """
-    calle_origen = obtener_informacion_direccion(direccion_origen)["nombre"] 
     nodo_origen, d_or = encontrar_cruce_mas_cercano(direccion_origen)
-    print("Cargando ruta...") #Loading route...
     nodo_destino, d_dest = encontrar_cruce_mas_cercano(direccion_destino)
-    camino, G = encontrar_ruta_minima(nodo_origen, nodo_destino, modo)
-    print(f"Continua por {calle_origen} {d_or/100} metros")
-    i = 0
-    for nodo in camino:
-        time.sleep(0.3)
-        if i < len(camino) - 1:
-            calle_arista = obtener_calle_arista(camino[i], camino[i+1])
-            distancia = distancia_entre_nodos(camino[i], camino[i+1])/100
-            if rotonda(nodo):
-                print(f"En la rotonda, sal por {calle_arista} y continua {distancia} metros por {calle_arista}")
-            else:
-                if obtener_calle_arista(camino[i-1], camino[i]) == obtener_calle_arista(camino[i], camino[i+1]):
-                    print(f"Continua recto por {calle_arista} {distancia} metros ")
-                else: # es un giro
-                    nodo1 = camino[i-1]
-                    nodo2 = camino[i]
-                    nodo3 = camino[i+1]
-                    if determinar_sentido_giro(nodo1, nodo2, nodo3):
-                        print(f"Dirigite a la derecha y continua {distancia} metros por {calle_arista}")
-                    else:
-                        print(f"Dirigite a la izquierda y continua {distancia} metros por {calle_arista}")
-            i+= 1
-
-
-    calle_destino = obtener_informacion_direccion(direccion_destino)["nombre"] 
-    print(f"Continua por {calle_destino} {d_dest/100} metros")
-    print("Ha llegado a su destino")
+    camino, G = encontrar_ruta_minima(nodo_origen, nodo_destino, modo, algoritmo)
+    instrucciones = generar_instrucciones(camino, obtener_informacion_direccion(direccion_origen)["nombre"], d_or,
+                                          obtener_informacion_direccion(direccion_destino)["nombre"], d_dest)
+    return camino, G, instrucciones
+
+def dirigir_ruta(direccion_origen, direccion_destino, modo = "fastest", algoritmo = "astar", pausa = 0.0):
+    """
+    Given an origin address and a destination address,
+    prints the directions that the route follows according to the shortest path,
+    waiting pausa seconds between them (a display option of the console).
+    """
+    print("Cargando ruta...") #Loading route...
+    camino, G, instrucciones = planificar_ruta(direccion_origen, direccion_destino, modo, algoritmo)
+    for instruccion in instrucciones:
+        print(instruccion)
+        if pausa:
+            time.sleep(pausa)
     return camino, G
 
-def dirigir_ruta_api(direccion_origen, direccion_destino, modo = "fastest"):
+def ruta_en_cache(nodo_origen, nodo_destino, modo = "fastest", algoritmo = "astar"):
+    """
+    Path between two intersections and the directions along it, from the route cache of the
+    registry: only computed if it is not there, once for all the concurrent requests of the
+    same route. The cache is emptied when the graphs change (registro.version_grafos).
+    """
+    def calcular():
+        camino, _ = encontrar_ruta_minima(nodo_origen, nodo_destino, modo, algoritmo)
+        with metricas.tramo("instrucciones"):
+            return camino, (tuple(instrucciones_camino(camino)) if camino is not None else None)
+    # The graph is loaded before taking the version, which includes its own
+    registro.grafo(modo)
+    return registro.cache.obtener((nodo_origen, nodo_destino, modo, algoritmo), calcular, registro.version_grafos())
+
+def dirigir_ruta_api(direccion_origen, direccion_destino, modo = "fastest", algoritmo = "astar"):
     """
     Given an origin address and a destination address,
-    gives the directions that the route follows according to the shortest path.
+    returns the directions that the route follows according to the shortest path
+    (None if there is no route). Routes already answered are taken from the cache.
     """
-    calle_origen = obtener_informacion_direccion(direccion_origen)["nombre"] 
     nodo_origen, d_or = encontrar_cruce_mas_cercano(direccion_origen)
-    print("Cargando ruta...") #Loading route...
     nodo_destino, d_dest = encontrar_cruce_mas_cercano(direccion_destino)
-    camino, G = encontrar_ruta_minima(nodo_origen, nodo_destino, modo)
-    print(f"Continua por {calle_origen} {d_or/100} metros")
-    salida = []
-    i = 0
-    for nodo in camino:
-        time.sleep(0.3)
-        if i < len(camino) - 1:
-            calle_arista = obtener_calle_arista(camino[i], camino[i+1])
-            distancia = distancia_entre_nodos(camino[i], camino[i+1])/100
-            if rotonda(nodo):
-                salida.append(f"En la rotonda, sal por {calle_arista} y continua {distancia} metros por {calle_arista}")
-            else:
-                if obtener_calle_arista(camino[i-1], camino[i]) == obtener_calle_arista(camino[i], camino[i+1]):
-                    salida.append(f"Continua recto por {calle_arista} {distancia} metros ")
-                else: # es un giro
-                    nodo1 = camino[i-1]
-                    nodo2 = camino[i]
-                    nodo3 = camino[i+1]
-                    if determinar_sentido_giro(nodo1, nodo2, nodo3):
-                        salida.append(f"Dirigite a la derecha y continua {distancia} metros por {calle_arista}")
-                    else:
-                        salida.append(f"Dirigite a la izquierda y continua {distancia} metros por {calle_arista}")
-            i+= 1
-
-
-    calle_destino = obtener_informacion_direccion(direccion_destino)["nombre"] 
-    salida.append(f"Continua por {calle_destino} {d_dest/100} metros")
-    salida.append("Ha llegado a su destino")
-    return salida, G
+    camino, instrucciones = ruta_en_cache(nodo_origen, nodo_destino, modo, algoritmo)
+    if camino is None:
+        return None, crear_grafo(modo)
+    with metricas.tramo("instrucciones"):
+        salida = list(generar_instrucciones(camino, obtener_informacion_direccion(direccion_origen)["nombre"], d_or,
+                                            obtener_informacion_direccion(direccion_destino)["nombre"], d_dest, instrucciones))
+    return salida, crear_grafo(modo)
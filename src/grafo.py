@@ -13,12 +13,15 @@ Description:
 Library for creating and analyzing directed and undirected graphs.
 """
 
-from typing import List,Tuple,Dict
-import networkx as nx
+from typing import List,Tuple,Dict,Iterable
 import sys
+import itertools
 
 import heapq #Library for creating priority queues
 
+# numpy and networkx are only imported by the methods that need them, so that
+# importing this module stays cheap
+
 INFTY = sys.float_info.max # "Infinite" distance between nodes of a graph
 
 
@@ -57,6 +60,14 @@ class Grafo():
         """
         self.adyacencia:Dict[object,Dict[object,Tuple[object,float]]]={}
 
+        # Reverse adjacency of a directed graph (inversa[v][u] = weight of (u,v)),
+        # built on demand by the bidirectional search and discarded when the graph changes.
+        self._adyacencia_inversa:Dict[object,Dict[object,float]]=None
+
+        # Number of changes of the edges or their weights, so that data derived from the graph
+        # (preprocessing, cached routes...) can tell that it is out of date.
+        self.version=0
+
     #### Operaciones básicas del TAD ####
     def es_dirigido(self)->bool:
         """ Indicates whether the graph is directed or not
@@ -84,6 +95,7 @@ class Grafo():
 
         if v not in self.adyacencia:
             self.adyacencia[v] = {}
+            self._adyacencia_inversa = None
 
 
     def agregar_arista(self,s:object,t:object,data:object=None,weight:float=1)->None:
@@ -109,6 +121,8 @@ class Grafo():
             self.adyacencia[s][t] = (data,weight)
             if not self.dirigido and s != t:
                 self.adyacencia[t][s] = (data, weight)
+            self._adyacencia_inversa = None
+            self.version += 1
     
     def eliminar_vertice(self,v:object)->None:
         """ If the object v is a vertex of the graph, it is removed.
@@ -125,6 +139,8 @@ class Grafo():
 
         if v in self.adyacencia:
             del self.adyacencia[v]
+            self._adyacencia_inversa = None
+            self.version += 1
 
         if self.dirigido:
             for vertice in self.adyacencia:
@@ -155,6 +171,37 @@ class Grafo():
 
         if s in self.adyacencia and t in self.adyacencia[s]:
             del self.adyacencia[s][t]
+            self._adyacencia_inversa = None
+            self.version += 1
+
+    def actualizar_pesos(self,cambios:Iterable[Tuple[object,object,float]])->List[float]:
+        """ Changes the weight of existing edges in place, keeping their data (e.g. to close
+        a road with weight math.inf or to apply traffic). In an undirected graph both directions
+        change. The cost only depends on the number of changes, not on the size of the graph.
+
+        Args:
+            cambios (Iterable[Tuple[object,object,float]]): triples (s,t,w): the edge from s to t
+                gets the weight w. Edges that do not exist are ignored.
+        Returns:
+            List[float]: previous weight of the edge of each change, None if it does not exist.
+        Raises: None
+        """
+        anteriores = []
+        for s, t, peso in cambios:
+            arista = self.adyacencia.get(s, {}).get(t)
+            if arista is None:
+                anteriores.append(None)
+                continue
+            anteriores.append(arista[1])
+            self.adyacencia[s][t] = (arista[0], peso)
+            if not self.dirigido:
+                self.adyacencia[t][s] = (self.adyacencia[t][s][0], peso)
+            elif self._adyacencia_inversa is not None:
+                # The reverse adjacency is repaired instead of rebuilt
+                self._adyacencia_inversa[t][s] = peso
+        if any(anterior is not None for anterior in anteriores):
+            self.version += 1
+        return anteriores
 
 
     def obtener_arista(self,s:object,t:object)->Tuple[object,float]:
@@ -300,6 +347,22 @@ class Grafo():
             
 
     #### Algoritmos ####
+    def _vecinos(self,u:object):
+        """ Iterates over the pairs (v,w) such that (u,v) is an edge of the graph with weight w. """
+        for v, (_, peso) in self.adyacencia[u].items():
+            yield v, peso
+
+    def _vecinos_inversos(self,v:object):
+        """ Iterates over the pairs (u,w) such that (u,v) is an edge of the graph with weight w. """
+        if not self.dirigido:
+            return self._vecinos(v)
+        if self._adyacencia_inversa is None:
+            self._adyacencia_inversa = {u: {} for u in self.adyacencia}
+            for u, adyacentes in self.adyacencia.items():
+                for w, (_, peso) in adyacentes.items():
+                    self._adyacencia_inversa[w][u] = peso
+        return self._adyacencia_inversa[v].items()
+
     def dijkstra(self,origen:object)-> Dict[object,object]:
         """ Calculates a Minimum Path Tree for the graph starting
         from the vertex "origen" using Dijkstra's algorithm. It only calculates
@@ -319,21 +382,10 @@ class Grafo():
         
         es_hasheable(origen)
 
-        distancias = {vertice: float('inf') for vertice in self.adyacencia}
         padres = {vertice: None for vertice in self.adyacencia}
-        distancias[origen] = 0
-
-        vertices_restantes = set(self.adyacencia.keys())
-
-        while vertices_restantes:
-            vertice_actual = min(vertices_restantes, key=lambda v: distancias[v])
-            vertices_restantes.remove(vertice_actual)
-
-            for vecino, peso in self.adyacencia[vertice_actual].items():
-                nueva_distancia = distancias[vertice_actual] + peso[1]
-                if nueva_distancia < distancias[vecino]:
-                    distancias[vecino] = nueva_distancia
-                    padres[vecino] = vertice_actual
+        if origen in self.adyacencia:
+            arbol, _, _ = busqueda_dijkstra(self._vecinos, origen)
+            padres.update(arbol)
 
         return padres
     
@@ -349,24 +401,57 @@ class Grafo():
             List[object]: Returns a list with the vertices of the graph through which it passes
                 the shortest path between the origin and the destination. The first element of
                 the list is origin and the last destination.
+            None: If there is no path between origen and destino.
         Example:
             If G.camino_minimo(1,4)=[1,5,2,4] then the shortest path in G between 1 and 4 is 1->5->2->4.
         Raises:
             TypeError: If origen or destino are not "hashable".
         """
 
+        camino, _, _ = self.buscar_camino(origen, destino)
+        return camino
+
+    def buscar_camino(self,origen:object,destino:object,metodo:str="dijkstra",heuristica=None)->Tuple[List[object],float,int]:
+        """ Searches a minimum path from the origin vertex to the destination vertex
+        with a priority queue (heap) version of Dijkstra's algorithm or with A*.
+        The search stops as soon as the destination is settled, so only the part of
+        the graph closer to the origin than the destination is explored.
+        
+        Args:
+            origen (object): vertex of the graph of origin
+            destino (object): vertex of the graph of destination
+            metodo (str, optional): "dijkstra", "astar" or "bidireccional" (Dijkstra from
+                both ends at once). Defaults to "dijkstra".
+            heuristica (callable, optional): function h(v,destino) that returns a lower bound
+                of the weight of the minimum path from v to destino. Required by "astar".
+                It must be consistent (h(u,t) <= w(u,v) + h(v,t)) for the result to be a minimum path.
+        Returns:
+            Tuple[List[object],float,int]: A tuple (camino,coste,asentados) with the list of vertices
+                of the minimum path (None if destino is not reachable), its total weight (INFTY if
+                destino is not reachable) and the number of vertices settled by the search.
+        Raises:
+            TypeError: If origen or destino are not "hashable".
+            ValueError: If metodo is not valid or "astar" is requested without heuristica.
+        Example:
+            If G.buscar_camino(1,4)=([1,5,2,4],7,5) then the shortest path is 1->5->2->4, it
+            weighs 7 and the search settled 5 vertices to find it.
+        """
+
         es_hasheable(origen)
         es_hasheable(destino)
+        heuristica = comprobar_metodo(metodo, heuristica)
 
-        padres = self.dijkstra(origen)
+        if origen not in self.adyacencia or destino not in self.adyacencia:
+            return None, INFTY, 0
 
-       # Reconstruir el camino desde el destino hasta el origen
-        camino = [destino]
-        while camino[-1] != origen:
-            camino.append(padres[camino[-1]])
+        if metodo == "bidireccional":
+            return busqueda_bidireccional(self._vecinos, self._vecinos_inversos, origen, destino)
 
-        # Invertir el camino para que vaya desde el origen hasta el destino
-        return camino[::-1]
+        padres, distancias, asentados = busqueda_dijkstra(self._vecinos, origen, destino, heuristica)
+        if destino not in padres:
+            return None, INFTY, asentados
+
+        return reconstruir_camino(padres, destino), distancias[destino], asentados
 
 
     def prim(self)-> Dict[object,object]:
@@ -452,8 +537,60 @@ class Grafo():
     
 
 
+    def matriz_distancias(self,origenes:List[object],destinos:List[object],procesos:int=None):
+        """ Calculates the weight of the minimum paths from every origin to every destination.
+        It runs one Dijkstra search per origin that stops when all the destinations are settled.
+        
+        Args:
+            origenes (List[object]): vertices of origin.
+            destinos (List[object]): vertices of destination.
+            procesos (int, optional): number of processes among which the origins are spread.
+                Defaults to one per core, or to the current process if there are few origins
+                (see grafo_compacto.procesos_necesarios). With 1 everything runs in the current process.
+        Returns:
+            np.ndarray: matrix M of shape (len(origenes),len(destinos)) where M[i][j] is the weight
+                of the minimum path from origenes[i] to destinos[j] (np.inf if there is no path or
+                one of them is not a vertex of the graph).
+        Raises:
+            TypeError: If any vertex is not "hashable".
+        """
+        for v in list(origenes) + list(destinos):
+            es_hasheable(v)
+
+        from src.grafo_compacto import procesos_necesarios
+        procesos = procesos_necesarios(len(origenes), procesos)
+        if procesos != 1 and len(origenes) > 1:
+            # The workers receive the graph as CSR arrays, much cheaper to send than the dictionaries
+            return self.congelar().matriz_distancias(origenes, destinos, procesos)
+
+        import numpy as np
+        columnas = [j for j, v in enumerate(destinos) if v in self.adyacencia]
+        validos = [destinos[j] for j in columnas]
+        matriz = np.full((len(origenes), len(destinos)), np.inf)
+        for i, origen in enumerate(origenes):
+            if origen in self.adyacencia and validos:
+                distancias = np.array(distancias_a_destinos(self._vecinos, origen, validos), dtype=np.float64)
+                distancias[distancias == INFTY] = np.inf
+                matriz[i, columnas] = distancias
+        return matriz
+
+
+    #### Representación compacta ####
+    def congelar(self):
+        """ Builds a frozen, array-backed copy of the graph (see grafo_compacto.py).
+        The copy does not change if the graph is modified afterwards.
+        
+        Args: None
+        Returns:
+            GrafoCompacto: graph with the same vertices and edges stored in CSR arrays.
+        Raises: None
+        """
+        from src.grafo_compacto import GrafoCompacto
+        return GrafoCompacto.desde_grafo(self)
+
+
     #### NetworkX ####
-    def convertir_a_NetworkX(self)-> nx.Graph:
+    def convertir_a_NetworkX(self)-> "nx.Graph":
         """ Builds a Networkx graph or digraph as appropriate
         from the data of the current graph.
         
@@ -464,6 +601,7 @@ class Grafo():
             In both cases, the vertices and edges are those contained in the given graph.
         Raises: None
         """
+        import networkx as nx
         if self.dirigido:
             grafo = nx.DiGraph()
         else:
@@ -487,3 +625,180 @@ def es_hasheable(v):
         hash(v)
     except TypeError:
         raise TypeError("The object is not hashable")
+
+
+METODOS_BUSQUEDA = ("dijkstra", "astar", "bidireccional")
+
+
+def comprobar_metodo(metodo:str,heuristica):
+    """ Checks the search method requested to buscar_camino.
+
+    Returns:
+        The heuristic to be used by the search (None for plain Dijkstra).
+    Raises:
+        ValueError: If metodo is not valid or "astar" is requested without heuristica.
+    """
+    if metodo not in METODOS_BUSQUEDA:
+        raise ValueError(f"Unknown search method: {metodo}")
+    if metodo == "astar":
+        if heuristica is None:
+            raise ValueError("A* needs a heuristic")
+        return heuristica
+    return None
+
+
+def busqueda_dijkstra(vecinos,origen:object,destino:object=None,heuristica=None)->Tuple[Dict[object,object],Dict[object,float],int]:
+    """ Dijkstra's algorithm with a binary heap as priority queue. If a heuristic
+    is given the vertices are settled in order of distancia+heuristica, i.e., A*.
+
+    Args:
+        vecinos (callable): function that, given a vertex u, iterates over the pairs (v,w)
+            such that (u,v) is an edge with weight w.
+        origen (object): vertex of origin.
+        destino (object, optional): if given, the search stops as soon as it is settled.
+        heuristica (callable, optional): consistent lower bound h(v,destino). Requires destino.
+    Returns:
+        Tuple[Dict[object,object],Dict[object,float],int]: The parent of every settled vertex in the
+            minimum path tree (None for origen), the distance from origen to every settled vertex and
+            the number of settled vertices.
+    """
+    distancias = {origen: 0}
+    padres = {origen: None}
+    asentados = set()
+    # The counter breaks ties between equal priorities, since vertices need not be comparable
+    contador = itertools.count()
+    cola = [(0, next(contador), origen)]
+
+    while cola:
+        _, _, u = heapq.heappop(cola)
+        if u in asentados:
+            continue
+        asentados.add(u)
+        if u == destino:
+            break
+
+        distancia = distancias[u]
+        for v, peso in vecinos(u):
+            nueva_distancia = distancia + peso
+            if v not in asentados and nueva_distancia < distancias.get(v, INFTY):
+                distancias[v] = nueva_distancia
+                padres[v] = u
+                prioridad = nueva_distancia if heuristica is None else nueva_distancia + heuristica(v, destino)
+                heapq.heappush(cola, (prioridad, next(contador), v))
+
+    # Only settled vertices have a definitive parent and distance
+    padres = {v: padres[v] for v in asentados}
+    distancias = {v: distancias[v] for v in asentados}
+    return padres, distancias, len(asentados)
+
+
+def busqueda_bidireccional(vecinos,vecinos_inversos,origen:object,destino:object)->Tuple[List[object],float,int]:
+    """ Bidirectional Dijkstra: a forward search from origen and a backward search
+    from destino (over the reversed edges) advance alternately, always the one whose
+    next vertex is closer. Every edge that links both searches gives a candidate path
+    and the search stops when the sum of the two smallest tentative distances is not
+    lower than the best candidate, which is then a minimum path.
+
+    Args:
+        vecinos (callable): function that, given u, iterates over the pairs (v,w) of edges (u,v).
+        vecinos_inversos (callable): function that, given v, iterates over the pairs (u,w) of edges (u,v).
+        origen (object): vertex of origin.
+        destino (object): vertex of destination.
+    Returns:
+        Tuple[List[object],float,int]: Same as Grafo.buscar_camino, the settled vertices
+            of both searches are counted.
+    """
+    if origen == destino:
+        return [origen], 0, 1
+
+    contador = itertools.count()
+    # Index 0 holds the forward search and index 1 the backward search
+    funciones = (vecinos, vecinos_inversos)
+    distancias = ({origen: 0}, {destino: 0})
+    padres = ({origen: None}, {destino: None})
+    asentados = (set(), set())
+    colas = ([(0, next(contador), origen)], [(0, next(contador), destino)])
+    mejor_coste, encuentro = INFTY, None
+
+    def cima(lado):
+        """ Discards the settled vertices from the top of the queue and returns its distance """
+        cola = colas[lado]
+        while cola and cola[0][2] in asentados[lado]:
+            heapq.heappop(cola)
+        return cola[0][0] if cola else INFTY
+
+    while True:
+        cima_directa, cima_inversa = cima(0), cima(1)
+        if cima_directa == INFTY or cima_inversa == INFTY or cima_directa + cima_inversa >= mejor_coste:
+            break
+
+        lado = 0 if cima_directa <= cima_inversa else 1
+        distancia, _, u = heapq.heappop(colas[lado])
+        asentados[lado].add(u)
+        propias, opuestas = distancias[lado], distancias[1 - lado]
+
+        for v, peso in funciones[lado](u):
+            nueva_distancia = distancia + peso
+            if v not in asentados[lado] and nueva_distancia < propias.get(v, INFTY):
+                propias[v] = nueva_distancia
+                padres[lado][v] = u
+                heapq.heappush(colas[lado], (nueva_distancia, next(contador), v))
+            if v in opuestas and distancia + peso + opuestas[v] < mejor_coste:
+                mejor_coste = distancia + peso + opuestas[v]
+                encuentro = v
+
+    numero_asentados = len(asentados[0]) + len(asentados[1])
+    if encuentro is None:
+        return None, INFTY, numero_asentados
+
+    camino = reconstruir_camino(padres[0], encuentro)
+    vertice = padres[1][encuentro]
+    while vertice is not None:
+        camino.append(vertice)
+        vertice = padres[1][vertice]
+    return camino, mejor_coste, numero_asentados
+
+
+def distancias_a_destinos(vecinos,origen:object,destinos:List[object])->List[float]:
+    """ Distances from origen to several destinations with a single Dijkstra search
+    that stops as soon as all of them are settled.
+
+    Args:
+        vecinos (callable): function that, given u, iterates over the pairs (v,w) of edges (u,v).
+        origen (object): vertex of origin.
+        destinos (List[object]): vertices of destination.
+    Returns:
+        List[float]: distance to each destination, in the same order (INFTY if unreachable).
+    """
+    pendientes = set(destinos)
+    distancias = {origen: 0}
+    asentados = set()
+    contador = itertools.count()
+    cola = [(0, next(contador), origen)]
+
+    while cola and pendientes:
+        distancia, _, u = heapq.heappop(cola)
+        if u in asentados:
+            continue
+        asentados.add(u)
+        pendientes.discard(u)
+
+        for v, peso in vecinos(u):
+            nueva_distancia = distancia + peso
+            if v not in asentados and nueva_distancia < distancias.get(v, INFTY):
+                distancias[v] = nueva_distancia
+                heapq.heappush(cola, (nueva_distancia, next(contador), v))
+
+    return [distancias[v] if v in asentados else INFTY for v in destinos]
+
+
+def reconstruir_camino(padres:Dict[object,object],destino:object)->List[object]:
+    """ Follows the parents of a minimum path tree from destino back to its root.
+
+    Returns:
+        List[object]: The path from the root of the tree to destino.
+    """
+    camino = [destino]
+    while padres[camino[-1]] is not None:
+        camino.append(padres[camino[-1]])
+    return camino[::-1]
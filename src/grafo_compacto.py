@@ -0,0 +1,514 @@
+"""
+grafo_compacto.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Frozen, array-backed version of a graph. The vertices are renumbered to
+dense integers 0..n-1 and the adjacency is stored in CSR format (Compressed
+Sparse Row) with NumPy arrays:
+    indptr[i]:indptr[i+1]   range of positions of the edges that leave vertex i
+    indices[k]              target vertex of the edge stored in position k
+    pesos[k]                weight of the edge stored in position k
+The original vertex objects are kept in a list so that the results of the
+algorithms can be translated back to them.
+"""
+
+from typing import List,Tuple,Dict,Iterable
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import heapq
+import os
+import threading
+
+import numpy as np
+
+import src.grafo as grafo
+from src.grafo import INFTY, es_hasheable
+
+
+class GrafoCompacto():
+    """
+    Graph stored in CSR arrays. It offers the same queries and algorithms as
+    Grafo, but the searches work on integers instead of hashing the vertex
+    objects on every relaxation. Its vertices and edges are fixed; only the
+    weights can change, with actualizar_pesos.
+    """
+
+    def __init__(self,vertices:List[object],indptr:np.ndarray,indices:np.ndarray,pesos:np.ndarray,datos:List[object]=None,dirigido:bool=False):
+        """ Creates a compact graph from its CSR arrays.
+
+        Args:
+            vertices (List[object]): vertex objects, the position of each one is its integer id.
+            indptr (np.ndarray): array of n+1 offsets into indices and pesos.
+            indices (np.ndarray): target vertex id of each edge.
+            pesos (np.ndarray): weight of each edge.
+            datos (List[object], optional): data of each edge. None if no edge stores data.
+            dirigido (bool): Flag indicating whether the graph is directed (true) or not (false).
+        Returns:
+            Compact graph with the given vertices and edges.
+        """
+        self.dirigido = dirigido
+        self.vertices = list(vertices)
+        self.indice:Dict[object,int] = {v: i for i, v in enumerate(self.vertices)}
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.pesos = np.asarray(pesos, dtype=np.float64)
+        self.datos = datos
+        self._grados_entrantes = None
+        self._inverso = None
+        self.version = 0  # number of changes of the weights, as Grafo.version
+
+    @classmethod
+    def desde_grafo(cls,G:grafo.Grafo)->"GrafoCompacto":
+        """ Builds the compact version of a Grafo.
+
+        Args:
+            G (grafo.Grafo): graph to be frozen.
+        Returns:
+            GrafoCompacto: graph with the same vertices, edges, data and weights as G.
+        """
+        vertices = list(G.adyacencia.keys())
+        indice = {v: i for i, v in enumerate(vertices)}
+
+        indptr = np.zeros(len(vertices) + 1, dtype=np.int64)
+        indices = []
+        pesos = []
+        datos = []
+        for i, v in enumerate(vertices):
+            for w, (dato, peso) in G.adyacencia[v].items():
+                indices.append(indice[w])
+                pesos.append(peso)
+                datos.append(dato)
+            indptr[i + 1] = len(indices)
+
+        if all(dato is None for dato in datos):
+            datos = None
+
+        return cls(vertices, indptr, indices, pesos, datos, G.dirigido)
+
+    @classmethod
+    def desde_aristas(cls,vertices:List[object],origenes:np.ndarray,destinos:np.ndarray,pesos:np.ndarray,datos:List[object]=None,dirigido:bool=True)->"GrafoCompacto":
+        """ Builds a compact graph from the list of its edges given as arrays of vertex ids.
+        Every edge is stored as given, so an undirected graph must include both directions.
+
+        Args:
+            vertices (List[object]): vertex objects, the position of each one is its integer id.
+            origenes (np.ndarray): source vertex id of each edge.
+            destinos (np.ndarray): target vertex id of each edge.
+            pesos (np.ndarray): weight of each edge.
+            datos (List[object], optional): data of each edge.
+            dirigido (bool): Flag indicating whether the graph is directed (true) or not (false).
+        Returns:
+            GrafoCompacto: graph with the given edges grouped by source vertex.
+        """
+        origenes = np.asarray(origenes, dtype=np.int64)
+        orden = np.argsort(origenes, kind="stable")
+        indptr = np.zeros(len(vertices) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(origenes, minlength=len(vertices)), out=indptr[1:])
+        if datos is not None:
+            datos = [datos[k] for k in orden.tolist()]
+        return cls(vertices, indptr, np.asarray(destinos)[orden], np.asarray(pesos)[orden], datos, dirigido)
+
+    #### Operaciones básicas del TAD ####
+    def es_dirigido(self)->bool:
+        """ Indicates whether the graph is directed or not """
+        return self.dirigido
+
+    def numero_vertices(self)->int:
+        """ Returns the number of vertices of the graph """
+        return len(self.vertices)
+
+    def numero_aristas(self)->int:
+        """ Returns the number of stored edges (twice the number of edges if the graph is undirected) """
+        return len(self.indices)
+
+    def memoria(self)->int:
+        """ Returns the number of bytes used by the CSR arrays """
+        return self.indptr.nbytes + self.indices.nbytes + self.pesos.nbytes
+
+    def congelar(self)->"GrafoCompacto":
+        """ The graph is already frozen, returns itself """
+        return self
+
+    def convertir_a_NetworkX(self):
+        """ Builds a Networkx graph or digraph as Grafo.convertir_a_NetworkX """
+        import networkx as nx
+        G = nx.DiGraph() if self.dirigido else nx.Graph()
+        G.add_nodes_from(self.vertices)
+        G.add_weighted_edges_from(self.lista_aristas())
+        return G
+
+    def firma(self)->str:
+        """ Returns a hash of the CSR arrays. Preprocessed data (contraction hierarchies,
+        landmarks...) store it to detect that they were built from a different graph.
+        """
+        firma = hashlib.sha1()
+        for array in (self.indptr, self.indices, self.pesos):
+            firma.update(np.ascontiguousarray(array).tobytes())
+        return firma.hexdigest()
+
+    def _id(self,v:object)->int:
+        """ Integer id of the vertex v, or None if v is not a vertex of the graph """
+        es_hasheable(v)
+        return self.indice.get(v)
+
+    def invertir(self)->"GrafoCompacto":
+        """ Returns the graph with all its edges reversed (the transposed CSR arrays).
+        For an undirected graph it is the graph itself.
+        """
+        if not self.dirigido:
+            return self
+        if self._inverso is None:
+            self._inverso = GrafoCompacto.desde_aristas(self.vertices, self.indices, self.origenes(), self.pesos, self.datos, True)
+        return self._inverso
+
+    def origenes(self)->np.ndarray:
+        """ Returns the source vertex id of every edge, aligned with indices and pesos """
+        return np.repeat(np.arange(len(self.vertices), dtype=np.int32), np.diff(self.indptr))
+
+    def lista_vertices(self)->List[object]:
+        """ Returns a list with the vertices of the graph """
+        return list(self.vertices)
+
+    def lista_aristas(self)->List[Tuple[object,object,float]]:
+        """ Returns a list with all the edges of the graph and their respective weights """
+        origenes = self.origenes()
+        return [(self.vertices[s], self.vertices[t], peso) for s, t, peso in zip(origenes.tolist(), self.indices.tolist(), self.pesos.tolist())]
+
+    def lista_adyacencia(self,u:object)->List[object]:
+        """ If u is a vertex of the graph, returns the list of vertices adjacent to u.
+        If not, returns None.
+        """
+        i = self._id(u)
+        if i is not None:
+            return [self.vertices[j] for j in self.indices[self.indptr[i]:self.indptr[i + 1]].tolist()]
+
+    def _posicion(self,i:int,j:int)->int:
+        """ Position of the edge (i,j) in the CSR arrays, or None if it does not exist """
+        inicio = self.indptr[i]
+        posiciones = np.flatnonzero(self.indices[inicio:self.indptr[i + 1]] == j)
+        if len(posiciones):
+            return int(inicio + posiciones[0])
+
+    def obtener_arista(self,s:object,t:object)->Tuple[object,float]:
+        """ If there is an edge from s to t, returns its data and weight in a tuple.
+        If not, returns None.
+        """
+        i, j = self._id(s), self._id(t)
+        if i is None or j is None:
+            return None
+        k = self._posicion(i, j)
+        if k is not None:
+            dato = self.datos[k] if self.datos is not None else None
+            return dato, float(self.pesos[k])
+
+    def actualizar_pesos(self,cambios:Iterable[Tuple[object,object,float]])->List[float]:
+        """ Changes the weight of existing edges in place, as Grafo.actualizar_pesos. Each change
+        only looks at the edges of its source vertex. Read-only weights (e.g. memory-mapped from
+        the compiled bundle) are copied on the first change.
+
+        Args:
+            cambios (Iterable[Tuple[object,object,float]]): triples (s,t,w): the edge from s to t
+                gets the weight w. Edges that do not exist are ignored.
+        Returns:
+            List[float]: previous weight of the edge of each change, None if it does not exist.
+        """
+        anteriores = []
+        for s, t, peso in cambios:
+            i, j = self._id(s), self._id(t)
+            k = self._posicion(i, j) if i is not None and j is not None else None
+            if k is None:
+                anteriores.append(None)
+                continue
+            if not self.pesos.flags.writeable:
+                self.pesos = np.array(self.pesos)
+            anteriores.append(float(self.pesos[k]))
+            self.pesos[k] = peso
+            if not self.dirigido:
+                self.pesos[self._posicion(j, i)] = peso
+            elif self._inverso is not None:
+                self._inverso.pesos[self._inverso._posicion(j, i)] = peso
+        if any(anterior is not None for anterior in anteriores):
+            self.version += 1
+        return anteriores
+
+    #### Grados de vértices ####
+    def grado_saliente(self,v:object)->int:
+        """ If v is a vertex of the graph, returns its outgoing degree. If not, returns None. """
+        i = self._id(v)
+        if i is not None:
+            return int(self.indptr[i + 1] - self.indptr[i])
+
+    def grado_entrante(self,v:object)->int:
+        """ If v is a vertex of the graph, returns its incoming degree. If not, returns None. """
+        i = self._id(v)
+        if i is not None:
+            if self._grados_entrantes is None:
+                self._grados_entrantes = np.bincount(self.indices, minlength=len(self.vertices))
+            return int(self._grados_entrantes[i])
+
+    def grado(self,v:object)->int:
+        """ If v is a vertex of the graph, returns its degree (outgoing degree if the graph
+        is directed). If not, returns None.
+        """
+        return self.grado_saliente(v)
+
+    #### Algoritmos ####
+    def vecinos(self,i:int):
+        """ Iterates over the pairs (j,w) such that (i,j) is an edge with weight w. """
+        inicio, fin = self.indptr[i], self.indptr[i + 1]
+        return zip(self.indices[inicio:fin].tolist(), self.pesos[inicio:fin].tolist())
+
+    def dijkstra(self,origen:object)->Dict[object,object]:
+        """ Calculates a Minimum Path Tree starting from the vertex "origen".
+        Same result format as Grafo.dijkstra.
+        """
+        padres = {v: None for v in self.vertices}
+        i = self._id(origen)
+        if i is not None:
+            arbol, _, _ = grafo.busqueda_dijkstra(self.vecinos, i)
+            padres.update({self.vertices[v]: self.vertices[p] if p is not None else None for v, p in arbol.items()})
+        return padres
+
+    def camino_minimo(self,origen:object,destino:object)->List[object]:
+        """ Calculates the minimum path from origen to destino.
+        Same result format as Grafo.camino_minimo.
+        """
+        camino, _, _ = self.buscar_camino(origen, destino)
+        return camino
+
+    def buscar_camino_ids(self,i:int,j:int,metodo:str="dijkstra",heuristica=None)->Tuple[List[int],float,int]:
+        """ Same as buscar_camino, but with the integer ids of the vertices.
+        The heuristic, if any, also receives ids.
+        """
+        heuristica = grafo.comprobar_metodo(metodo, heuristica)
+        if metodo == "bidireccional":
+            return grafo.busqueda_bidireccional(self.vecinos, self.invertir().vecinos, i, j)
+        padres, distancias, asentados = grafo.busqueda_dijkstra(self.vecinos, i, j, heuristica)
+        if j not in padres:
+            return None, INFTY, asentados
+        return grafo.reconstruir_camino(padres, j), distancias[j], asentados
+
+    def buscar_camino(self,origen:object,destino:object,metodo:str="dijkstra",heuristica=None)->Tuple[List[object],float,int]:
+        """ Searches a minimum path from origen to destino.
+        Same arguments and result format as Grafo.buscar_camino.
+        """
+        heuristica = grafo.comprobar_metodo(metodo, heuristica)
+        i, j = self._id(origen), self._id(destino)
+        if i is None or j is None:
+            return None, INFTY, 0
+        if heuristica is not None:
+            heuristica_vertices = heuristica
+            heuristica = lambda u, v: heuristica_vertices(self.vertices[u], self.vertices[v])
+        camino, coste, asentados = self.buscar_camino_ids(i, j, metodo, heuristica)
+        if camino is not None:
+            camino = [self.vertices[k] for k in camino]
+        return camino, coste, asentados
+
+    def distancias_desde(self,i:int)->np.ndarray:
+        """ Distances from vertex id i to every vertex (np.inf if unreachable) """
+        _, distancias, _ = grafo.busqueda_dijkstra(self.vecinos, i)
+        resultado = np.full(len(self.vertices), np.inf)
+        resultado[list(distancias.keys())] = list(distancias.values())
+        return resultado
+
+    def distancias_a_destinos_ids(self,i:int,destinos:List[int])->np.ndarray:
+        """ Distances from vertex id i to the vertex ids destinos (np.inf if unreachable) """
+        distancias = np.array(grafo.distancias_a_destinos(self.vecinos, i, destinos), dtype=np.float64)
+        distancias[distancias == INFTY] = np.inf
+        return distancias
+
+    def matriz_distancias(self,origenes:List[object],destinos:List[object],procesos:int=None,pool:"PoolGrafo"=None)->np.ndarray:
+        """ Calculates the weight of the minimum paths from every origin to every destination.
+        Same arguments and result format as Grafo.matriz_distancias; the searches can also run in
+        a persistent pool of processes of this graph (see PoolGrafo).
+        """
+        ids_origenes = [self._id(v) for v in origenes]
+        ids_destinos = [self._id(v) for v in destinos]
+        columnas = [j for j, i in enumerate(ids_destinos) if i is not None]
+        validos = [ids_destinos[j] for j in columnas]
+        filas = [k for k, i in enumerate(ids_origenes) if i is not None]
+
+        matriz = np.full((len(origenes), len(destinos)), np.inf)
+        if filas and validos:
+            procesos = procesos_necesarios(len(filas), procesos)
+            resultados = ejecutar_en_paralelo(self, "distancias_a_destinos_ids", [(ids_origenes[k], validos) for k in filas], procesos, pool)
+            matriz[np.ix_(filas, columnas)] = np.array(resultados)
+        return matriz
+
+    def prim(self)->Dict[object,object]:
+        """ Calculates a Minimum Spanning Tree (a forest if the graph is not connected)
+        using Prim's algorithm with a heap.
+        Same result format as Grafo.prim.
+        """
+        n = len(self.vertices)
+        visitados = np.zeros(n, dtype=bool)
+        padres = {}
+
+        for raiz in range(n):
+            if visitados[raiz]:
+                continue
+            cola = [(0.0, raiz, -1)]
+            while cola:
+                _, u, padre = heapq.heappop(cola)
+                if visitados[u]:
+                    continue
+                visitados[u] = True
+                padres[self.vertices[u]] = self.vertices[padre] if padre >= 0 else None
+                for v, peso in self.vecinos(u):
+                    if not visitados[v]:
+                        heapq.heappush(cola, (peso, v, u))
+
+        return padres
+
+    def kruskal(self)->List[Tuple[object,object]]:
+        """ Calculates a Minimum Spanning Tree using Kruskal's algorithm.
+        Same result format as Grafo.kruskal.
+        """
+        origenes = self.origenes()
+        destinos = self.indices
+        if not self.dirigido:
+            # Every undirected edge is stored twice, only one copy is needed
+            unicas = origenes < destinos
+            origenes, destinos, pesos = origenes[unicas], destinos[unicas], self.pesos[unicas]
+        else:
+            pesos = self.pesos
+        orden = np.argsort(pesos, kind="stable")
+
+        padres = list(range(len(self.vertices)))
+
+        def buscar(v):
+            while v != padres[v]:
+                padres[v] = padres[padres[v]]
+                v = padres[v]
+            return v
+
+        arbol = []
+        for s, t in zip(origenes[orden].tolist(), destinos[orden].tolist()):
+            raiz_s, raiz_t = buscar(s), buscar(t)
+            if raiz_s != raiz_t:
+                arbol.append((self.vertices[s], self.vertices[t]))
+                padres[raiz_s] = raiz_t
+
+        return arbol
+
+
+# Graph of each worker process of ejecutar_en_paralelo, received once when the process starts
+_grafo_trabajador = None
+# Chunks of calls sent to each process of ejecutar_en_paralelo, enough to balance the load among them
+TROZOS_POR_PROCESO = 4
+# Cheap calls per core below which they run in the current process (see procesos_necesarios)
+LLAMADAS_MINIMAS_POR_PROCESO = 4
+
+def _iniciar_trabajador(indptr,indices,pesos,dirigido=True):
+    global _grafo_trabajador
+    _grafo_trabajador = GrafoCompacto(range(len(indptr) - 1), indptr, indices, pesos, dirigido=dirigido)
+
+def _ejecutar_en_trabajador(tarea):
+    metodo, argumentos, version, cambios = tarea
+    # Weights changed in the pool since this process last applied them (see PoolGrafo.actualizar_pesos)
+    if cambios and _grafo_trabajador.version != version:
+        _grafo_trabajador.actualizar_pesos([(i, j, peso) for (i, j), peso in cambios.items()])
+        _grafo_trabajador.version = version
+    return getattr(_grafo_trabajador, metodo)(*argumentos)
+
+
+def procesos_necesarios(llamadas:int,procesos:int=None)->int:
+    """ Number of processes worth using for a number of cheap calls (searches of a matrix or a batch
+    of routes): the given one, or by default one per core unless there are fewer than
+    LLAMADAS_MINIMAS_POR_PROCESO calls per core, in which case the messages to the processes cost
+    more than what they save and 1 (the current process) is returned.
+    """
+    if procesos is not None:
+        return procesos
+    nucleos = os.cpu_count() or 1
+    return nucleos if llamadas >= LLAMADAS_MINIMAS_POR_PROCESO * nucleos else 1
+
+
+class PoolGrafo():
+    """
+    Pool of worker processes that keep the CSR arrays of a graph, received once when they start,
+    reused by every call of ejecutar_en_paralelo on that graph until cerrar(). The processes are
+    started by the first call. Later changes of the weights are given to actualizar_pesos: they are
+    sent with the next calls and each process applies them once, so the processes are not restarted.
+    """
+
+    def __init__(self,C:GrafoCompacto,procesos:int=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self._iniciales = (C.indptr, C.indices, C.pesos, C.dirigido)
+        self._ejecutor = None
+        self._cerrado = False
+        self._cerrojo = threading.Lock()
+        # Last weight of every edge (i,j) changed since the pool was created, and number of changes
+        self._cambios:Dict[Tuple[int,int],float] = dict()
+        self.version = 0
+
+    def actualizar_pesos(self,cambios:Iterable[Tuple[int,int,float]]):
+        """ Changes the weight of edges in the graph of the processes, as GrafoCompacto.actualizar_pesos
+        with vertex ids. The processes apply all the changes made since they were started (or last
+        updated) before their next call, so the cost depends on the number of changed edges,
+        not on the size of the graph.
+        """
+        with self._cerrojo:
+            # A new dictionary, so that the calls being sent keep the one they took
+            self._cambios = {**self._cambios, **{(i, j): peso for i, j, peso in cambios}}
+            self.version += 1
+
+    def pendientes(self)->Tuple[int,Dict[Tuple[int,int],float]]:
+        """ Version of the weights and the changes the processes must have applied before a call """
+        with self._cerrojo:
+            return self.version, self._cambios
+
+    def ejecutor(self)->ProcessPoolExecutor:
+        """ Executor of the processes, started the first time; None once the pool is closed """
+        with self._cerrojo:
+            if self._ejecutor is None and not self._cerrado:
+                self._ejecutor = ProcessPoolExecutor(self.procesos, initializer=_iniciar_trabajador, initargs=self._iniciales)
+            return self._ejecutor
+
+    def cerrar(self):
+        """ Stops the processes once the calls already sent have finished """
+        with self._cerrojo:
+            self._cerrado = True
+            if self._ejecutor is not None:
+                self._ejecutor.shutdown(wait=False)
+                self._ejecutor = None
+
+
+def ejecutar_en_paralelo(C:GrafoCompacto,metodo:str,argumentos:List[tuple],procesos:int=None,pool:PoolGrafo=None)->list:
+    """ Calls C.metodo(*a) for every tuple a of argumentos, spreading the calls over a pool
+    of processes. Every process receives the CSR arrays once, when it starts (with the fork
+    start method they are not even copied, the pages are shared until they are written), so
+    the method must work with vertex ids (the vertex objects are not sent). The calls are
+    sent in chunks, a few per process, so that many cheap calls do not pay one message each.
+
+    Args:
+        C (GrafoCompacto): graph.
+        metodo (str): name of the method of GrafoCompacto.
+        argumentos (List[tuple]): arguments of each call.
+        procesos (int, optional): number of processes. Defaults to one per core, or to those
+            of the pool. With 1 the calls run in the current process.
+        pool (PoolGrafo, optional): persistent pool of processes of the graph C to run the calls
+            in. Without it (or if it was closed) a pool is started for these calls and stopped afterwards.
+    Returns:
+        list: results of the calls, in the same order.
+    """
+    procesos = min(procesos or (pool.procesos if pool is not None else None) or os.cpu_count() or 1, len(argumentos))
+    if procesos <= 1:
+        return [getattr(C, metodo)(*a) for a in argumentos]
+    tamano = max(1, len(argumentos) // (TROZOS_POR_PROCESO * procesos))
+    ejecutor = pool.ejecutor() if pool is not None else None
+    if ejecutor is not None:
+        version, cambios = pool.pendientes()
+        tareas = [(metodo, a, version, cambios) for a in argumentos]
+        return list(ejecutor.map(_ejecutar_en_trabajador, tareas, chunksize=tamano))
+    tareas = [(metodo, a, 0, None) for a in argumentos]
+    with ProcessPoolExecutor(procesos, initializer=_iniciar_trabajador, initargs=(C.indptr, C.indices, C.pesos, C.dirigido)) as ejecutor:
+        return list(ejecutor.map(_ejecutar_en_trabajador, tareas, chunksize=tamano))
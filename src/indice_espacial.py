@@ -0,0 +1,228 @@
+"""
+indice_espacial.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Spatial index of points of the plane (the intersections of the street map) on a
+uniform grid. The points are sorted by the key of their cell, so the points of
+any cell are a contiguous range found with a binary search.
+
+Batch queries work on whole arrays of points: the cells around each query point
+are examined in growing squares until no point outside the square can be closer
+than the ones already found. Queries of a single point follow the same idea ring
+by ring in plain Python, which avoids the overhead of NumPy on tiny arrays.
+"""
+
+from typing import Tuple,Dict,List
+import heapq
+import math
+
+import numpy as np
+
+# Average number of points per cell when the size of the cells is not given
+PUNTOS_POR_CELDA = 2
+
+
+class IndiceEspacial():
+    """
+    Uniform grid over a set of points, with nearest-k and radius queries.
+    """
+
+    def __init__(self,coordenadas:np.ndarray,tamano_celda:float=None):
+        """ Builds the index.
+
+        Args:
+            coordenadas (np.ndarray): array of shape (n,2) with the (x,y) coordinates of the points.
+                The id of each point is its position in the array.
+            tamano_celda (float, optional): side of the cells. Defaults to one that leaves
+                about PUNTOS_POR_CELDA points per cell.
+        """
+        self.coordenadas = np.asarray(coordenadas, dtype=np.float64).reshape(-1, 2)
+        n = len(self.coordenadas)
+        self.origen = self.coordenadas.min(axis=0) if n else np.zeros(2)
+        extension = self.coordenadas.max(axis=0) - self.origen if n else np.zeros(2)
+        if tamano_celda is None:
+            area = max(float(extension[0]), 1.0) * max(float(extension[1]), 1.0)
+            tamano_celda = max(np.sqrt(area * PUNTOS_POR_CELDA / max(n, 1)), 1.0)
+        self.tamano_celda = float(tamano_celda)
+        self.dimensiones = (extension // self.tamano_celda).astype(np.int64) + 1
+
+        celdas = self._celdas(self.coordenadas)
+        claves = celdas[:, 0] * self.dimensiones[1] + celdas[:, 1]
+        self.orden = np.argsort(claves, kind="stable")
+        self.claves = claves[self.orden]
+        self._por_celda:Dict[int,List[Tuple[int,float,float]]] = None
+
+    def __len__(self)->int:
+        return len(self.coordenadas)
+
+    def _celdas(self,puntos:np.ndarray)->np.ndarray:
+        """ Cell of each point, clipped to the grid """
+        celdas = np.floor((puntos - self.origen) / self.tamano_celda).astype(np.int64)
+        return np.clip(celdas, 0, self.dimensiones - 1)
+
+    def _candidatos(self,celdas:np.ndarray,radio:int)->Tuple[np.ndarray,np.ndarray]:
+        """ Points in the cells at most radio cells away (on each axis) from each cell.
+        Returns the query row and the id of each candidate.
+        """
+        # Offsets larger than the grid never reach a cell
+        radio_x, radio_y = min(radio, int(self.dimensiones[0]) - 1), min(radio, int(self.dimensiones[1]) - 1)
+        dx, dy = np.meshgrid(np.arange(-radio_x, radio_x + 1), np.arange(-radio_y, radio_y + 1), indexing="ij")
+        # One row per (query, cell) pair, all the cells looked up with a single binary search
+        cx = (celdas[:, 0, None] + dx.ravel()).ravel()
+        cy = (celdas[:, 1, None] + dy.ravel()).ravel()
+        validas = (cx >= 0) & (cx < self.dimensiones[0]) & (cy >= 0) & (cy < self.dimensiones[1])
+        claves = cx * self.dimensiones[1] + cy
+        inicio = np.searchsorted(self.claves, claves, side="left")
+        cuenta = np.where(validas, np.searchsorted(self.claves, claves, side="right") - inicio, 0)
+        desplazamiento = np.arange(int(cuenta.sum())) - np.repeat(np.cumsum(cuenta) - cuenta, cuenta)
+        filas = np.repeat(np.repeat(np.arange(len(celdas)), dx.size), cuenta)
+        return filas, self.orden[np.repeat(inicio, cuenta) + desplazamiento]
+
+    def _cota(self,puntos:np.ndarray,celdas:np.ndarray,radio:int)->np.ndarray:
+        """ Lower bound of the distance from each point to any point outside the square of
+        cells examined by _candidatos (np.inf if the square covers the whole grid) """
+        # Distance on each axis from the point to the band covered by the grid
+        limite = self.origen + self.dimensiones * self.tamano_celda
+        fuera = np.maximum(np.maximum(self.origen - puntos, puntos - limite), 0)
+        cota = np.full(len(puntos), np.inf)
+        for eje in (0, 1):
+            otro = fuera[:, 1 - eje]
+            borde_inferior = self.origen[eje] + (celdas[:, eje] - radio) * self.tamano_celda
+            borde_superior = self.origen[eje] + (celdas[:, eje] + radio + 1) * self.tamano_celda
+            inferior = np.where(celdas[:, eje] - radio > 0, np.hypot(puntos[:, eje] - borde_inferior, otro), np.inf)
+            superior = np.where(celdas[:, eje] + radio + 1 < self.dimensiones[eje], np.hypot(borde_superior - puntos[:, eje], otro), np.inf)
+            cota = np.minimum(cota, np.minimum(inferior, superior))
+        return cota
+
+    #### Consultas ####
+    def mas_cercanos_lote(self,puntos:np.ndarray,k:int=1)->Tuple[np.ndarray,np.ndarray]:
+        """ The k nearest points to each query point.
+
+        Args:
+            puntos (np.ndarray): array of shape (m,2) with the query points.
+            k (int, optional): number of neighbours.
+        Returns:
+            Tuple[np.ndarray,np.ndarray]: arrays of shape (m,k) with the ids of the neighbours
+                and their distances, from nearest to farthest. If there are fewer than k points
+                the missing ones have id -1 and distance np.inf.
+        """
+        puntos = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+        ids = np.full((len(puntos), k), -1, dtype=np.int64)
+        distancias = np.full((len(puntos), k), np.inf)
+        if len(self) == 0 or k == 0:
+            return ids, distancias
+
+        celdas = self._celdas(puntos)
+        pendientes = np.arange(len(puntos))
+        radio = 1
+        while len(pendientes):
+            filas, candidatos = self._candidatos(celdas[pendientes], radio)
+            distancia = np.hypot(*(self.coordenadas[candidatos] - puntos[pendientes[filas]]).T)
+            orden = np.lexsort((candidatos, distancia, filas))
+            filas, candidatos, distancia = filas[orden], candidatos[orden], distancia[orden]
+            # Position of each candidate among those of its row, only the first k are kept
+            inicio_fila = np.searchsorted(filas, np.arange(len(pendientes)))
+            posicion = np.arange(len(filas)) - inicio_fila[filas]
+            primeros = posicion < k
+            ids[pendientes[filas[primeros]], posicion[primeros]] = candidatos[primeros]
+            distancias[pendientes[filas[primeros]], posicion[primeros]] = distancia[primeros]
+
+            # A row is finished when nothing outside the square can beat its k-th neighbour
+            cota = self._cota(puntos[pendientes], celdas[pendientes], radio)
+            terminadas = (distancias[pendientes, k - 1] <= cota) | np.isinf(cota)
+            pendientes = pendientes[~terminadas]
+            radio *= 2
+        return ids, distancias
+
+    def _puntos_por_celda(self)->Dict[int,List[Tuple[int,float,float]]]:
+        """ Dictionary cell key -> [(id, x, y)] of the points of the cell, built on the first single query """
+        if self._por_celda is None:
+            coordenadas = self.coordenadas.tolist()
+            self._por_celda = dict()
+            for clave, i in zip(self.claves.tolist(), self.orden.tolist()):
+                self._por_celda.setdefault(clave, []).append((i, *coordenadas[i]))
+        return self._por_celda
+
+    def _mas_cercanos_punto(self,x:float,y:float,k:int)->List[Tuple[float,int]]:
+        """ The k nearest points to (x,y) as (distance, id), searching the cells ring by ring """
+        por_celda = self._puntos_por_celda()
+        ancho, alto = int(self.dimensiones[0]), int(self.dimensiones[1])
+        tamano, (x0, y0) = self.tamano_celda, self.origen.tolist()
+        cx = min(max(math.floor((x - x0) / tamano), 0), ancho - 1)
+        cy = min(max(math.floor((y - y0) / tamano), 0), alto - 1)
+        fuera_x = max(x0 - x, x - (x0 + ancho*tamano), 0)
+        fuera_y = max(y0 - y, y - (y0 + alto*tamano), 0)
+
+        mejores = []  # heap of (-distance, -id) with the k best points found
+        radio = 0
+        while True:
+            for i in range(max(cx - radio, 0), min(cx + radio, ancho - 1) + 1):
+                # On the inner columns of the ring only its top and bottom cells are new
+                paso = 1 if abs(i - cx) == radio else 2*radio
+                for j in range(cy - radio, cy + radio + 1, max(paso, 1)):
+                    if 0 <= j < alto:
+                        for id_punto, px, py in por_celda.get(i*alto + j, ()):
+                            candidato = (-math.hypot(px - x, py - y), -id_punto)
+                            if len(mejores) < k:
+                                heapq.heappush(mejores, candidato)
+                            elif candidato > mejores[0]:
+                                heapq.heapreplace(mejores, candidato)
+
+            cota = math.inf
+            if cx - radio > 0:
+                cota = min(cota, math.hypot(x - (x0 + (cx - radio)*tamano), fuera_y))
+            if cx + radio + 1 < ancho:
+                cota = min(cota, math.hypot(x0 + (cx + radio + 1)*tamano - x, fuera_y))
+            if cy - radio > 0:
+                cota = min(cota, math.hypot(y - (y0 + (cy - radio)*tamano), fuera_x))
+            if cy + radio + 1 < alto:
+                cota = min(cota, math.hypot(y0 + (cy + radio + 1)*tamano - y, fuera_x))
+            if cota == math.inf or (len(mejores) == k and -mejores[0][0] <= cota):
+                return sorted((-distancia, -id_punto) for distancia, id_punto in mejores)
+            radio += 1
+
+    def mas_cercanos(self,x:float,y:float,k:int=1)->Tuple[np.ndarray,np.ndarray]:
+        """ The k nearest points to (x,y): arrays with their ids and distances, nearest first """
+        mejores = self._mas_cercanos_punto(x, y, k) if len(self) and k else []
+        return np.array([i for _, i in mejores], dtype=np.int64), np.array([d for d, _ in mejores], dtype=np.float64)
+
+    def mas_cercano(self,x:float,y:float)->Tuple[int,float]:
+        """ Id of the nearest point to (x,y) and its distance (-1 and np.inf if the index is empty) """
+        if len(self) == 0:
+            return -1, np.inf
+        distancia, i = self._mas_cercanos_punto(x, y, 1)[0]
+        return i, distancia
+
+    def en_radio_lote(self,puntos:np.ndarray,radio:float)->Tuple[np.ndarray,np.ndarray,np.ndarray]:
+        """ Points at a distance of at most radio from each query point.
+
+        Args:
+            puntos (np.ndarray): array of shape (m,2) with the query points.
+            radio (float): maximum distance.
+        Returns:
+            Tuple[np.ndarray,np.ndarray,np.ndarray]: query row, id and distance of every
+                point found, sorted by row and distance.
+        """
+        puntos = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+        if len(self) == 0 or len(puntos) == 0:
+            vacio = np.zeros(0, dtype=np.int64)
+            return vacio, vacio, np.zeros(0)
+        filas, candidatos = self._candidatos(self._celdas(puntos), int(np.ceil(radio / self.tamano_celda)))
+        distancia = np.hypot(*(self.coordenadas[candidatos] - puntos[filas]).T)
+        cerca = distancia <= radio
+        filas, candidatos, distancia = filas[cerca], candidatos[cerca], distancia[cerca]
+        orden = np.lexsort((candidatos, distancia, filas))
+        return filas[orden], candidatos[orden], distancia[orden]
+
+    def en_radio(self,x:float,y:float,radio:float)->Tuple[np.ndarray,np.ndarray]:
+        """ Ids and distances of the points at most radio away from (x,y), nearest first """
+        _, ids, distancias = self.en_radio_lote([(x, y)], radio)
+        return ids, distancias
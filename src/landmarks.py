@@ -0,0 +1,165 @@
+"""
+landmarks.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+ALT (A*, Landmarks and Triangle inequality) heuristic.
+
+A few vertices of the graph are chosen as landmarks and the distances from
+each landmark L to every vertex (and from every vertex to L, if the graph is
+directed) are precomputed. By the triangle inequality, for any vertices v, t:
+    d(v,t) >= d(L,t) - d(L,v)
+    d(v,t) >= d(v,L) - d(t,L)
+so the maximum of these bounds over all the landmarks is a consistent
+heuristic for A*, valid for any weights (not only geometric ones).
+"""
+
+from typing import List,Dict
+
+import numpy as np
+
+from src.grafo_compacto import GrafoCompacto, ejecutar_en_paralelo
+
+# Number of landmarks chosen by default
+NUM_LANDMARKS = 8
+
+
+def coordenadas_cruce(v:object):
+    """ Default coordinates of a vertex: those of a Cruce """
+    return v.coord_x, v.coord_y
+
+
+def seleccionar_landmarks(coordenadas:np.ndarray,k:int)->np.ndarray:
+    """ Farthest-point selection: the first landmark is the point farthest from the
+    centroid and each next one is the point farthest from the landmarks already chosen.
+
+    Args:
+        coordenadas (np.ndarray): array of shape (n,2) with the coordinates of the vertices.
+        k (int): number of landmarks.
+    Returns:
+        np.ndarray: ids of the chosen vertices.
+    """
+    k = min(k, len(coordenadas))
+    if k == 0:
+        return np.zeros(0, dtype=np.int64)
+    distancia_minima = np.linalg.norm(coordenadas - coordenadas.mean(axis=0), axis=1)
+    landmarks = []
+    for _ in range(k):
+        landmark = int(np.argmax(distancia_minima))
+        landmarks.append(landmark)
+        distancia_minima = np.minimum(distancia_minima, np.linalg.norm(coordenadas - coordenadas[landmark], axis=1))
+    return np.array(landmarks, dtype=np.int64)
+
+
+def distancias_en_paralelo(C:GrafoCompacto,origenes:List[int],procesos:int=None)->np.ndarray:
+    """ One-to-all distances from several vertices, one search per process.
+
+    Args:
+        C (GrafoCompacto): graph.
+        origenes (List[int]): ids of the vertices of origin.
+        procesos (int, optional): number of processes. Defaults to one per core.
+            With 1 the searches run in the current process.
+    Returns:
+        np.ndarray: array of shape (len(origenes),n) with the distances (np.inf if unreachable).
+    """
+    distancias = ejecutar_en_paralelo(C, "distancias_desde", [(i,) for i in origenes], procesos)
+    return np.array(distancias).reshape(len(origenes), C.numero_vertices())
+
+
+class Landmarks():
+    """
+    Landmark distance tables of a graph and the ALT heuristic built on them.
+    """
+
+    def __init__(self,vertices:List[object],landmarks:np.ndarray,desde:np.ndarray,hacia:np.ndarray=None,firma:str=None):
+        """ Creates the heuristic from already computed tables.
+
+        Args:
+            vertices (List[object]): vertex objects, the position of each one is its integer id.
+            landmarks (np.ndarray): ids of the landmarks.
+            desde (np.ndarray): array of shape (n,k), desde[v][l] = distance from landmark l to v.
+            hacia (np.ndarray, optional): array of shape (n,k), hacia[v][l] = distance from v to
+                landmark l. None if the graph is undirected (it would be equal to desde).
+            firma (str, optional): GrafoCompacto.firma of the graph the tables were built from.
+        """
+        self.vertices = list(vertices)
+        self.indice:Dict[object,int] = {v: i for i, v in enumerate(self.vertices)}
+        self.landmarks = np.asarray(landmarks, dtype=np.int64)
+        self.desde = np.asarray(desde, dtype=np.float64)
+        self.hacia = np.asarray(hacia, dtype=np.float64) if hacia is not None else None
+        self.firma = firma
+
+    @classmethod
+    def construir(cls,G,k:int=NUM_LANDMARKS,coordenadas=coordenadas_cruce,procesos:int=None)->"Landmarks":
+        """ Chooses k landmarks and computes their distance tables.
+
+        Args:
+            G (grafo.Grafo or GrafoCompacto): graph with non-negative weights.
+            k (int, optional): number of landmarks.
+            coordenadas (callable, optional): function that returns the (x,y) coordinates
+                of a vertex, used to spread the landmarks. Defaults to those of a Cruce.
+            procesos (int, optional): number of processes computing tables in parallel.
+        Returns:
+            Landmarks: heuristic of the graph.
+        """
+        C = G if isinstance(G, GrafoCompacto) else G.congelar()
+        puntos = np.array([coordenadas(v) for v in C.vertices], dtype=np.float64).reshape(-1, 2)
+        landmarks = seleccionar_landmarks(puntos, k)
+
+        desde = distancias_en_paralelo(C, landmarks.tolist(), procesos).T
+        hacia = distancias_en_paralelo(C.invertir(), landmarks.tolist(), procesos).T if C.dirigido else None
+
+        return cls(C.vertices, landmarks, desde, hacia, C.firma())
+
+    #### Heurística ####
+    def heuristica_ids(self,i:int,j:int)->float:
+        """ Lower bound of the distance from vertex id i to vertex id j """
+        desde_i, desde_j = self.desde[i], self.desde[j]
+        hacia_i, hacia_j = (self.hacia[i], self.hacia[j]) if self.hacia is not None else (desde_i, desde_j)
+        # Landmarks that cannot reach (or be reached from) i or j give no bound
+        with np.errstate(invalid="ignore"):
+            cotas = np.concatenate((desde_j - desde_i, hacia_i - hacia_j))
+        cotas = cotas[np.isfinite(cotas)]
+        return max(float(cotas.max()), 0.0) if len(cotas) else 0.0
+
+    def heuristica(self,v:object,destino:object)->float:
+        """ Lower bound of the distance from v to destino, to be used as heuristic of
+        Grafo.buscar_camino(..., metodo="astar", heuristica=landmarks.heuristica).
+        """
+        return self.heuristica_ids(self.indice[v], self.indice[destino])
+
+    def memoria(self)->int:
+        """ Returns the number of bytes used by the distance tables """
+        return self.desde.nbytes + (self.hacia.nbytes if self.hacia is not None else 0)
+
+    #### Persistencia ####
+    def guardar(self,ruta:str)->None:
+        """ Saves the landmarks in a NumPy .npz file. Only the arrays are saved, with vertex ids:
+        the vertices are those of the graph they are loaded for (see cargar). """
+        tablas = {"hacia": self.hacia} if self.hacia is not None else {}
+        np.savez(ruta, landmarks=self.landmarks, desde=self.desde, firma=np.array(self.firma or ""), **tablas)
+
+    @classmethod
+    def cargar(cls,ruta:str,G)->"Landmarks":
+        """ Loads landmarks saved with guardar for the graph G, whose vertex objects they use.
+
+        Args:
+            ruta (str): path of the .npz file.
+            G (grafo.Grafo or GrafoCompacto): graph the tables must have been built from.
+        Returns:
+            Landmarks: the landmarks, or None if the file was built from another graph.
+        """
+        C = G if isinstance(G, GrafoCompacto) else G.congelar()
+        with np.load(ruta, allow_pickle=False) as datos:
+            firma = str(datos["firma"])
+            if firma != C.firma():
+                return None
+            hacia = datos["hacia"] if "hacia" in datos.files else None
+            return cls(C.vertices, datos["landmarks"], datos["desde"], hacia, firma)
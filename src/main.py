@@ -1,8 +1,8 @@
 import inquirer
-from difflib import SequenceMatcher, get_close_matches
 import src.gps as gps
-from src.callejero import direcciones
-nombre_direcciones = gps.cargar_direcciones(direcciones).keys()
+
+# Seconds between two directions in the console, so that they can be followed while they are printed
+PAUSA_INSTRUCCIONES = 0.3
 
 def seleccionar_calle(message):
     """
@@ -13,10 +13,11 @@ def seleccionar_calle(message):
         str: The street selected by the user.
     """
     direccion = input(message)
-    coincidencias = get_close_matches(direccion.upper(), nombre_direcciones)
-
-    nombre_direcciones_ordenadas = sorted(nombre_direcciones, key=lambda x: coincidencias.index(x) if x in coincidencias else float('inf'))
-    preguntas = [inquirer.List('calle', message, choices = list(nombre_direcciones_ordenadas)[:3])]
+    coincidencias = gps.buscar_direcciones(direccion, n=3)
+    while not coincidencias:
+        direccion = input("No se ha encontrado ninguna dirección parecida. " + message)
+        coincidencias = gps.buscar_direcciones(direccion, n=3)
+    preguntas = [inquirer.List('calle', message, choices = coincidencias)]
 
     respuestas = inquirer.prompt(preguntas)
     calle_seleccionada = respuestas['calle']
@@ -43,5 +44,5 @@ if __name__ == "__main__":
     origen = seleccionar_calle(message = "Seleccione la dirección del origen: ")
     destino = seleccionar_calle(message= "Seleccione la dirección del destino: ")
     modo = elegir_modo()
-    camino, G = gps.dirigir_ruta(origen, destino, modo)
+    camino, G = gps.dirigir_ruta(origen, destino, modo, pausa = PAUSA_INSTRUCCIONES)
     gps.dibujar_ruta(camino, G)
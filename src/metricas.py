@@ -0,0 +1,186 @@
+"""
+metricas.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Counters, histograms and timing spans of the route service, exposed in the
+Prometheus text format (GET /metrics of the API). A span (tramo) measures one
+stage of a request (address selection, snapping, graph, search, directions):
+its duration goes to the histogram of the stage and, if the request collects
+them (desglose), to its per-request breakdown, sent in the X-Route-Timing
+header. The breakdown lives in a context variable, so concurrent requests in
+different threads do not mix their spans.
+Each process keeps its own metrics: with several workers every one exposes its
+own, as with any Prometheus client without a shared store.
+"""
+
+from typing import Dict,Iterator,List,Tuple
+from contextlib import contextmanager
+import contextvars
+import math
+import threading
+import time
+
+# Upper bounds of the buckets of the histograms of durations, in seconds
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _etiquetas(nombres:Tuple[str],valores:Tuple[str],extra:str="")->str:
+    """ Labels of a sample in the text format: {a="x",b="y"} """
+    pares = [nombre + '="' + str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+             for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+def _numero(valor:float)->str:
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class Contador():
+    """
+    Counter that only increases, with a value per combination of labels.
+    """
+
+    def __init__(self,nombre:str,ayuda:str,etiquetas:Tuple[str]=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores:Dict[tuple,float] = dict()
+        self._cerrojo = threading.Lock()
+
+    def incrementar(self,cantidad:float=1,**etiquetas):
+        clave = tuple(etiquetas[nombre] for nombre in self.etiquetas)
+        with self._cerrojo:
+            self._valores[clave] = self._valores.get(clave, 0) + cantidad
+
+    def valor(self,**etiquetas)->float:
+        return self._valores.get(tuple(etiquetas[nombre] for nombre in self.etiquetas), 0)
+
+    def exponer(self)->List[str]:
+        with self._cerrojo:
+            valores = sorted(self._valores.items())
+        if not valores and not self.etiquetas:
+            valores = [((), 0)]
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        return lineas + [f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}" for clave, valor in valores]
+
+
+class Histograma():
+    """
+    Histogram with cumulative buckets, a sum and a count per combination of labels.
+    """
+
+    def __init__(self,nombre:str,ayuda:str,limites:Tuple[float]=LIMITES_SEGUNDOS,etiquetas:Tuple[str]=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = tuple(sorted(limites)) + (math.inf,)
+        self.etiquetas = tuple(etiquetas)
+        self._series:Dict[tuple,list] = dict()  # clave -> [cuenta por cubo..., suma, cuenta]
+        self._cerrojo = threading.Lock()
+
+    def observar(self,valor:float,**etiquetas):
+        clave = tuple(etiquetas[nombre] for nombre in self.etiquetas)
+        # First bucket whose upper bound is >= valor, by linear search over a few bounds
+        cubo = next(i for i, limite in enumerate(self.limites) if valor <= limite)
+        with self._cerrojo:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [0] * len(self.limites) + [0.0, 0]
+            serie[cubo] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def cuenta(self,**etiquetas)->int:
+        serie = self._series.get(tuple(etiquetas[nombre] for nombre in self.etiquetas))
+        return serie[-1] if serie else 0
+
+    def exponer(self)->List[str]:
+        with self._cerrojo:
+            series = sorted((clave, list(serie)) for clave, serie in self._series.items())
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for clave, serie in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.limites, serie):
+                acumulado += cuenta
+                cubo = 'le="' + _numero(limite) + '"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, cubo)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(serie[-2])}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {serie[-1]}")
+        return lineas
+
+
+class RegistroMetricas():
+    """
+    Metrics of the process, in the order they were registered.
+    """
+
+    def __init__(self):
+        self.metricas:Dict[str,object] = dict()
+
+    def contador(self,nombre:str,ayuda:str,etiquetas:Tuple[str]=())->Contador:
+        return self.metricas.setdefault(nombre, Contador(nombre, ayuda, etiquetas))
+
+    def histograma(self,nombre:str,ayuda:str,limites:Tuple[float]=LIMITES_SEGUNDOS,etiquetas:Tuple[str]=())->Histograma:
+        return self.metricas.setdefault(nombre, Histograma(nombre, ayuda, limites, etiquetas))
+
+    def exponer(self)->str:
+        """ Every metric in the Prometheus text format """
+        return "\n".join(linea for metrica in self.metricas.values() for linea in metrica.exponer()) + "\n"
+
+
+def exponer_valores(nombre:str,ayuda:str,tipo:str,valores:Dict[str,float],etiqueta:str)->List[str]:
+    """ A metric computed elsewhere (e.g. the counters of the route cache) in the text format,
+    one sample per entry of valores with the key as the value of the label """
+    lineas = [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+    return lineas + [f"{nombre}{_etiquetas((etiqueta,), (clave,))} {_numero(valor)}" for clave, valor in valores.items()]
+
+
+# Registry shared by gps.py and api.py
+registro = RegistroMetricas()
+DURACION_ETAPAS = registro.histograma("gps_etapa_segundos", "Duration of each stage of a route request", etiquetas=("etapa",))
+
+_desglose:contextvars.ContextVar = contextvars.ContextVar("desglose", default=None)
+
+
+@contextmanager
+def tramo(etapa:str)->Iterator[None]:
+    """ Measures the block as a stage: its duration goes to the histogram of the stage and to the
+    breakdown of the current request, if it collects one """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        DURACION_ETAPAS.observar(segundos, etapa=etapa)
+        desglose = _desglose.get()
+        if desglose is not None:
+            desglose[etapa] = desglose.get(etapa, 0.0) + segundos
+
+@contextmanager
+def desglose()->Iterator[Dict[str,float]]:
+    """ Collects the seconds spent in each stage (tramo) inside the block, also those of the
+    functions it calls in the same context. Yields the dictionary stage -> seconds. """
+    tiempos:Dict[str,float] = dict()
+    token = _desglose.set(tiempos)
+    try:
+        yield tiempos
+    finally:
+        _desglose.reset(token)
+
+def cabecera_tiempos(tiempos:Dict[str,float],total:float=None)->str:
+    """ Breakdown of a request in the syntax of the Server-Timing header, in milliseconds:
+    "seleccion;dur=0.41, busqueda;dur=12.30, total;dur=13.02" """
+    partes = [f"{etapa};dur={segundos * 1000:.2f}" for etapa, segundos in tiempos.items()]
+    if total is not None:
+        partes.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(partes)
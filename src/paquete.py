@@ -0,0 +1,266 @@
+"""
+paquete.py
+
+Discrete Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP02B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Compiled city bundle. Reading and cleaning the CSV files and building the
+graphs takes a long time, so this module stores the result in a directory of
+NumPy .npy files that are loaded memory-mapped in milliseconds:
+    cruces_x, cruces_y, cruces_lon, cruces_lat     coordinates of each intersection
+    calles_indptr, calles_indices, nombres_calles  streets of each intersection (CSR)
+    codigos_via, nombres_via, clases_via           code, name and class of road of each street
+    cruces_indptr, cruces_indices                  intersections of each street (CSR)
+    direcciones_nombres, direcciones_x, direcciones_y   addresses and their coordinates
+    direcciones_cruces, _distancias, _aisladas     nearest intersection of each address, its
+                                                   distance and whether it is outside the main component
+    grafo_<modo>_indptr, _indices, _pesos          weighted graph of each mode (CSR)
+The manifest (manifiesto.json) stores the version of the format and a hash of
+the CSV files, so that a bundle built from other data is not used, and a memory
+report of the street map (see informe_memoria) to follow its footprint.
+
+Build it with:
+    python -m src.paquete
+"""
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+from src.grafo_compacto import GrafoCompacto
+
+VERSION_PAQUETE = 4
+RUTA_PAQUETE = "data/paquete"
+RUTAS_CSV = ("data/cruces.csv", "data/direcciones.csv")
+MODOS = ("shortest", "fastest")
+
+
+def huella_fichero(ruta):
+    """
+    SHA-256 of the contents of a file.
+    """
+    huella = hashlib.sha256()
+    with open(ruta, "rb") as fichero:
+        for bloque in iter(lambda: fichero.read(1 << 20), b""):
+            huella.update(bloque)
+    return huella.hexdigest()
+
+def describir_csv(rutas=RUTAS_CSV):
+    """
+    Size, modification time and hash of each CSV file, as stored in the manifest.
+    """
+    descripcion = dict()
+    for ruta in rutas:
+        estado = os.stat(ruta)
+        descripcion[ruta] = {"tamano": estado.st_size, "mtime_ns": estado.st_mtime_ns, "sha256": huella_fichero(ruta)}
+    return descripcion
+
+def csv_sin_cambios(descripcion):
+    """
+    Checks that the CSV files are the ones the bundle was built from. The hash is only
+    computed when the size or the modification time differ. Missing CSV files are not
+    a reason to discard the bundle: it may be all the data that was deployed.
+    """
+    for ruta, guardado in descripcion.items():
+        if not os.path.exists(ruta):
+            continue
+        estado = os.stat(ruta)
+        if estado.st_size != guardado["tamano"]:
+            return False
+        if estado.st_mtime_ns != guardado["mtime_ns"] and huella_fichero(ruta) != guardado["sha256"]:
+            return False
+    return True
+
+
+class PaqueteCiudad:
+    """
+    Compiled bundle loaded from disk. The arrays are memory-mapped and the
+    Cruce objects, graphs and address dictionary are only built when requested.
+    """
+    def __init__(self, directorio, manifiesto):
+        self.directorio = directorio
+        self.manifiesto = manifiesto
+        self._arrays = dict()
+        self._tablas = None
+        self._grafos = dict()
+        self._direcciones = None
+
+    def array(self, nombre):
+        """
+        Memory-mapped array of the bundle.
+        """
+        if nombre not in self._arrays:
+            self._arrays[nombre] = np.load(os.path.join(self.directorio, nombre + ".npy"), mmap_mode="r")
+        return self._arrays[nombre]
+
+    def tablas(self):
+        """
+        Intersection and street tables (callejero.TablasCallejero) over the arrays of the bundle.
+        """
+        if self._tablas is None:
+            from src.callejero import TablasCallejero
+            self._tablas = TablasCallejero(**{nombre: self.array(nombre) for nombre in TablasCallejero.ARRAYS})
+        return self._tablas
+
+    def cruces(self):
+        """
+        List of the intersections of the bundle, in the order of their ids in the graphs.
+        """
+        return self.tablas().cruces()
+
+    def grafo(self, modo):
+        """
+        Graph of the given mode ("shortest" or "fastest") as a GrafoCompacto.
+        """
+        if modo not in self._grafos:
+            prefijo = f"grafo_{modo}_"
+            self._grafos[modo] = GrafoCompacto(self.cruces(), self.array(prefijo + "indptr"),
+                                               self.array(prefijo + "indices"), self.array(prefijo + "pesos"))
+        return self._grafos[modo]
+
+    def tabla_direcciones(self):
+        """
+        Addresses snapped to their nearest intersection (callejero.TablaDirecciones).
+        """
+        if self._direcciones is None:
+            from src.callejero import TablaDirecciones
+            self._direcciones = TablaDirecciones(**{nombre: self.array("direcciones_" + nombre)
+                                                    for nombre in TablaDirecciones.ARRAYS})
+        return self._direcciones
+
+    def diccionario_direcciones(self):
+        """
+        Dictionary address -> (coord_x, coord_y), as gps.cargar_direcciones.
+        """
+        return self.tabla_direcciones().diccionario()
+
+    def cruce_mas_cercano(self, coord_x, coord_y):
+        """
+        Nearest intersection to a point and its distance.
+        """
+        distancias = np.hypot(self.array("cruces_x") - coord_x, self.array("cruces_y") - coord_y)
+        i = int(np.argmin(distancias))
+        return self.cruces()[i], float(distancias[i])
+
+
+def bytes_objeto(objeto):
+    """
+    Bytes of a Python object with __slots__ and of the values of its slots that belong only
+    to it (numbers, tuples and sets); the tables and strings it shares are not counted.
+    """
+    total = sys.getsizeof(objeto)
+    for campo in type(objeto).__slots__:
+        valor = getattr(objeto, campo, None)
+        if isinstance(valor, (int, float, tuple, set)) and not isinstance(valor, bool):
+            total += sys.getsizeof(valor)
+    return total
+
+def informe_memoria(tablas, grafos):
+    """
+    Memory footprint of the street map once every intersection and street view exists:
+    number of objects, bytes of the views, of the arrays of the tables and of each graph
+    (dictionary mode -> GrafoCompacto), and bytes per intersection and per edge.
+    """
+    cruces, calles = tablas.cruces(), list(tablas.calles().values())
+    bytes_cruces = sum(map(bytes_objeto, cruces))
+    bytes_calles = sum(map(bytes_objeto, calles))
+    bytes_tablas = sum(np.asarray(array).nbytes for array in tablas.arrays().values())
+    return {
+        "cruces": len(cruces),
+        "calles": len(calles),
+        "objetos": len(cruces) + len(calles),
+        "bytes_objetos": bytes_cruces + bytes_calles,
+        "bytes_tablas": int(bytes_tablas),
+        "bytes_por_cruce": round((bytes_cruces + bytes_tablas) / max(len(cruces), 1), 1),
+        "aristas": {modo: C.numero_aristas() for modo, C in grafos.items()},
+        "bytes_grafos": {modo: int(C.memoria()) for modo, C in grafos.items()},
+        "bytes_por_arista": {modo: round(C.memoria() / max(C.numero_aristas(), 1), 1) for modo, C in grafos.items()},
+    }
+
+def imprimir_informe_memoria(informe):
+    """
+    Prints a memory report of informe_memoria.
+    """
+    print(f"{informe['cruces']} intersections, {informe['calles']} streets: {informe['objetos']} objects, "
+          f"{informe['bytes_objetos'] / 2**20:.1f} MiB of objects, {informe['bytes_tablas'] / 2**20:.1f} MiB of tables, "
+          f"{informe['bytes_por_cruce']} bytes per intersection")
+    for modo, aristas in informe["aristas"].items():
+        print(f"graph {modo}: {aristas} edges, {informe['bytes_grafos'][modo] / 2**20:.1f} MiB, "
+              f"{informe['bytes_por_arista'][modo]} bytes per edge")
+
+
+def cargar_paquete(directorio=RUTA_PAQUETE):
+    """
+    Loads the compiled bundle. Returns None if it does not exist, if it was written by
+    another version of this module or if the CSV files changed since it was built.
+    """
+    ruta_manifiesto = os.path.join(directorio, "manifiesto.json")
+    if not os.path.exists(ruta_manifiesto):
+        return None
+    with open(ruta_manifiesto, encoding="utf-8") as fichero:
+        manifiesto = json.load(fichero)
+    if manifiesto.get("version") != VERSION_PAQUETE or not csv_sin_cambios(manifiesto["csv"]):
+        return None
+    return PaqueteCiudad(directorio, manifiesto)
+
+
+def construir_paquete(directorio=RUTA_PAQUETE):
+    """
+    Runs the CSV pipeline (cleaning, unification of intersections and construction of both
+    graphs) and writes the result as a compiled bundle.
+    """
+    import src.callejero as callejero
+    import src.gps as gps
+
+    os.makedirs(directorio, exist_ok=True)
+    ruta_manifiesto = os.path.join(directorio, "manifiesto.json")
+    if os.path.exists(ruta_manifiesto):
+        os.remove(ruta_manifiesto)
+    # Without a manifest the registry forgets any previous bundle and builds everything from the CSV files
+    callejero.datos.reiniciar()
+    gps.registro.reiniciar()
+    arrays = dict()
+
+    tablas = gps.registro.tablas()
+    cruces = tablas.cruces()
+    indice = {cruce: i for i, cruce in enumerate(cruces)}
+    arrays.update(tablas.arrays())
+    arrays["clases_via"] = gps.registro.clases_calles()
+
+    arrays.update(gps.registro.tabla_direcciones().arrays())
+
+    grafos = dict()
+    for modo in MODOS:
+        # The graphs are renumbered so that the ids of both are the positions in cruces
+        C = gps.crear_grafo_csv(modo).congelar()
+        ids = np.array([indice[cruce] for cruce in C.vertices], dtype=np.int64)
+        C = grafos[modo] = GrafoCompacto.desde_aristas(cruces, ids[C.origenes()], ids[C.indices], C.pesos, dirigido=False)
+        arrays[f"grafo_{modo}_indptr"] = C.indptr
+        arrays[f"grafo_{modo}_indices"] = C.indices
+        arrays[f"grafo_{modo}_pesos"] = C.pesos
+
+    for nombre, array in arrays.items():
+        np.save(os.path.join(directorio, nombre + ".npy"), array)
+
+    # The manifest is written last: a bundle interrupted while being written has none
+    manifiesto = {"version": VERSION_PAQUETE, "csv": describir_csv(), "memoria": informe_memoria(tablas, grafos)}
+    with open(ruta_manifiesto, "w", encoding="utf-8") as fichero:
+        json.dump(manifiesto, fichero, indent=2)
+    callejero.datos.reiniciar()
+    gps.registro.reiniciar()
+    return PaqueteCiudad(directorio, manifiesto)
+
+
+if __name__ == "__main__":
+    paquete = construir_paquete()
+    print(f"Bundle written to {paquete.directorio}: {len(paquete.array('cruces_x'))} intersections, "
+          f"{len(paquete.array('direcciones_nombres'))} addresses")
+    imprimir_informe_memoria(paquete.manifiesto["memoria"])
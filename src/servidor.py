@@ -0,0 +1,123 @@
+"""
+servidor.py
+
+Matemática Discreta - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Group: GP2B
+Members:
+    - Jorge Ibinarriaga
+    - Miguel Angel Huamani
+
+Description:
+Pre-fork server for the API with several worker processes. `uvicorn --workers N`
+starts every worker as a new interpreter that imports the modules and loads the
+street map on its own, so memory and startup time grow with N. Here the master
+process loads everything once (registro.precargar), moves the loaded objects out
+of the garbage collector (gc.freeze) and then forks the workers, which serve on
+the same listening socket. The pages of the master are shared copy-on-write:
+the NumPy arrays (CSR graphs, tables, search index) are never written, so only
+the pages of the Python objects a worker touches are copied. With the compiled
+bundle the arrays are memory-mapped and also shared with every other process
+that maps the bundle.
+Every worker keeps its own registry after the fork: a change of the graphs in
+one of them (POST /incidencias) would not reach the others, so with several
+workers the API rejects the incidents.
+
+    python -m src.servidor [--workers N] [--host HOST] [--port PORT]
+"""
+
+from typing import List
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+
+logger = logging.getLogger(__name__)
+
+TRABAJADORES = os.cpu_count() or 1
+
+
+def abrir_socket(host:str,puerto:int)->socket.socket:
+    """ Listening socket shared by every worker """
+    familia = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(familia, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, puerto))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+def servir_trabajador(sock:socket.socket):
+    """ Runs uvicorn on the shared socket in a forked worker, never returns """
+    import uvicorn
+    from src.api import app
+    codigo = 0
+    try:
+        uvicorn.Server(uvicorn.Config(app, log_level="warning")).run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker %d stopped with an error", os.getpid())
+        codigo = 1
+    finally:
+        os._exit(codigo)
+
+def servir(host:str="127.0.0.1",puerto:int=8080,trabajadores:int=TRABAJADORES)->None:
+    """ Loads the street map once and serves the API with forked workers until SIGINT or SIGTERM.
+
+    Args:
+        host (str, optional): address to listen on.
+        puerto (int, optional): port to listen on.
+        trabajadores (int, optional): number of worker processes, one per core by default.
+    """
+    # The server modules are also imported before forking, their objects are shared as well
+    import uvicorn
+    import src.api
+    import src.gps as gps
+    gps.registro.precargar()
+    src.api.app.state.trabajadores = trabajadores
+    # Objects that survive until the fork are never collected: the collector of a worker does
+    # not write on their headers and their pages stay shared
+    gc.collect()
+    gc.freeze()
+    sock = abrir_socket(host, puerto)
+
+    hijos:List[int] = []
+    for _ in range(trabajadores):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            servir_trabajador(sock)
+        hijos.append(pid)
+    logger.info("Serving on %s:%d with %d workers: %s", host, puerto, trabajadores, hijos)
+
+    def parar(senal, _):
+        for pid in hijos:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    signal.signal(signal.SIGINT, parar)
+    signal.signal(signal.SIGTERM, parar)
+    for pid in hijos:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    sock.close()
+
+
+if __name__ == "__main__":
+    argumentos = argparse.ArgumentParser(description="API server with workers forked from a preloaded master process")
+    argumentos.add_argument("--host", default="127.0.0.1")
+    argumentos.add_argument("--port", type=int, default=8080)
+    argumentos.add_argument("--workers", type=int, default=TRABAJADORES)
+    argumentos = argumentos.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    servir(argumentos.host, argumentos.port, argumentos.workers)
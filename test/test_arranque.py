@@ -0,0 +1,32 @@
+"""
+test_arranque.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks that importing the modules has no side effects: no data is read and the
+heavy libraries are only imported when they are used. Each check runs in a new
+interpreter, in a directory without data/, so that nothing is already imported.
+"""
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def importar(codigo, directorio):
+    entorno = dict(os.environ, PYTHONPATH=RAIZ)
+    return subprocess.run([sys.executable, "-c", codigo], cwd=directorio, env=entorno, capture_output=True, text=True)
+
+def test_importar_grafo_es_ligero(tmp_path):
+    resultado = importar("import sys, src.grafo; print(sorted({'numpy','networkx'} & set(sys.modules)))", tmp_path)
+    assert resultado.returncode == 0, resultado.stderr
+    assert resultado.stdout.strip() == "[]"
+
+def test_importar_gps_sin_datos(tmp_path):
+    codigo = ("import sys, src.gps, src.callejero as c; "
+              "print(sorted({'pandas','networkx','matplotlib'} & set(sys.modules)), c.datos._paquete_buscado)")
+    resultado = importar(codigo, tmp_path)
+    assert resultado.returncode == 0, resultado.stderr
+    assert resultado.stdout.strip() == "[] False"
@@ -0,0 +1,55 @@
+"""
+test_buscador.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the address search index: normalization, exact, prefix and misspelled
+queries, ranking, the fallback when no address matches every token and the
+strict search used to resolve the addresses of a route.
+"""
+import pytest
+from src.buscador import IndiceDirecciones, normalizar, distancia_edicion
+
+NOMBRES = ["CALLE DE ALCALA NUM1", "CALLE DE ALCALA NUM12", "CALLE DE ALCALA NUM2", "PASEO DEL PRADO NUM1",
+           "PASEO DEL PRADO NUM12", "AVENIDA DE AMÉRICA NUM5", "CALLE DE ALCALÁ NORTE NUM1", "PLAZA MAYOR NUM3"]
+
+@pytest.fixture
+def indice():
+    return IndiceDirecciones(NOMBRES)
+
+def test_normalizar():
+    assert normalizar("  Avenida de  América, nº12B ") == "AVENIDA DE AMERICA N 12 B"
+    assert distancia_edicion("ALCALA", "ALACALA", 2) == 1
+    assert distancia_edicion("ALCALA", "PRADO", 2) == 3
+
+def test_buscar_exacta(indice):
+    assert indice.buscar("CALLE DE ALCALA NUM12", 1) == ["CALLE DE ALCALA NUM12"]
+    assert indice.buscar("calle de alcala num 12", 1) == ["CALLE DE ALCALA NUM12"]
+    assert indice.buscar("avenida de america 5", 1) == ["AVENIDA DE AMÉRICA NUM5"]
+
+def test_buscar_prefijo(indice):
+    # The last token is completed while the query is being typed, shorter names first
+    assert indice.buscar("paseo del pra") == ["PASEO DEL PRADO NUM1", "PASEO DEL PRADO NUM12"]
+    assert indice.buscar("alcala num1", 2) == ["CALLE DE ALCALA NUM1", "CALLE DE ALCALA NUM12"]
+    # A query that ends with a space only matches whole tokens
+    assert indice.buscar("plaza may ") == ["PLAZA MAYOR NUM3"]
+
+def test_buscar_errores(indice):
+    assert indice.buscar("calle de alacala num2 ", 1) == ["CALLE DE ALCALA NUM2"]
+    assert indice.buscar("paseo del pardo 12 ", 1) == ["PASEO DEL PRADO NUM12"]
+
+def test_buscar_parcial(indice):
+    # No address matches every token: those that match the most are returned
+    assert indice.buscar("plaza mayor zzzzzz ") == ["PLAZA MAYOR NUM3"]
+    assert indice.buscar("zzzzzz") == []
+    assert indice.buscar("") == [] and IndiceDirecciones([]).buscar("calle") == []
+
+def test_buscar_estricta(indice):
+    # Resolving an address: every token must match and the last one is not completed
+    assert indice.buscar("calle de alacala num2", 1, estricta=True) == ["CALLE DE ALCALA NUM2"]
+    assert indice.buscar("calle de serrano 5", estricta=True) == []
+    assert indice.buscar("plaza mayor zzzzzz ", estricta=True) == []
+    assert indice.buscar("paseo del prado 1", estricta=True) == ["PASEO DEL PRADO NUM1"]
+    assert indice.buscar("paseo del pra", estricta=True) == []
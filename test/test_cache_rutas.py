@@ -0,0 +1,79 @@
+"""
+test_cache_rutas.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the route cache: LRU eviction, expiry with a fake clock, invalidation
+when the version changes and coalescing of concurrent requests of one key,
+only within the same version.
+"""
+import threading
+import pytest
+from src.cache_rutas import CacheRutas
+
+def test_lru_y_caducidad():
+    instante = [0.0]
+    cache = CacheRutas(tamano_maximo=2, segundos_vida=10, reloj=lambda: instante[0])
+    assert cache.obtener("a", lambda: 1) == 1 and cache.obtener("b", lambda: 2) == 2
+    assert cache.obtener("a", lambda: pytest.fail("cached")) == 1
+    # "b" is the least recently used one
+    cache.obtener("c", lambda: 3)
+    assert cache.obtener("b", lambda: 20) == 20
+    instante[0] = 11
+    assert cache.obtener("c", lambda: 30) == 30
+    assert cache.estadisticas() == {"aciertos": 1, "fallos": 5, "agrupadas": 0, "expulsiones": 2, "caducadas": 1,
+                                    "invalidaciones": 0, "entradas": 2, "tamano_maximo": 2}
+
+def test_version():
+    cache = CacheRutas()
+    cache.obtener("a", lambda: 1, version=1)
+    assert cache.obtener("a", lambda: 2, version=2) == 2
+    assert cache.estadisticas()["invalidaciones"] == 1 and len(cache) == 1
+    with pytest.raises(ValueError):
+        cache.obtener("b", lambda: int("x"), version=2)
+    assert len(cache) == 1
+
+def test_agrupar_peticiones():
+    cache = CacheRutas()
+    empezado, continuar = threading.Event(), threading.Event()
+    llamadas = []
+    def calcular():
+        llamadas.append(1)
+        empezado.set()
+        continuar.wait(5)
+        return "ruta"
+    resultados = []
+    primero = threading.Thread(target=lambda: resultados.append(cache.obtener("a", calcular)))
+    primero.start()
+    empezado.wait(5)
+    # The others arrive while the first one is computing the route
+    otros = [threading.Thread(target=lambda: resultados.append(cache.obtener("a", calcular))) for _ in range(4)]
+    for hilo in otros:
+        hilo.start()
+    while cache.estadisticas()["agrupadas"] < 4:
+        threading.Event().wait(0.01)
+    continuar.set()
+    for hilo in [primero] + otros:
+        hilo.join(5)
+    assert resultados == ["ruta"] * 5 and len(llamadas) == 1
+
+def test_agrupar_misma_version():
+    cache = CacheRutas()
+    empezado, continuar = threading.Event(), threading.Event()
+    def calcular_antigua():
+        empezado.set()
+        continuar.wait(5)
+        return "ruta antigua"
+    antigua = []
+    hilo = threading.Thread(target=lambda: antigua.append(cache.obtener("a", calcular_antigua, version=1)))
+    hilo.start()
+    empezado.wait(5)
+    # A request after a change of the graphs does not join the computation of the previous version
+    assert cache.obtener("a", lambda: "ruta nueva", version=2) == "ruta nueva"
+    continuar.set()
+    hilo.join(5)
+    assert antigua == ["ruta antigua"]
+    assert cache.estadisticas()["agrupadas"] == 0
+    assert cache.obtener("a", lambda: pytest.fail("cached"), version=2) == "ruta nueva"
@@ -0,0 +1,111 @@
+"""
+test_callejero.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the unification of intersections of callejero.py against a direct
+O(n^2) implementation of the same greedy clustering, and the tables of
+intersections and streets built from it.
+"""
+import pickle
+import pytest
+import numpy as np
+import pandas as pd
+import src.callejero as callejero
+
+R = 3000
+
+def agrupar_fuerza_bruta(coordenadas, R):
+    grupos = np.full(len(coordenadas), -1)
+    numero_grupos = 0
+    for i in range(len(coordenadas)):
+        if grupos[i] == -1:
+            cerca = (np.hypot(*(coordenadas - coordenadas[i]).T) < R) & (grupos == -1)
+            grupos[cerca] = numero_grupos
+            numero_grupos += 1
+    return grupos
+
+def test_agrupar_cruces():
+    rng = np.random.default_rng(0)
+    # Clusters of nearby points plus scattered ones, some of them exactly on cell borders
+    centros = rng.integers(0, 200000, size=(60, 2))
+    coordenadas = np.concatenate((np.repeat(centros, 4, axis=0) + rng.integers(-1500, 1500, size=(240, 2)),
+                                  rng.integers(0, 200000, size=(200, 2)), [[0, 0], [R, 0], [2*R, 2*R]]))
+    assert (callejero.agrupar_cruces(coordenadas, R) == agrupar_fuerza_bruta(coordenadas, R)).all()
+    assert len(callejero.agrupar_cruces(np.zeros((0, 2)), R)) == 0
+
+def test_unificar_cruces():
+    columnas = callejero.COLUMNAS_COORDENADAS_CRUCE
+    cruces = pd.DataFrame({columnas[0]: [0, 1000, 100000, 2000, 100001],
+                           columnas[1]: [0, 0, 0, 0, 1],
+                           "Literal completo del vial tratado": ["A", "B", "C", "D", "E"]})
+    unificados = callejero.unificar_cruces(cruces, R)
+    # No row is dropped and every row of a group has the rounded centroid of the group
+    assert len(unificados) == len(cruces)
+    assert unificados[callejero.COLUMNA_CRUCE_UNIFICADO].tolist() == [0, 0, 1, 0, 1]
+    assert unificados[columnas[0]].tolist() == [1000, 1000, 100000, 1000, 100000]
+    assert unificados[columnas[1]].tolist() == [0, 0, 0, 0, 0]
+    # The original DataFrame is not modified
+    assert cruces[columnas[0]].tolist() == [0, 1000, 100000, 2000, 100001]
+
+def test_tablas_callejero():
+    cruces = pd.DataFrame({"Codigo de via tratado": [10, 10, 20, 20, 10],
+                           "Literal completo del vial tratado": ["CALLE A", "CALLE A", "CALLE B", "CALLE B", "CALLE A"],
+                           "Codigo de via que cruza o enlaza": [20, 30, 10, 30, 40],
+                           "Literal completo del vial que cruza": ["CALLE B", "CALLE C", "CALLE A", "CALLE C", "CALLE D"],
+                           "Coordenada X (Guia Urbana) cm (cruce)": [0, 100000, 500, 100000, 200000],
+                           "Coordenada Y (Guia Urbana) cm (cruce)": [0, 0, 0, 100000, 0],
+                           "Longitud en S R  WGS84 (cruce)": [0.0, 1.0, 0.0, 1.0, 2.0],
+                           "Latitud en S R  WGS84 (cruce)": [0.0, 0.0, 0.0, 1.0, 0.0]})
+    tablas = callejero.TablasCallejero.desde_dataframe(cruces, R)
+    # The first and third rows are the same intersection
+    assert tablas.numero_cruces() == 4 and tablas.numero_calles() == 2
+    assert (tablas.cruces_x.tolist(), tablas.cruces_y.tolist()) == ([250, 100000, 100000, 200000], [0, 0, 100000, 0])
+    assert sorted(tablas.calles_de_cruce(0)) == ["CALLE A", "CALLE B"]
+    assert sorted(tablas.calles_de_cruce(2)) == ["CALLE B", "CALLE C"]
+
+    # Views share the same objects and the intersections of each street keep their order
+    calles = tablas.calles()
+    assert [cruce.coord_x for cruce in tablas.cruces_de_calle(0)] == [250, 100000, 200000]
+    assert calles[10].cruces == set(tablas.cruces_de_calle(0))
+    assert tablas.cruce(0) in calles[20].cruces and tablas.cruce(0) is tablas.cruces()[0]
+    origenes, destinos, ids_calles = tablas.aristas()
+    assert list(zip(origenes.tolist(), destinos.tolist(), ids_calles.tolist())) == [(0, 1, 0), (1, 3, 0), (0, 2, 1)]
+
+    # The views have no __dict__, read their streets from the tables and survive pickling
+    cruce = tablas.cruce(0)
+    assert not hasattr(cruce, "__dict__") and not hasattr(calles[10], "__dict__")
+    assert cruce.calle_comun(tablas.cruce(1)) == "CALLE A" and cruce.loc == (0.0, 0.0)
+    copia = pickle.loads(pickle.dumps(cruce))
+    assert copia == cruce and copia.calles == cruce.calles and copia.loc == cruce.loc
+    # Their streets cannot be changed in place, only through agregar_calle or an assignment
+    with pytest.raises(AttributeError):
+        cruce.calles.add("CALLE Z")
+    cruce.agregar_calle("CALLE Z")
+    assert cruce.calles == {"CALLE A", "CALLE B", "CALLE Z"}
+    tablas.cruce(1).calles = {"CALLE Y"}
+    assert tablas.cruce(1).lista_calles() == ["CALLE Y"]
+    with pytest.raises(AttributeError):
+        calles[10].cruces.add(cruce)
+
+def test_velocidades_calles():
+    direcciones = pd.DataFrame({"Codigo de via": [10, 20, 10, 30],
+                                "Clase de la via": pd.Categorical(["AVENIDA", "CALLE", "CALLE", "PLAZUELA "])})
+    # The class of a street is that of its first address; street 40 has no addresses
+    clases = callejero.clases_calles([30, 10, 40, 20], direcciones)
+    assert clases.tolist() == ["PLAZUELA", "AVENIDA", "", "CALLE"]
+    assert callejero.velocidades_calles(clases).tolist() == [20, 90, 50, 50]
+    assert callejero.velocidades_calles(clases, {"CALLE": 40}, 30).tolist() == [30, 30, 30, 40]
+
+def test_componentes():
+    # Two streets joined at (1000, 0), a separate street and an isolated intersection
+    tablas = callejero.TablasCallejero(
+        cruces_x=np.array([0, 1000, 2000, 1000, 90000, 91000, 50000]), cruces_y=np.array([0, 0, 0, 1000, 0, 0, 50000]),
+        cruces_lon=np.zeros(7), cruces_lat=np.zeros(7), nombres_calles=np.array(["A", "B", "C"]),
+        calles_indptr=np.zeros(8, dtype=np.int64), calles_indices=np.zeros(0, dtype=np.int32),
+        codigos_via=np.array([1, 2, 3]), nombres_via=np.array([0, 1, 2]),
+        cruces_indptr=np.array([0, 3, 5, 7]), cruces_indices=np.array([2, 1, 0, 3, 1, 5, 4]))
+    assert tablas.componentes().tolist() == [0, 0, 0, 0, 4, 4, 6]
+    assert tablas.componente_principal().tolist() == [True, True, True, True, False, False, False]
@@ -0,0 +1,54 @@
+"""
+test_ciudad_sintetica.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the synthetic city of the benchmarks: the same seed gives the same city,
+its street graph is connected and routes can be requested on it, and the
+comparison with a baseline flags the stages that got slower.
+"""
+import random
+import pytest
+import pandas as pd
+import src.gps as gps
+from benchmarks.ciudad_sintetica import ciudad_sintetica, datos_sinteticos
+from benchmarks.rendimiento import comparar
+
+@pytest.fixture
+def registro():
+    anterior = gps.registro
+    gps.registro = gps.RegistroGrafos(datos_sinteticos(500, semilla=3))
+    yield gps.registro
+    gps.registro = anterior
+
+def test_reproducible():
+    cruces, direcciones = ciudad_sintetica(500, semilla=3)
+    otros_cruces, otras_direcciones = ciudad_sintetica(500, semilla=3)
+    pd.testing.assert_frame_equal(cruces, otros_cruces)
+    pd.testing.assert_frame_equal(direcciones, otras_direcciones)
+    assert not cruces.equals(ciudad_sintetica(500, semilla=4)[0])
+
+def test_ciudad_conexa(registro):
+    tablas = registro.tablas()
+    assert len(tablas.cruces()) >= 500
+    assert tablas.componente_principal().all()
+    assert not registro.tabla_direcciones().aisladas.any()
+
+def test_rutas(registro):
+    aleatorio = random.Random(0)
+    direcciones = list(registro.direcciones())
+    for modo in gps.MODOS:
+        origen, destino = aleatorio.sample(direcciones, 2)
+        instrucciones, _ = gps.dirigir_ruta_api(origen, destino, modo)
+        assert instrucciones
+
+def test_comparar():
+    base = {"etapas": {"prim": {"segundos": 1.0, "segundos_por_operacion": 1.0, "pico_mib": 10.0},
+                       "kruskal": {"segundos": 1.0, "segundos_por_operacion": 1.0, "pico_mib": 10.0}}}
+    actual = {"etapas": {"prim": {"segundos": 1.1, "segundos_por_operacion": 1.1, "pico_mib": 10.0},
+                         "kruskal": {"segundos": 2.0, "segundos_por_operacion": 2.0, "pico_mib": 10.0},
+                         "nueva": {"segundos": 1.0, "segundos_por_operacion": 1.0, "pico_mib": 1.0}}}
+    regresiones = {fila[0]: fila[-1] for fila in comparar(actual, base, tolerancia=0.25)}
+    assert regresiones == {"prim": False, "kruskal": True}
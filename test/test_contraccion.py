@@ -0,0 +1,45 @@
+"""
+test_contraccion.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks that the routes found with a Contraction Hierarchy are minimum paths
+of the original graph, for directed and undirected random graphs.
+"""
+import pytest
+import random
+import src.grafo as grafo
+from src.contraccion import JerarquiaContraccion
+
+NUM_VERTICES=30
+NUM_ARISTAS=80
+
+def grafo_aleatorio(dirigido):
+    G=grafo.Grafo(dirigido)
+    for v in range(NUM_VERTICES):
+        G.agregar_vertice(v)
+    for _ in range(NUM_ARISTAS):
+        G.agregar_arista(random.randrange(NUM_VERTICES),random.randrange(NUM_VERTICES),None,random.randint(1,10))
+    return G
+
+@pytest.mark.parametrize("dirigido", [False, True])
+def test_jerarquia(dirigido, tmp_path):
+    G = grafo_aleatorio(dirigido)
+    jerarquia = JerarquiaContraccion.construir(G)
+    jerarquia.guardar(tmp_path / "jerarquia.npz")
+    cargada = JerarquiaContraccion.cargar(tmp_path / "jerarquia.npz", G)
+    assert cargada.firma == jerarquia.firma
+    # The file only has arrays: the vertices are those of the graph, and another graph does not load it
+    assert cargada.vertices == G.congelar().vertices
+    assert JerarquiaContraccion.cargar(tmp_path / "jerarquia.npz", grafo_aleatorio(dirigido)) is None
+    for origen in range(NUM_VERTICES):
+        for destino in range(NUM_VERTICES):
+            esperado = G.buscar_camino(origen,destino)[1]
+            camino, coste, _ = cargada.buscar_camino(origen,destino)
+            assert coste == esperado
+            if camino is not None:
+                # The shortcuts are unpacked into edges of the original graph
+                assert camino[0] == origen and camino[-1] == destino
+                assert sum(G.obtener_arista(s,t)[1] for s,t in zip(camino,camino[1:])) == coste
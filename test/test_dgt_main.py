@@ -0,0 +1,55 @@
+"""
+test_dgt_main.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the ingestion of the DGT CSV files on small files written in a temporary
+data/ directory: columns read, types and cleaned values.
+"""
+import pytest
+import numpy as np
+import pandas as pd
+import src.dgt_main as dgt_main
+
+CRUCES = """Codigo de via tratado;Clase de la via tratado;Literal completo del vial tratado;Codigo de via que cruza o enlaza;Literal completo del vial que cruza;Coordenada X (Guia Urbana) cm (cruce);Coordenada Y (Guia Urbana) cm (cruce);Longitud en S R  WGS84 (cruce);Latitud en S R  WGS84 (cruce)
+10;CALLE ;CALLE DE ALCALA  ;20;PASEO DEL PRADO ;44000000;447000000;-3.70;40.41
+20;PASEO ;PASEO DEL PRADO  ;10;CALLE DE ALCALA;{coordenada};447000010;-3.70;40.41
+"""
+DIRECCIONES = """Codigo de via;Clase de la via;Particula de la via;Nombre de la via;Literal de numeracion;Codigo de numero;Coordenada X (Guia Urbana) cm;Coordenada Y (Guia Urbana) cm
+10;CALLE  ;DE ;ALCALA ;NUM12B ;{numero};044000500;447000500
+20;PASEO ;DEL;PRADO;KM.3 ;00000002;044000900;447000900
+"""
+
+@pytest.fixture
+def datos(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    def escribir(numero, coordenada):
+        (tmp_path / "data" / "cruces.csv").write_text(CRUCES.format(coordenada=coordenada), encoding="windows-1252")
+        (tmp_path / "data" / "direcciones.csv").write_text(DIRECCIONES.format(numero=numero), encoding="windows-1252")
+        return dgt_main.process_data(dgt_main.cruces_read(), dgt_main.direcciones_read())
+    return escribir
+
+# A value that is not a plain number makes the numeric columns of the file be read as text
+@pytest.mark.parametrize("numero,coordenada", [("00000001", "44000010.0"), ("00000001-A", "44000010.0"), ("00000001", "44000010.0*")])
+def test_process_data(datos, numero, coordenada):
+    cruces, direcciones = datos(numero, coordenada)
+
+    assert set(cruces.columns) == set(dgt_main.COLUMNAS_CRUCES)
+    assert cruces["Literal completo del vial tratado"].tolist() == ["CALLE DE ALCALA", "PASEO DEL PRADO"]
+    assert isinstance(cruces["Literal completo del vial que cruza"].dtype, pd.CategoricalDtype)
+    assert cruces["Literal completo del vial que cruza"].cat.categories.tolist() == ["CALLE DE ALCALA", "PASEO DEL PRADO"]
+    assert cruces["Coordenada X (Guia Urbana) cm (cruce)"].dtype == np.int32
+    assert cruces["Coordenada X (Guia Urbana) cm (cruce)"].tolist() == [44000000, 44000010]
+    assert cruces["Longitud en S R  WGS84 (cruce)"].dtype == np.float64
+    assert cruces["Longitud en S R  WGS84 (cruce)"].tolist() == [-3.70, -3.70]
+
+    assert direcciones["Clase de la via"].tolist() == ["CALLE", "PASEO"]
+    assert direcciones["Codigo de numero"].tolist() == [1, 2]
+    assert direcciones["Coordenada X (Guia Urbana) cm"].dtype == np.int32
+    assert direcciones["Coordenada X (Guia Urbana) cm"].tolist() == [44000500, 44000900]
+    assert direcciones["Prefijo de numeracion"].tolist() == ["NUM", "KM."]
+    assert direcciones["Numero"].tolist() == ["12", "3"]
+    assert direcciones["Sufijo de numeracion"].tolist() == ["B", ""]
@@ -0,0 +1,159 @@
+"""
+test_gps.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the registry of gps.py on a small street map: the snapping table of the
+addresses, the incremental changes of the weights of the graphs, the
+directions of a route and the batch routing.
+"""
+import math
+import types
+import pytest
+import numpy as np
+import pandas as pd
+import src.gps as gps
+
+@pytest.fixture
+def registro():
+    cruces = pd.DataFrame({"Codigo de via tratado": [10, 10, 20, 20],
+                           "Literal completo del vial tratado": ["CALLE A", "CALLE A", "CALLE B", "CALLE B"],
+                           "Codigo de via que cruza o enlaza": [30, 40, 50, 60],
+                           "Literal completo del vial que cruza": ["CALLE C", "CALLE D", "CALLE E", "CALLE F"],
+                           "Coordenada X (Guia Urbana) cm (cruce)": [0, 100000, 500000, 520000],
+                           "Coordenada Y (Guia Urbana) cm (cruce)": [0, 0, 0, 0],
+                           "Longitud en S R  WGS84 (cruce)": [0.0] * 4,
+                           "Latitud en S R  WGS84 (cruce)": [0.0] * 4})
+    direcciones = pd.DataFrame({"Codigo de via": [10, 10, 20], "Clase de la via": ["CALLE", "CALLE", "CALLE"], "Particula de la via": ["", "", ""],
+                                "Nombre de la via": ["A", "A", "B"], "Literal de numeracion": ["NUM1", "NUM2", "NUM1"],
+                                "Coordenada X (Guia Urbana) cm": [3000, 90000, 620000],
+                                "Coordenada Y (Guia Urbana) cm": [4000, 0, 0]})
+    registro = gps.RegistroGrafos(types.SimpleNamespace(paquete=None, cruces=cruces, direcciones=direcciones))
+    yield registro
+    registro.cerrar()
+
+def test_tabla_direcciones(registro):
+    # Streets A and B are not connected: B is the smaller component and its addresses are flagged
+    tabla = registro.tabla_direcciones()
+    assert np.asarray(tabla.cruces).tolist() == [0, 1, 3]
+    assert np.allclose(tabla.distancias, [5000, 10000, 100000])
+    assert np.asarray(tabla.aisladas).tolist() == [False, False, True]
+
+    cruce, distancia = registro.resolver_direccion("CALLE  A NUM2")
+    assert (cruce.coord_x, cruce.coord_y, distancia) == (100000, 0, 10000)
+    assert cruce is registro.tablas().cruce(1)
+
+def test_incidencias(registro, monkeypatch):
+    monkeypatch.setattr(gps, "registro", registro)
+    G = registro.grafo("fastest")
+    a, b = registro.tablas().cruce(0), registro.tablas().cruce(1)
+    peso = G.obtener_arista(a, b)[1]
+    registro._jerarquias["fastest"] = registro._landmarks["fastest"] = "preprocesado"
+
+    # Higher weights keep the preprocessing: the landmarks are still lower bounds, and "ch"
+    # searches with A* until the original weights are restored
+    assert registro.aplicar_factores("fastest", {10: 2}) == 1
+    assert G.obtener_arista(b, a)[1] == pytest.approx(2 * peso)
+    assert registro._jerarquias["fastest"] == registro._landmarks["fastest"] == "preprocesado"
+    assert registro.algoritmo_disponible("fastest", "ch") == "astar"
+    assert registro.algoritmo_disponible("fastest", "alt") == "alt"
+    with pytest.raises(RuntimeError):
+        registro.jerarquia("fastest")
+    assert registro.aplicar_factores("fastest", {10: math.inf}) == 1
+    assert G.buscar_camino(a, b)[0] is None
+    # Factors apply to the original weight, so 1 restores it
+    assert registro.aplicar_factores("fastest", {10: 1}) == 1
+    assert G.obtener_arista(a, b)[1] == peso
+    assert not registro.pesos_modificados("fastest")
+    assert registro.algoritmo_disponible("fastest", "ch") == "ch"
+    assert registro.actualizar_pesos("fastest", [(a, b, peso)]) == 0
+    assert registro.version == 3
+    # Weights lower than the original ones would break the heuristics of A*
+    with pytest.raises(ValueError):
+        registro.aplicar_factores("fastest", {10: 0.5})
+    with pytest.raises(ValueError):
+        registro.actualizar_pesos("fastest", [(a, b, peso / 2)])
+    with pytest.raises(KeyError):
+        registro.aplicar_factores("fastest", {99: 2})
+    assert registro.version == 3 and G.obtener_arista(a, b)[1] == peso
+
+def test_incidencias_grafo_compacto(registro, monkeypatch):
+    monkeypatch.setattr(gps, "registro", registro)
+    # The frozen graph is updated in place, not frozen again
+    C = registro.grafo_compacto("shortest")
+    a, b = registro.tablas().cruce(0), registro.tablas().cruce(1)
+    registro.actualizar_pesos("shortest", [(a, b, 200000)])
+    assert registro.grafo_compacto("shortest") is C
+    assert C.obtener_arista(a, b)[1] == C.obtener_arista(b, a)[1] == 200000
+    # A change made on the graph outside the registry freezes it again
+    registro.grafo("shortest").actualizar_pesos([(a, b, 300000)])
+    assert registro.grafo_compacto("shortest") is not C
+    assert registro.grafo_compacto("shortest").obtener_arista(a, b)[1] == 300000
+    # A new speed table builds a new "fastest" graph, which is frozen again
+    C = registro.grafo_compacto("fastest")
+    registro.configurar_velocidades({"CALLE": 10})
+    assert registro.grafo_compacto("fastest") is not C
+
+def test_instrucciones(registro, monkeypatch):
+    monkeypatch.setattr(gps, "registro", registro)
+    # Directions are written without waiting: only the console asks for a pause
+    monkeypatch.setattr(gps.time, "sleep", lambda segundos: pytest.fail("the directions should not wait"))
+    instrucciones, _ = gps.dirigir_ruta_api("CALLE  A NUM1", "CALLE  A NUM2", "shortest")
+    assert instrucciones == ["Continua por CALLE  A 50.0 metros", "Continua recto por CALLE A 1000.0 metros ",
+                             "Continua por CALLE  A 100.0 metros", "Ha llegado a su destino"]
+    camino, _, generador = gps.planificar_ruta("CALLE  A NUM1", "CALLE  A NUM2", "shortest")
+    assert [(cruce.coord_x, cruce.coord_y) for cruce in camino] == [(0, 0), (100000, 0)]
+    assert next(generador) == instrucciones[0]
+
+@pytest.mark.parametrize("procesos", [1, 2])
+def test_rutas_en_lote(registro, monkeypatch, procesos):
+    monkeypatch.setattr(gps, "registro", registro)
+    pares = [("CALLE  A NUM1", "CALLE  A NUM2"), ("CALLE  A NUM1", "CALLE  B NUM1"), ("CALLE  Z NUM1", "CALLE  A NUM1")]
+    rutas = gps.rutas_en_lote(pares, "shortest", instrucciones=True, procesos=procesos)
+    assert [(cruce.coord_x, cruce.coord_y) for cruce in rutas[0]["camino"]] == [(0, 0), (100000, 0)]
+    assert rutas[0]["coste"] == pytest.approx(100000)
+    assert rutas[0]["instrucciones"] == gps.dirigir_ruta_api(*pares[0], "shortest")[0]
+    # Streets A and B are not connected, and street Z does not exist
+    assert rutas[1] == {"coste": None, "camino": None}
+    assert "error" in rutas[2]
+
+def test_pool(registro, monkeypatch):
+    monkeypatch.setattr(gps, "registro", registro)
+    # Every batch reuses the processes of the pool, which receive the changes of the weights
+    pares = [("CALLE  A NUM1", "CALLE  A NUM2")] * 3
+    rutas = gps.rutas_en_lote(pares, "shortest", procesos=2)
+    pool = registro.pool("shortest")
+    assert gps.rutas_en_lote(pares, "shortest", procesos=2) == rutas
+    assert registro.pool("shortest") is pool
+    matriz = gps.matriz_distancias(["CALLE  A NUM1", "CALLE  B NUM1"], ["CALLE  A NUM2"], "shortest", procesos=2)
+    assert registro.pool("shortest") is pool
+    assert matriz[0][0] == pytest.approx(100000) and matriz[1][0] == np.inf
+    a, b = registro.tablas().cruce(0), registro.tablas().cruce(1)
+    registro.actualizar_pesos("shortest", [(a, b, 200000)])
+    assert gps.rutas_en_lote(pares, "shortest", procesos=2)[0]["coste"] == pytest.approx(200000)
+    assert registro.pool("shortest") is pool
+    registro.actualizar_pesos("shortest", [(a, b, 100000)])
+    assert gps.rutas_en_lote(pares, "shortest", procesos=2)[0]["coste"] == pytest.approx(100000)
+    assert gps.matriz_distancias(["CALLE  A NUM1"], ["CALLE  A NUM2"], "shortest", procesos=2)[0][0] == pytest.approx(100000)
+    assert registro.pool("shortest") is pool
+    # Without a number of processes, a few searches run in this process
+    assert gps.grafo_compacto.procesos_necesarios(1) == 1
+
+def test_cache_rutas(registro, monkeypatch):
+    monkeypatch.setattr(gps, "registro", registro)
+    ruta, _ = gps.dirigir_ruta_api("CALLE  A NUM1", "CALLE  A NUM2", "shortest")
+    assert registro.cache.estadisticas()["fallos"] == 1
+    assert gps.dirigir_ruta_api("CALLE  A NUM1", "CALLE  A NUM2", "shortest")[0] == ruta
+    assert registro.cache.estadisticas()["aciertos"] == 1
+    # Changing a weight invalidates the cached routes
+    a, b = registro.tablas().cruce(0), registro.tablas().cruce(1)
+    registro.actualizar_pesos("shortest", [(a, b, 200000)])
+    assert gps.dirigir_ruta_api("CALLE  A NUM1", "CALLE  A NUM2", "shortest")[0] == ruta
+    assert registro.cache.estadisticas()["invalidaciones"] == 1
+    assert gps.dirigir_ruta_api("CALLE  A NUM1", "CALLE  B NUM1", "shortest")[0] is None
+    # So does changing it on the graph itself, without the registry
+    registro.grafo("shortest").actualizar_pesos([(a, b, 300000)])
+    assert gps.dirigir_ruta_api("CALLE  A NUM1", "CALLE  A NUM2", "shortest")[0] == ruta
+    assert registro.cache.estadisticas()["invalidaciones"] == 2
@@ -69,4 +69,135 @@ def test_grafo_operations(grafo_instance):
         print(aam)
 
         aam2=G.prim()
-        print(aam2)
\ No newline at end of file
+        print(aam2)
+
+
+@pytest.fixture
+def grafo_pesos_fijos():
+    #Graph with fixed weights so that the shortest paths are known
+    G=grafo.Grafo(dirigido)
+    for v in vertices:
+        G.agregar_vertice(v)
+    pesos=[4,1,7,9,3,2,6,5]
+    for a,peso in zip(aristas,pesos):
+        G.agregar_arista(a[0],a[1],None,peso)
+    return G
+
+def test_buscar_camino(grafo_pesos_fijos):
+    G = grafo_pesos_fijos
+    camino, coste, asentados = G.buscar_camino(1,4)
+    assert camino == [1,3,4]
+    assert coste == 3
+    assert asentados <= len(vertices)
+    assert G.camino_minimo(1,6) == [1,3,5,6]
+    assert G.dijkstra(1) == {1:None, 2:1, 3:1, 4:3, 5:3, 6:5}
+
+def test_buscar_camino_inalcanzable(grafo_pesos_fijos):
+    G = grafo_pesos_fijos
+    G.agregar_vertice(7)
+    camino, coste, asentados = G.buscar_camino(1,7)
+    assert camino is None
+    assert coste == grafo.INFTY
+    assert asentados == len(vertices)
+    assert G.camino_minimo(7,7) == [7]
+
+def test_grafo_compacto(grafo_pesos_fijos):
+    G = grafo_pesos_fijos
+    C = G.congelar()
+    for v in vertices:
+        assert C.grado(v) == G.grado(v)
+        assert C.grado_entrante(v) == G.grado_entrante(v)
+        assert sorted(C.lista_adyacencia(v)) == sorted(G.lista_adyacencia(v))
+        assert C.dijkstra(v) == G.dijkstra(v)
+    assert C.obtener_arista(1,3) == G.obtener_arista(1,3)
+    assert C.buscar_camino(1,6) == G.buscar_camino(1,6)
+    pesos = {frozenset((s,t)): p for s,t,p in G.lista_aristas()}
+    peso_kruskal = sum(pesos[frozenset(a)] for a in C.kruskal())
+    assert peso_kruskal == sum(pesos[frozenset(a)] for a in G.kruskal())
+    peso_prim = sum(pesos[frozenset((v,p))] for v,p in C.prim().items() if p is not None)
+    assert peso_prim == peso_kruskal
+
+@pytest.fixture
+def grafo_rejilla():
+    #Grid graph whose vertices are points (x,y) and whose weights are euclidean distances
+    G=grafo.Grafo(dirigido)
+    puntos=[(x,y) for x in range(10) for y in range(10)]
+    for p in puntos:
+        G.agregar_vertice(p)
+    for (x,y) in puntos:
+        for (dx,dy) in [(1,0),(0,1),(1,1)]:
+            if (x+dx,y+dy) in G.adyacencia:
+                G.agregar_arista((x,y),(x+dx,y+dy),None,((dx**2+dy**2)**0.5)*random.uniform(1,2))
+    return G
+
+def test_astar(grafo_rejilla):
+    G = grafo_rejilla
+    heuristica = lambda p,q: ((p[0]-q[0])**2+(p[1]-q[1])**2)**0.5
+    _, coste, asentados = G.buscar_camino((0,0),(9,9))
+    camino_astar, coste_astar, asentados_astar = G.buscar_camino((0,0),(9,9),"astar",heuristica)
+    assert coste_astar == pytest.approx(coste)
+    assert camino_astar[0] == (0,0) and camino_astar[-1] == (9,9)
+    assert asentados_astar <= asentados
+    assert G.congelar().buscar_camino((0,0),(9,9),"astar",heuristica)[1] == pytest.approx(coste)
+    with pytest.raises(ValueError):
+        G.buscar_camino((0,0),(9,9),"astar")
+
+def test_bidireccional():
+    #Directed graph in which the backward search must follow the reversed edges
+    G=grafo.Grafo(True)
+    for v in vertices:
+        G.agregar_vertice(v)
+    for (s,t),peso in zip(aristas,[4,1,7,9,3,2,6,5]):
+        G.agregar_arista(s,t,None,peso)
+    G.agregar_arista(6,1,None,1)
+    for origen in vertices:
+        for destino in vertices:
+            esperado = G.buscar_camino(origen,destino)
+            camino, coste, asentados = G.buscar_camino(origen,destino,"bidireccional")
+            assert coste == esperado[1]
+            assert G.congelar().buscar_camino(origen,destino,"bidireccional")[1] == coste
+            if camino is not None:
+                assert camino[0] == origen and camino[-1] == destino
+                assert sum(G.obtener_arista(s,t)[1] for s,t in zip(camino,camino[1:])) == coste
+
+def test_matriz_distancias(grafo_pesos_fijos):
+    G = grafo_pesos_fijos
+    G.agregar_vertice(7)
+    origenes, destinos = [1,2,7], [6,4,1,8]
+    # None: few origins, searched in this process
+    for procesos in [None,1,2]:
+        matriz = G.matriz_distancias(origenes,destinos,procesos)
+        assert matriz.shape == (3,4)
+        for i,origen in enumerate(origenes):
+            for j,destino in enumerate(destinos):
+                coste = G.buscar_camino(origen,destino)[1]
+                assert matriz[i][j] == (coste if coste != grafo.INFTY else float("inf"))
+
+def test_actualizar_pesos(grafo_pesos_fijos):
+    G = grafo_pesos_fijos
+    C = G.congelar()
+    for H in (G, C):
+        # Closing (3,4) sends the route from 1 to 4 through the next best path, in both directions
+        version = H.version
+        assert H.actualizar_pesos([(3,4,float("inf")), (2,6,1)]) == [2, None]
+        assert H.version == version + 1
+        camino, coste, _ = H.buscar_camino(1,4)
+        assert coste == 7 and 3 not in camino
+        assert H.buscar_camino(4,1)[1] == 7
+        assert H.actualizar_pesos([(4,3,2)]) == [float("inf")]
+        assert H.buscar_camino(1,4)[1] == 3
+    assert C.obtener_arista(3,4) == G.obtener_arista(3,4) == (None, 2)
+
+def test_actualizar_pesos_dirigido():
+    G=grafo.Grafo(True)
+    for v in vertices:
+        G.agregar_vertice(v)
+    for (s,t),peso in zip(aristas,[4,1,7,9,3,2,6,5]):
+        G.agregar_arista(s,t,None,peso)
+    C = G.congelar()
+    for H in (G, C):
+        # The reversed edges used by the bidirectional search are updated too
+        assert H.buscar_camino(1,4,"bidireccional")[1] == 3
+        H.actualizar_pesos([(1,3,10)])
+        assert H.obtener_arista(3,1) is None
+        assert H.buscar_camino(1,4,"bidireccional")[1] == H.buscar_camino(1,4)[1] == 7
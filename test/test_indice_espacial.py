@@ -0,0 +1,58 @@
+"""
+test_indice_espacial.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the nearest-k and radius queries of the spatial index against the
+distances to every point, for query points inside and outside the grid.
+"""
+import pytest
+import numpy as np
+from src.indice_espacial import IndiceEspacial
+
+K = 4
+RADIO = 5000
+
+@pytest.fixture
+def puntos():
+    rng = np.random.default_rng(0)
+    # Clustered and scattered points, with repeated coordinates
+    centros = rng.integers(0, 100000, size=(20, 2))
+    return np.concatenate((np.repeat(centros, 5, axis=0) + rng.integers(-800, 800, size=(100, 2)),
+                           rng.integers(0, 100000, size=(100, 2)), centros[:5]))
+
+@pytest.fixture
+def consultas(puntos):
+    rng = np.random.default_rng(1)
+    return np.concatenate((rng.uniform(-50000, 150000, size=(100, 2)), puntos[:10]))
+
+def test_mas_cercanos(puntos, consultas):
+    indice = IndiceEspacial(puntos)
+    distancias = np.hypot(*(puntos[None, :, :] - consultas[:, None, :]).transpose(2, 0, 1))
+    esperadas = np.sort(distancias, axis=1)[:, :K]
+
+    ids, obtenidas = indice.mas_cercanos_lote(consultas, K)
+    assert np.allclose(obtenidas, esperadas)
+    assert np.allclose(distancias[np.arange(len(consultas))[:, None], ids], obtenidas)
+    for fila, (x, y) in enumerate(consultas):
+        ids_punto, distancias_punto = indice.mas_cercanos(x, y, K)
+        assert np.allclose(distancias_punto, esperadas[fila])
+        assert indice.mas_cercano(x, y)[1] == pytest.approx(esperadas[fila][0])
+
+def test_en_radio(puntos, consultas):
+    indice = IndiceEspacial(puntos)
+    filas, ids, obtenidas = indice.en_radio_lote(consultas, RADIO)
+    for fila, (x, y) in enumerate(consultas):
+        distancias = np.hypot(puntos[:, 0] - x, puntos[:, 1] - y)
+        assert set(ids[filas == fila].tolist()) == set(np.flatnonzero(distancias <= RADIO).tolist())
+        ids_punto, distancias_punto = indice.en_radio(x, y, RADIO)
+        assert (np.diff(distancias_punto) >= 0).all()
+        assert set(ids_punto.tolist()) == set(ids[filas == fila].tolist())
+
+def test_pocos_puntos():
+    assert IndiceEspacial(np.zeros((0, 2))).mas_cercano(1, 2) == (-1, np.inf)
+    ids, distancias = IndiceEspacial([[3, 4]]).mas_cercanos_lote([[0, 0]], 2)
+    assert ids.tolist() == [[0, -1]] and distancias.tolist() == [[5, np.inf]]
+    assert IndiceEspacial([[3, 4]]).mas_cercanos(0, 0, 2)[0].tolist() == [0]
@@ -0,0 +1,48 @@
+"""
+test_landmarks.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks that A* with the ALT (landmarks) heuristic finds minimum paths and that
+the heuristic never overestimates the real distance, that the tables built in
+parallel are the same and that saved tables are loaded for the graph's vertices.
+"""
+import pytest
+import random
+import src.grafo as grafo
+from src.landmarks import Landmarks
+
+NUM_VERTICES=30
+NUM_ARISTAS=80
+
+def grafo_aleatorio(dirigido):
+    #The vertices are points (x,y) so that the landmarks can be spread over them
+    G=grafo.Grafo(dirigido)
+    puntos=[(random.random(),random.random()) for _ in range(NUM_VERTICES)]
+    for p in puntos:
+        G.agregar_vertice(p)
+    for _ in range(NUM_ARISTAS):
+        G.agregar_arista(random.choice(puntos),random.choice(puntos),None,random.randint(1,10))
+    return G
+
+@pytest.mark.parametrize("dirigido", [False, True])
+def test_landmarks(dirigido, tmp_path):
+    G = grafo_aleatorio(dirigido)
+    tablas = Landmarks.construir(G, 4, coordenadas=lambda v: v, procesos=1)
+    # The tables built by several processes are the same
+    paralelas = Landmarks.construir(G, 4, coordenadas=lambda v: v, procesos=2)
+    assert (paralelas.landmarks == tablas.landmarks).all() and (paralelas.desde == tablas.desde).all()
+    assert (paralelas.hacia == tablas.hacia).all() if dirigido else paralelas.hacia is None
+    tablas.guardar(tmp_path / "landmarks.npz")
+    cargadas = Landmarks.cargar(tmp_path / "landmarks.npz", G)
+    assert cargadas.firma == G.congelar().firma()
+    # The file only has arrays: the vertices are the objects of the graph
+    assert all(v is w for v, w in zip(cargadas.vertices, G.lista_vertices()))
+    assert Landmarks.cargar(tmp_path / "landmarks.npz", grafo_aleatorio(dirigido)) is None
+    for origen in G.lista_vertices():
+        for destino in G.lista_vertices():
+            _, coste, _ = G.buscar_camino(origen,destino)
+            assert cargadas.heuristica(origen,destino) <= coste
+            assert G.buscar_camino(origen,destino,"astar",cargadas.heuristica)[1] == coste
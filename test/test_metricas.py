@@ -0,0 +1,46 @@
+"""
+test_metricas.py
+
+Discreet Mathematics - IMAT
+ICAI, Universidad Pontificia Comillas
+
+Description:
+Checks the metrics of metricas.py: the Prometheus text format of counters and
+histograms and the per-request breakdown of the timing spans.
+"""
+import threading
+import src.metricas as metricas
+
+def test_contador_e_histograma():
+    registro = metricas.RegistroMetricas()
+    contador = registro.contador("peticiones_total", "Requests", ("endpoint",))
+    contador.incrementar(endpoint="/ruta")
+    contador.incrementar(2, endpoint="/ruta")
+    histograma = registro.histograma("duracion_segundos", "Duration", (0.1, 1))
+    for valor in (0.05, 0.5, 0.5, 3):
+        histograma.observar(valor)
+    assert registro.contador("peticiones_total", "Requests", ("endpoint",)) is contador
+    assert registro.exponer().splitlines() == [
+        "# HELP peticiones_total Requests", "# TYPE peticiones_total counter", 'peticiones_total{endpoint="/ruta"} 3',
+        "# HELP duracion_segundos Duration", "# TYPE duracion_segundos histogram",
+        'duracion_segundos_bucket{le="0.1"} 1', 'duracion_segundos_bucket{le="1"} 3', 'duracion_segundos_bucket{le="+Inf"} 4',
+        "duracion_segundos_sum 4.05", "duracion_segundos_count 4"]
+
+def test_desglose():
+    antes = metricas.DURACION_ETAPAS.cuenta(etapa="prueba")
+    with metricas.tramo("prueba"):
+        pass
+    with metricas.desglose() as tiempos:
+        with metricas.tramo("prueba"):
+            # Spans of other threads are not added to this breakdown
+            def otra():
+                with metricas.tramo("otra"):
+                    pass
+            hilo = threading.Thread(target=otra)
+            hilo.start()
+            hilo.join()
+        with metricas.tramo("prueba"):
+            pass
+    assert list(tiempos) == ["prueba"] and tiempos["prueba"] >= 0
+    assert metricas.DURACION_ETAPAS.cuenta(etapa="prueba") == antes + 3
+    assert metricas.cabecera_tiempos({"busqueda": 0.0123}, 0.02) == "busqueda;dur=12.30, total;dur=20.00"